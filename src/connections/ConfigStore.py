@@ -0,0 +1,337 @@
+import configparser
+import contextlib
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Seconds a writer waits for another process to release the file before giving up
+LOCK_TIMEOUT = 10
+LOCK_RETRY_SECONDS = 0.05
+# Suffix of the file next to an ini file remembering the highest section number add_section issued
+IDS_SUFFIX = '.ids'
+# Key lines of an ini file, as configparser reads them
+OPTION_PATTERN = re.compile(r'^([^\s=:#;\[][^=:]*?)\s*[=:]')
+SECTION_PATTERN = re.compile(r'^\[([^]]+)\]')
+COMMENT_PREFIXES = ('#', ';')
+
+
+def default_file_mode():
+    """Mode open() gives a new file under the current umask, which mkstemp would not."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# Read once: changing the umask to read it is not thread-safe
+DEFAULT_FILE_MODE = default_file_mode()
+
+
+def atomic_write(path, text):
+    """
+    Write a file (text, or bytes in binary mode) so that readers only ever see the old or the new content.
+    The file keeps its mode, or gets the usual one of a new file, not the 0600 of the temporary file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = DEFAULT_FILE_MODE
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    """
+    Hold an exclusive lock on `path` shared by every process using this function. The lock is taken
+    on a `.lock` file next to it, because the file itself is replaced on every write.
+    """
+    lock_path = os.path.abspath(path) + '.lock'
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    deadline = time.monotonic() + timeout
+    with open(lock_path, 'a+') as lock_file:
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"{path} is locked by another process")
+                time.sleep(LOCK_RETRY_SECONDS)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def parse(path):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+
+def read_text(path):
+    try:
+        with open(path) as ini_file:
+            return ini_file.read()
+    except FileNotFoundError:
+        return ''
+
+
+def raw_items(config, section):
+    return {key: config.get(section, key, raw=True) for key in config.options(section)}
+
+
+def option_line(key, value):
+    """A key line as ConfigParser.write formats it."""
+    value = str(value).replace('\n', '\n\t')
+    return f"{key} = {value}\n"
+
+
+def split_sections(text):
+    """The lines before the first section, and a {section: lines} dict of every section in file order."""
+    preamble, blocks, lines = [], {}, None
+    for line in text.splitlines(keepends=True):
+        match = SECTION_PATTERN.match(line)
+        if match:
+            lines = blocks.setdefault(match.group(1), [])
+        (preamble if lines is None else lines).append(line)
+    return preamble, blocks
+
+
+def edit_lines(lines, section, old, new):
+    """The lines of a section edited from `old` to `new`, keeping its comments and unchanged keys."""
+    items = raw_items(new, section)
+    edited, written = [lines[0]], set()
+    last_key_line = 1
+    keep = False  # Whether the continuation lines of the current key are kept
+    for line in lines[1:]:
+        stripped = line.strip()
+        match = OPTION_PATTERN.match(line)
+        if match:
+            key = new.optionxform(match.group(1).strip())
+            keep = False
+            if key in items and key not in written:
+                written.add(key)
+                keep = old.has_option(section, key) and old.get(section, key, raw=True) == items[key]
+                edited.append(line if keep else option_line(key, items[key]))
+                last_key_line = len(edited)
+        elif line[:1].isspace() and stripped and not stripped.startswith(COMMENT_PREFIXES):
+            if keep:
+                edited.append(line)
+                last_key_line = len(edited)
+        else:
+            edited.append(line)
+    edited[last_key_line:last_key_line] = [option_line(key, value) for key, value in items.items()
+                                           if key not in written]
+    return edited
+
+
+def render(text, old, new):
+    """
+    The ini text of `new`, as edited from `old`, the parsed `text`. Sections left alone keep their lines
+    as they are, comments and layout included; edited ones keep their comments and the lines of the
+    keys that did not change, and new sections and keys are written the way ConfigParser writes them.
+    """
+    preamble, blocks = split_sections(text)
+    output = preamble + blocks.get(new.default_section, [])
+    for section in new.sections():
+        if section in blocks and old.has_section(section):
+            if raw_items(new, section) == raw_items(old, section):
+                output.extend(blocks[section])
+            else:
+                output.extend(edit_lines(blocks[section], section, old, new))
+            continue
+        if output and output[-1].strip():
+            output.append('\n')
+        output.append(f"[{section}]\n")
+        output.extend(option_line(key, value) for key, value in raw_items(new, section).items())
+        output.append('\n')
+    return ''.join(output)
+
+
+class SectionChanges:
+    """Sections of an ini file that appeared, changed or disappeared since it was last read."""
+
+    def __init__(self, added=(), changed=(), removed=()):
+        self.added = list(added)
+        self.changed = list(changed)
+        self.removed = list(removed)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return f"SectionChanges(added={self.added}, changed={self.changed}, removed={self.removed})"
+
+
+class ConfigStore:
+    """
+    An ini file shared by windows, schedulers and other processes. Writes re-read the file and
+    replace it atomically while holding a file lock, so concurrent editors never lose each other's
+    sections. Reads are reparsed only when the file's stat signature changed, and listeners are
+    called with the SectionChanges, so they can update what depends on those sections only.
+    The parsed ConfigParser returned by load() is shared: change the file through update().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.config = None
+        self.sections = {}  # section -> dict of its items, as last read
+        self.signature = None
+        self.listeners = []
+        self.lock = threading.RLock()
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # A replaced file has a new inode even when its mtime and size look unchanged
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def add_listener(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def poll(self):
+        """Reparse the file if it changed on disk and tell the listeners which sections did."""
+        with self.lock:
+            signature = self.file_signature()
+            if self.config is not None and signature == self.signature:
+                return SectionChanges()
+            config = parse(self.path)
+            sections = {section: dict(config[section]) for section in config.sections()}
+            changes = SectionChanges(
+                [section for section in sections if section not in self.sections],
+                [section for section in sections
+                 if section in self.sections and sections[section] != self.sections[section]],
+                [section for section in self.sections if section not in sections]
+            )
+            self.config, self.sections, self.signature = config, sections, signature
+        if changes:
+            for listener in list(self.listeners):
+                listener(changes)
+        return changes
+
+    def load(self):
+        """The parsed file, up to date with the disk."""
+        self.poll()
+        return self.config
+
+    def section(self, section):
+        """A section as a plain dict, or KeyError."""
+        self.poll()
+        with self.lock:
+            if section not in self.sections:
+                raise KeyError(f"'{section}' is not defined in {self.path}")
+            return dict(self.sections[section])
+
+    def update(self, edit):
+        """
+        Apply `edit(config)` to the file as it is on disk right now and write it back atomically,
+        all under the file lock. Returns what `edit` returned; the file is left alone if it raises.
+        """
+        with self.lock, file_lock(self.path):
+            text = read_text(self.path)
+            old, config = configparser.ConfigParser(), configparser.ConfigParser()
+            old.read_string(text)
+            config.read_string(text)
+            result = edit(config)
+            atomic_write(self.path, render(text, old, config))
+        self.poll()
+        return result
+
+    def save_section(self, section, values):
+        """Create or replace a section."""
+        def edit(config):
+            config[section] = {key: str(value) for key, value in values.items() if value not in (None, '')}
+        self.update(edit)
+
+    def update_section(self, section, values):
+        """Set some keys of a section, creating it if needed and keeping the keys not passed."""
+        def edit(config):
+            if section not in config:
+                config.add_section(section)
+            for key, value in values.items():
+                if value in (None, ''):
+                    config.remove_option(section, key)
+                else:
+                    config[section][key] = str(value)
+        self.update(edit)
+
+    def delete_section(self, section):
+        """Remove a section, returning False if it was not there."""
+        return self.update(lambda config: config.remove_section(section))
+
+    def add_section(self, prefix, values):
+        """
+        Create a section named `prefix_<n>` and return its name. n is one past the highest number ever
+        issued for the prefix, kept in a `.ids` file next to the ini file, or in use if higher, so the
+        name of a deleted section is never given to a new one that could inherit its checkpoints or
+        history. The name is picked under the file lock, so two writers never pick the same one.
+        """
+        pattern = re.compile(re.escape(prefix) + r'_(\d+)$')
+        ids_path = self.path + IDS_SUFFIX
+
+        def edit(config):
+            try:
+                with open(ids_path) as ids_file:
+                    issued = json.load(ids_file)
+            except (FileNotFoundError, ValueError):
+                issued = {}
+            numbers = [int(match.group(1)) for match in map(pattern.match, config.sections()) if match]
+            number = max(numbers + [issued.get(prefix, 0)]) + 1
+            section = f"{prefix}_{number}"
+            config[section] = {key: str(value) for key, value in values.items() if value not in (None, '')}
+            issued[prefix] = number
+            atomic_write(ids_path, json.dumps(issued, indent=4))
+            return section
+        return self.update(edit)
+
+
+# One store per file, so every window and scheduler of the process shares the parsed file
+stores = {}
+stores_lock = threading.Lock()
+
+
+def config_store(path):
+    """The shared ConfigStore of an ini file."""
+    key = os.path.abspath(path)
+    with stores_lock:
+        if key not in stores:
+            stores[key] = ConfigStore(path)
+        return stores[key]
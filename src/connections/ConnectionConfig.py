@@ -1,17 +1,23 @@
 import sys
-import configparser
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QWidget, 
     QPushButton, QComboBox, QMessageBox
 )
 from PyQt6.QtCore import pyqtSignal
 from sqlalchemy import create_engine
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
+
+from ConfigStore import config_store
+from ConnectionSettings import build_connection_string, load_definitions
+from DriverRegistry import driver_registry
+from EngineRegistry import engine_registry
+from Workers import Worker, run_subprocess, start_worker
 
 import subprocess
-import importlib
-import json
-import os
+
+# Seconds before the window stops waiting on a connection test or a package install
+TEST_TIMEOUT = 15
+INSTALL_TIMEOUT = 300
 
 class ConnectionConfig(QMainWindow):
     # Define a signal that will be emitted when the save button is clicked
@@ -27,17 +33,14 @@ class ConnectionConfig(QMainWindow):
         self.setGeometry(300, 300, 400, 350)  # Adjusted size to accommodate extra fields
         self.ini_file = ini_file
         self.connection_id = connection_id
+        self.current_worker = None  # Background test or install in progress
 
-        # Load the ini file
-        self.config = configparser.ConfigParser()
-        self.config.read(self.ini_file)
+        # Load the ini file, shared with the other windows of the application
+        self.store = config_store(self.ini_file)
+        self.config = self.store.load()
 
-        # Define current directory
-        self.curr_dir = os.path.abspath(os.getcwd())
-
-        # Importing definitions defined in JSON
-        with open(f'{ self.curr_dir }/src/connections/definitions.json') as json_file:
-            self.definitions = json.load(json_file)
+        # Importing definitions defined in JSON, shipped next to the connections modules
+        self.definitions = load_definitions()
 
         # Templates for different database types with required fields
         self.templates = {}
@@ -226,25 +229,31 @@ class ConnectionConfig(QMainWindow):
         new_database = self.database_field.text()
         new_schema = self.schema_field.text() if self.schema_field.isVisible() else ''
 
-        # Check if creating a new connection
-        if not self.connection_id:
-            # Generate a new unique connection ID
-            self.connection_id = f"connection_{len(self.config.sections()) + 1}"
-            self.config[self.connection_id] = {}
-
-        # Update the ini file with the new data
-        self.config[self.connection_id]['type'] = new_type
-        self.config[self.connection_id]['host'] = new_host
-        self.config[self.connection_id]['port'] = new_port
-        self.config[self.connection_id]['username'] = new_username
-        self.config[self.connection_id]['password'] = new_password
-        self.config[self.connection_id]['database'] = new_database
+        values = {
+            'type': new_type,
+            'host': new_host,
+            'port': new_port,
+            'username': new_username,
+            'password': new_password,
+            'database': new_database,
+        }
         if new_schema:
-            self.config[self.connection_id]['schema'] = new_schema
+            values['schema'] = new_schema
+
+        # Written under a file lock on top of what is on disk now, so edits made meanwhile by
+        # another window or process are kept; keys the form does not show (e.g. max_sessions) too
+        try:
+            if not self.connection_id:
+                # The next free number, never one that is still in use after a delete
+                self.connection_id = self.store.add_section('connection', values)
+            else:
+                self.store.update_section(self.connection_id, values)
+        except OSError as e:
+            QMessageBox.critical(self, "Save Failed", f"Could not write {self.ini_file}: {e}")
+            return
 
-        # Write the updated config back to the file
-        with open(self.ini_file, 'w') as configfile:
-            self.config.write(configfile)
+        # Drop the pooled engine so the next use picks up the new settings
+        engine_registry.evict(self.connection_id)
 
         # Emit the saved signal
         self.saved.emit()
@@ -253,13 +262,15 @@ class ConnectionConfig(QMainWindow):
         QMessageBox.information(self, "Saved", f"Connection '{self.connection_id}' has been saved.")
         self.close()
 
-    def check_and_install_packages(self, db_type):
-        """Check if required packages are installed, and prompt for installation if missing."""
+    def check_and_install_packages(self, db_type, on_installed=None):
+        """
+        Check if required packages are installed, and prompt for installation if missing.
+        Returns True if everything is available. Accepted installs run in the background
+        and call `on_installed` once they succeed.
+        """
 
-        missing_packages = []
-        for package in self.definitions[db_type]['dependencies']:
-            if importlib.util.find_spec(package) is None:
-                missing_packages.append(package)
+        # Availability is probed once per process, not on every click
+        missing_packages = driver_registry.missing_packages(db_type)
 
         if missing_packages:
             reply = QMessageBox.question(
@@ -272,27 +283,66 @@ class ConnectionConfig(QMainWindow):
             )
 
             if reply == QMessageBox.StandardButton.Yes:
-                for package in missing_packages:
-                    try:
-                        subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-                    except subprocess.CalledProcessError:
-                        QMessageBox.critical(self, "Installation Failed", f"Failed to install {package}. Please install it manually.")
-                        return False
-                return True
-            else:
-                return False
+                worker = Worker(self.install_packages, missing_packages, timeout=INSTALL_TIMEOUT)
+                # Release the Test button before resuming, so on_installed starts a fresh worker
+                worker.signals.result.connect(lambda _: (self.worker_finished(worker), on_installed and on_installed()))
+                worker.signals.error.connect(
+                    lambda message: QMessageBox.critical(self, "Installation Failed", f"{message}\nPlease install the packages manually.")
+                )
+                self.start_worker(worker)
+            return False
         return True
 
+    @staticmethod
+    def install_packages(packages, cancel_token=None):
+        """Install packages with pip, one at a time."""
+        try:
+            for package in packages:
+                try:
+                    run_subprocess([sys.executable, "-m", "pip", "install", package], cancel_token)
+                except subprocess.CalledProcessError:
+                    raise RuntimeError(f"Failed to install {package}.")
+        finally:
+            # Probe again, even packages installed before a failure are usable now
+            driver_registry.refresh()
+
+    @staticmethod
+    def connect_once(connection_string, connect_args):
+        """Open and close a single connection, without pooling."""
+        engine = create_engine(connection_string, connect_args=connect_args, poolclass=NullPool)
+        try:
+            with engine.connect():
+                return True
+        finally:
+            engine.dispose()
+
+    def start_worker(self, worker):
+        """Run a worker in the background, turning the Test button into Cancel until it finishes."""
+        worker.signals.finished.connect(lambda: self.worker_finished(worker))
+        self.current_worker = worker
+        self.test_button.setText("Cancel")
+        start_worker(worker)
+
+    def worker_finished(self, worker):
+        if self.current_worker is worker:
+            self.current_worker = None
+            self.test_button.setText("Test")
+
     def test_connection(self):
-        """Test the connection using SQLAlchemy."""
+        """Test the connection using SQLAlchemy on a background thread."""
+        if self.current_worker is not None:
+            # The Test button acts as Cancel while a test or install is running
+            self.current_worker.cancel()
+            return
+
         if not self.validate_fields():
             return
         
         selected_type = self.type_dropdown.currentText().lower().replace(" ", "")
 
-        # Check and install missing packages if necessary
-        if not self.check_and_install_packages(selected_type):
-            return  # Abort the test if the user declines installation
+        # Check and install missing packages if necessary, the test resumes once they are installed
+        if not self.check_and_install_packages(selected_type, on_installed=self.test_connection):
+            return
 
         host = self.host_field.text()
         port = self.port_field.text()
@@ -301,23 +351,32 @@ class ConnectionConfig(QMainWindow):
         database = self.database_field.text()
         schema = self.schema_field.text() if self.schema_field.isVisible() else ''
 
-        connection_string = self.definitions[selected_type]['connection_string'].format(
-            username=username,
-            password=password,
-            host=host,
-            port=port,
-            database=database,
-            schema=schema
+        section = {
+            'type': selected_type,
+            'username': username,
+            'password': password,
+            'host': host,
+            'port': port,
+            'database': database,
+            'schema': schema
+        }
+        connection_string = build_connection_string(section, self.definitions)
+        connect_args = engine_registry.get_connect_args(section)
+
+        worker = Worker(self.connect_once, connection_string, connect_args, timeout=TEST_TIMEOUT)
+        worker.signals.result.connect(
+            lambda _: QMessageBox.information(self, "Connection Test", "Connection successful!")
         )
-        
-        try:
-            # Create a SQLAlchemy engine
-            engine = create_engine(connection_string)
-            # Test the connection by connecting to the database
-            with engine.connect() as connection:
-                QMessageBox.information(self, "Connection Test", "Connection successful!")
-        except SQLAlchemyError as e:
-            QMessageBox.critical(self, "Connection Test Failed", f"Failed to connect: {str(e)}")
+        worker.signals.error.connect(
+            lambda message: QMessageBox.critical(self, "Connection Test Failed", f"Failed to connect: {message}")
+        )
+        self.start_worker(worker)
+
+    def closeEvent(self, event):
+        """Stop waiting on a running test when the window closes."""
+        if self.current_worker is not None:
+            self.current_worker.cancel()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -1,13 +1,16 @@
 import sys
-import configparser
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLineEdit, QWidget,
-    QPushButton, QTableWidget, QTableWidgetItem, QMessageBox
+    QPushButton, QTableView, QMessageBox
 )
-from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QSortFilterProxyModel
 
+from ConfigStore import config_store
 from ConnectionConfig import ConnectionConfig  # Import ConnectionConfig from another file
+from ConnectionTableModel import ACTION_COLUMN, ActionDelegate, ConnectionTableModel, StoreWatcher, cached_icon
+from EngineRegistry import engine_registry
+from HealthCheck import HealthHistory, check_all
+from Workers import Worker, cancel_all_workers, start_worker
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -15,10 +18,18 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("NoCDC - Connections")
         self.setGeometry(100, 100, 660, 600)
         self.ini_file = "data/connections.ini"
+        self.health_history = HealthHistory()
+        self.health_worker = None
+        # Shared with the connection forms, the engine registry and other windows; edits made by any
+        # of them, or by another process, arrive as the sections that changed
+        self.store = config_store(self.ini_file)
+        self.config = self.store.load()
 
         # Initialize UI components
         self.init_ui()
-        self.load_data()
+        self.model.sync(self.config)
+        self.store_watcher = StoreWatcher(self.store, self)
+        self.store_watcher.changed.connect(self.sections_changed)
         self.resize_table_columns()  # Resize columns after the table is loaded
 
     def init_ui(self):
@@ -33,24 +44,46 @@ class MainWindow(QMainWindow):
 
         # Refresh button with image
         self.refresh_button = QPushButton()
-        self.refresh_button.setIcon(QIcon("img/icons/arrow-round_path.svg"))
+        self.refresh_button.setIcon(cached_icon("img/icons/arrow-round_path.svg"))
         self.refresh_button.setFixedSize(32, 32)
         self.refresh_button.clicked.connect(self.load_data)
         top_bar_layout.addWidget(self.refresh_button)
 
         # Add button with image
         self.add_button = QPushButton()
-        self.add_button.setIcon(QIcon("img/icons/plus_path.svg"))
+        self.add_button.setIcon(cached_icon("img/icons/plus_path.svg"))
         self.add_button.setFixedSize(32, 32)
         self.add_button.clicked.connect(self.open_add_connection_window)
         top_bar_layout.addWidget(self.add_button)
 
+        # Test all button with image
+        self.test_all_button = QPushButton()
+        self.test_all_button.setIcon(cached_icon("img/icons/check_path.svg"))
+        self.test_all_button.setToolTip("Test all connections")
+        self.test_all_button.setFixedSize(32, 32)
+        self.test_all_button.clicked.connect(self.test_all_connections)
+        top_bar_layout.addWidget(self.test_all_button)
+
         self.main_layout.addLayout(top_bar_layout)
 
-        # Table view
-        self.table_view = QTableWidget()
-        self.table_view.setColumnCount(5)  # Adjust column count for the action column
-        self.table_view.setHorizontalHeaderLabels(["ID", "Type", "Host", "Database", "Action"])
+        # Table view backed by a model, filtered and sorted through a proxy
+        self.model = ConnectionTableModel(self.health_history, self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        self.proxy_model.setFilterKeyColumn(-1)  # Match any column, the action column has no text
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+
+        self.table_view = QTableView()
+        self.table_view.setModel(self.proxy_model)
+        self.table_view.setSortingEnabled(True)
+        self.table_view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.table_view.verticalHeader().setDefaultSectionSize(30)
+
+        # Action buttons are painted by a delegate rather than created per row
+        self.action_delegate = ActionDelegate(self.table_view)
+        self.action_delegate.editClicked.connect(self.open_edit_connection_window)
+        self.action_delegate.deleteClicked.connect(self.delete_connection)
+        self.table_view.setItemDelegateForColumn(ACTION_COLUMN, self.action_delegate)
         self.main_layout.addWidget(self.table_view)
 
         # Set layout to central widget
@@ -59,50 +92,18 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(container)
 
     def load_data(self):
-        """Load data from ini file and populate the table."""
-        self.config = configparser.ConfigParser()
-        self.config.read(self.ini_file)
-
-        self.table_view.setRowCount(0)  # Clear existing rows
-
-        type_mapping = {
-            'oracle': 'Oracle',
-            'postgresql': 'Postgresql',
-            'microsoftsqlserver': 'Microsoft SQL Server',
-            'mysql': 'MySQL',
-            'snowflake': 'Snowflake'
-        }
-
-        for section in self.config.sections():
-            row_position = self.table_view.rowCount()
-            self.table_view.insertRow(row_position)
-            # Add ID, Type, Host, Database columns
-            self.table_view.setItem(row_position, 0, QTableWidgetItem(section))
-            self.table_view.setItem(row_position, 1, QTableWidgetItem(type_mapping[self.config[section].get('type', '')]))
-            self.table_view.setItem(row_position, 2, QTableWidgetItem(self.config[section].get('host', '')))
-            self.table_view.setItem(row_position, 3, QTableWidgetItem(self.config[section].get('database', '')))
-
-            # Create a widget to contain the action buttons
-            action_widget = QWidget()
-            action_layout = QHBoxLayout()
-            action_layout.setContentsMargins(0, 0, 0, 0)  # Remove margins
-
-            # Add edit button
-            edit_button = QPushButton()
-            edit_button.setIcon(QIcon("img/icons/edit_path.svg"))
-            edit_button.setFixedSize(24, 24)
-            edit_button.clicked.connect(lambda checked, id=section: self.open_edit_connection_window(id))
-            action_layout.addWidget(edit_button)
-
-            # Add delete button
-            delete_button = QPushButton()
-            delete_button.setIcon(QIcon("img/icons/trash-1_path.svg"))
-            delete_button.setFixedSize(24, 24)
-            delete_button.clicked.connect(lambda checked, id=section: self.delete_connection(id))
-            action_layout.addWidget(delete_button)
-
-            action_widget.setLayout(action_layout)
-            self.table_view.setCellWidget(row_position, 4, action_widget)
+        """Check the ini file for changes now; changed sections arrive through sections_changed."""
+        self.store.poll()
+
+    def sections_changed(self, changes):
+        """Update the rows of the sections that were added, edited or deleted."""
+        self.config = self.store.config
+        for connection_id in changes.removed + changes.changed:
+            # Results of the old settings no longer say anything about the connection
+            self.health_history.forget(connection_id)
+        self.model.apply_changes(self.config, changes)
+        for connection_id in changes.changed:
+            self.model.health_changed(connection_id)
 
     def resize_table_columns(self):
         """Resize table columns based on the window size."""
@@ -111,29 +112,47 @@ class MainWindow(QMainWindow):
         action_column_width = 100  # Fixed width for the "Action" column
         remaining_width = total_width - action_column_width - 15
 
-        # Distribute remaining width among the first four columns
-        self.table_view.setColumnWidth(0, int(remaining_width * 0.2))  # ID column
-        self.table_view.setColumnWidth(1, int(remaining_width * 0.3))  # Type column
-        self.table_view.setColumnWidth(2, int(remaining_width * 0.3))  # Host column
-        self.table_view.setColumnWidth(3, int(remaining_width * 0.2))  # Database column
-        self.table_view.setColumnWidth(4, action_column_width)  # Action column (fixed size)
+        # Distribute remaining width among the first five columns
+        self.table_view.setColumnWidth(0, int(remaining_width * 0.15))  # ID column
+        self.table_view.setColumnWidth(1, int(remaining_width * 0.15))  # Type column
+        self.table_view.setColumnWidth(2, int(remaining_width * 0.2))  # Host column
+        self.table_view.setColumnWidth(3, int(remaining_width * 0.15))  # Database column
+        self.table_view.setColumnWidth(4, int(remaining_width * 0.35))  # Health column
+        self.table_view.setColumnWidth(5, action_column_width)  # Action column (fixed size)
 
     def resizeEvent(self, event):
         """Resize table columns when the window is resized."""
         super().resizeEvent(event)
         self.resize_table_columns()
 
+    def test_all_connections(self):
+        """Check every connection concurrently in the background, filling the Health column as results arrive."""
+        if self.health_worker is not None:
+            return
+        self.model.set_testing(self.config.sections())
+
+        self.health_worker = Worker(check_all, self.config.sections())
+        self.health_worker.signals.progress.connect(self.update_health)
+        self.health_worker.signals.error.connect(
+            lambda message: QMessageBox.critical(self, "Test All Failed", message)
+        )
+        self.health_worker.signals.finished.connect(self.test_all_finished)
+        self.test_all_button.setEnabled(False)
+        start_worker(self.health_worker)
+
+    def update_health(self, result):
+        """Record a health check result and refresh its row."""
+        self.health_history.record(result)
+        self.model.health_changed(result.connection_id)
+
+    def test_all_finished(self):
+        self.health_worker = None
+        self.model.set_testing([])
+        self.test_all_button.setEnabled(True)
+
     def filter_table(self):
         """Filter table rows based on the search box input."""
-        search_text = self.search_box.text().lower()
-        for row in range(self.table_view.rowCount()):
-            match = False
-            for col in range(self.table_view.columnCount() - 1):  # Exclude the action column
-                item = self.table_view.item(row, col)
-                if item and search_text in item.text().lower():
-                    match = True
-                    break
-            self.table_view.setRowHidden(row, not match)
+        self.proxy_model.setFilterFixedString(self.search_box.text())
 
     def open_add_connection_window(self):
         """Open the ConnectionConfig window for creating a new connection."""
@@ -158,14 +177,22 @@ class MainWindow(QMainWindow):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            if connection_id in self.config:
-                del self.config[connection_id]
-                with open(self.ini_file, 'w') as configfile:
-                    self.config.write(configfile)
-                self.load_data()
+            try:
+                # The row goes away through sections_changed, like deletes made elsewhere
+                self.store.delete_section(connection_id)
+            except OSError as e:
+                QMessageBox.critical(self, "Delete Failed", f"Could not write {self.ini_file}: {e}")
+                return
+            # Close pooled connections of the deleted section
+            engine_registry.evict(connection_id)
+
+    def closeEvent(self, event):
+        self.store_watcher.stop()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(cancel_all_workers)
     main_window = MainWindow()
     main_window.show()
     sys.exit(app.exec())
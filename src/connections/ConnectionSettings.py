@@ -0,0 +1,47 @@
+import configparser
+import json
+import os
+
+# Shipped next to this module, so it is found whatever the working directory is
+DEFINITIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'definitions.json')
+CONNECTIONS_FILE = "data/connections.ini"
+
+# Parsed definitions per file, they never change while the application runs
+definitions_cache = {}
+
+
+def load_definitions(definitions_file=DEFINITIONS_FILE):
+    """Database type definitions: display name, form template, connection string and driver packages."""
+    if definitions_file not in definitions_cache:
+        with open(definitions_file) as json_file:
+            definitions_cache[definitions_file] = json.load(json_file)
+    return definitions_cache[definitions_file]
+
+
+def load_connections(ini_file=CONNECTIONS_FILE):
+    """Parse the connections ini file."""
+    config = configparser.ConfigParser()
+    config.read(ini_file)
+    return config
+
+
+def normalize_type(db_type):
+    """Key of a database type in definitions.json, from either the key or the display name."""
+    return (db_type or '').lower().replace(" ", "")
+
+
+def build_connection_string(section, definitions=None):
+    """Fill the connection string template of the section's database type."""
+    definitions = definitions or load_definitions()
+    db_type = normalize_type(section.get('type'))
+    if db_type not in definitions:
+        raise ValueError(f"Unknown connection type '{db_type}'")
+    return definitions[db_type]['connection_string'].format(
+        username=section.get('username', ''),
+        password=section.get('password', ''),
+        host=section.get('host', ''),
+        port=section.get('port', ''),
+        database=section.get('database', ''),
+        schema=section.get('schema', '')
+    )
+
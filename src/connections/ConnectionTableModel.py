@@ -0,0 +1,217 @@
+import os
+
+from PyQt6.QtCore import (
+    QAbstractTableModel, QEvent, QFileSystemWatcher, QModelIndex, QObject, QRect, Qt, QTimer, pyqtSignal
+)
+from PyQt6.QtGui import QColor, QIcon
+from PyQt6.QtWidgets import QStyle, QStyledItemDelegate
+
+COLUMNS = ["ID", "Type", "Host", "Database", "Health", "Action"]
+HEALTH_COLUMN = 4
+ACTION_COLUMN = 5
+# Fallback poll of watched ini files, for file systems that do not report changes
+STORE_POLL_MS = 2000
+
+TYPE_NAMES = {
+    'oracle': 'Oracle',
+    'postgresql': 'Postgresql',
+    'microsoftsqlserver': 'Microsoft SQL Server',
+    'mysql': 'MySQL',
+    'snowflake': 'Snowflake'
+}
+
+# Icons are loaded from disk once and shared by every view
+icon_cache = {}
+
+
+def cached_icon(path):
+    if path not in icon_cache:
+        icon_cache[path] = QIcon(path)
+    return icon_cache[path]
+
+
+class ConnectionTableModel(QAbstractTableModel):
+    """Rows of the connection list, updated in place when sections are added, changed or removed."""
+
+    def __init__(self, health_history, parent=None):
+        super().__init__(parent)
+        self.health_history = health_history
+        self.rows = []      # [connection_id, type, host, database] per row
+        self.row_of = {}    # connection_id -> row number
+        self.testing = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+        connection_id = row[0]
+
+        if column == HEALTH_COLUMN:
+            if role == Qt.ItemDataRole.DisplayRole:
+                if connection_id in self.testing:
+                    return "Testing..."
+                return self.health_history.summary(connection_id)
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return self.health_history.tooltip(connection_id)
+            if role == Qt.ItemDataRole.ForegroundRole:
+                latest = self.health_history.latest(connection_id)
+                if latest is not None and not latest.ok and connection_id not in self.testing:
+                    return QColor(Qt.GlobalColor.red)
+            return None
+
+        if column < HEALTH_COLUMN and role == Qt.ItemDataRole.DisplayRole:
+            return row[column]
+        return None
+
+    def connection_id(self, row):
+        return self.rows[row][0]
+
+    @staticmethod
+    def section_row(connection_id, section):
+        db_type = section.get('type', '')
+        return [connection_id, TYPE_NAMES.get(db_type, db_type), section.get('host', ''), section.get('database', '')]
+
+    def sync(self, config):
+        """Bring the rows in line with a parsed ini file, touching only the sections that changed."""
+        sections = config.sections()
+        wanted = set(sections)
+
+        # Remove deleted sections, from the bottom up so row numbers stay valid
+        for row in reversed(range(len(self.rows))):
+            if self.rows[row][0] not in wanted:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+        self.row_of = {row[0]: number for number, row in enumerate(self.rows)}
+
+        for connection_id in sections:
+            self.set_row(connection_id, config[connection_id])
+
+    def apply_changes(self, config, changes):
+        """Update only the rows of the sections listed in a SectionChanges."""
+        for connection_id in changes.removed:
+            self.remove(connection_id)
+        for connection_id in changes.added + changes.changed:
+            if connection_id in config:
+                self.set_row(connection_id, config[connection_id])
+
+    def set_row(self, connection_id, section):
+        values = self.section_row(connection_id, section)
+        row = self.row_of.get(connection_id)
+        if row is None:
+            row = len(self.rows)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.append(values)
+            self.row_of[connection_id] = row
+            self.endInsertRows()
+        elif self.rows[row] != values:
+            self.rows[row] = values
+            self.dataChanged.emit(self.index(row, 0), self.index(row, HEALTH_COLUMN - 1))
+
+    def remove(self, connection_id):
+        row = self.row_of.get(connection_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+        self.row_of = {values[0]: number for number, values in enumerate(self.rows)}
+
+    def set_testing(self, connection_ids):
+        self.testing = set(connection_ids)
+        if self.rows:
+            self.dataChanged.emit(self.index(0, HEALTH_COLUMN), self.index(len(self.rows) - 1, HEALTH_COLUMN))
+
+    def health_changed(self, connection_id):
+        """Refresh the health cell of one connection."""
+        self.testing.discard(connection_id)
+        row = self.row_of.get(connection_id)
+        if row is not None:
+            index = self.index(row, HEALTH_COLUMN)
+            self.dataChanged.emit(index, index)
+
+
+class StoreWatcher(QObject):
+    """
+    Delivers the SectionChanges of a ConfigStore in the GUI thread, whichever thread or process
+    changed the file. Its directory is watched (through inotify on Linux), as atomic writes replace
+    the file itself, and polled slowly for file systems that do not report changes.
+    """
+    changed = pyqtSignal(object)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.store.add_listener(self.forward)
+        self.watcher = QFileSystemWatcher(self)
+        directory = os.path.dirname(os.path.abspath(store.path))
+        if os.path.isdir(directory):
+            self.watcher.addPath(directory)
+        self.watcher.directoryChanged.connect(self.poll)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(STORE_POLL_MS)
+
+    def forward(self, changes):
+        self.changed.emit(changes)
+
+    def poll(self):
+        self.store.poll()
+
+    def stop(self):
+        self.timer.stop()
+        self.store.remove_listener(self.forward)
+
+
+class ActionDelegate(QStyledItemDelegate):
+    """Paints the edit and delete buttons of the action column instead of creating widgets per row."""
+    editClicked = pyqtSignal(str)
+    deleteClicked = pyqtSignal(str)
+
+    BUTTON_SIZE = 24
+    SPACING = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.edit_icon = cached_icon("img/icons/edit_path.svg")
+        self.delete_icon = cached_icon("img/icons/trash-1_path.svg")
+
+    def button_rects(self, rect):
+        top = rect.top() + (rect.height() - self.BUTTON_SIZE) // 2
+        left = rect.left() + (rect.width() - 2 * self.BUTTON_SIZE - self.SPACING) // 2
+        edit_rect = QRect(left, top, self.BUTTON_SIZE, self.BUTTON_SIZE)
+        delete_rect = QRect(left + self.BUTTON_SIZE + self.SPACING, top, self.BUTTON_SIZE, self.BUTTON_SIZE)
+        return edit_rect, delete_rect
+
+    def paint(self, painter, option, index):
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        edit_rect, delete_rect = self.button_rects(option.rect)
+        self.edit_icon.paint(painter, edit_rect.adjusted(3, 3, -3, -3))
+        self.delete_icon.paint(painter, delete_rect.adjusted(3, 3, -3, -3))
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QEvent.Type.MouseButtonRelease:
+            return False
+        connection_id = index.siblingAtColumn(0).data()
+        edit_rect, delete_rect = self.button_rects(option.rect)
+        position = event.position().toPoint()
+        if edit_rect.contains(position):
+            self.editClicked.emit(connection_id)
+            return True
+        if delete_rect.contains(position):
+            self.deleteClicked.emit(connection_id)
+            return True
+        return False
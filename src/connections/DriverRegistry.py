@@ -0,0 +1,96 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+from ConnectionSettings import load_definitions, normalize_type
+
+# Seconds spent importing each module through timed_import, in import order
+import_times = {}
+import_lock = threading.Lock()
+
+
+def timed_import(module_name):
+    """Import a module, recording how long the first import took for the startup profile."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with import_lock:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        import_times.setdefault(module_name, time.perf_counter() - started)
+    return module
+
+
+def format_profile():
+    """Import cost of the modules loaded through timed_import, slowest first."""
+    lines = [f"{seconds * 1000:9.1f} ms  {module_name}"
+             for module_name, seconds in sorted(import_times.items(), key=lambda item: -item[1])]
+    return '\n'.join(lines) if lines else "No modules were imported on demand."
+
+
+class DriverRegistry:
+    """
+    Knows which database drivers are installed and imports them only when a connection of their type
+    is opened. Availability is probed once per process and cached; `refresh` forgets the cached answers,
+    e.g. after packages were installed.
+    """
+
+    def __init__(self, definitions=None):
+        self.definitions = definitions
+        self.available = {}  # module name -> installed
+        self.loaded = set()  # database types whose drivers are imported
+        self.lock = threading.Lock()
+
+    def get_definition(self, db_type):
+        definitions = self.definitions or load_definitions()
+        db_type = normalize_type(db_type)
+        if db_type not in definitions:
+            raise ValueError(f"Unknown connection type '{db_type}'")
+        return definitions[db_type]
+
+    def driver_modules(self, db_type):
+        """Import names of a type's drivers, paired by position with the pip packages in `dependencies`."""
+        definition = self.get_definition(db_type)
+        return definition.get('driver_modules') or definition['dependencies']
+
+    def is_available(self, module_name):
+        with self.lock:
+            if module_name not in self.available:
+                try:
+                    self.available[module_name] = importlib.util.find_spec(module_name) is not None
+                except ModuleNotFoundError:  # The parent package of a dotted name is missing
+                    self.available[module_name] = False
+            return self.available[module_name]
+
+    def missing_packages(self, db_type):
+        """Pip packages to install for a database type, from the cached availability of its drivers."""
+        packages = self.get_definition(db_type)['dependencies']
+        modules = self.driver_modules(db_type)
+        if len(modules) != len(packages):
+            return [] if all(map(self.is_available, modules)) else list(packages)
+        return [package for package, module in zip(packages, modules) if not self.is_available(module)]
+
+    def load(self, db_type):
+        """Import the drivers of a database type, once, raising a readable error if they are missing."""
+        db_type = normalize_type(db_type)
+        if db_type in self.loaded:
+            return
+        missing = self.missing_packages(db_type)
+        if missing:
+            raise ModuleNotFoundError(
+                f"Connections of type '{db_type}' need the packages {', '.join(missing)}, please install them"
+            )
+        for module_name in self.driver_modules(db_type):
+            timed_import(module_name)
+        self.loaded.add(db_type)
+
+    def refresh(self):
+        with self.lock:
+            self.available.clear()
+        importlib.invalidate_caches()
+
+
+# Shared registry for the whole process
+driver_registry = DriverRegistry()
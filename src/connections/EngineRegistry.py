@@ -0,0 +1,216 @@
+import atexit
+import hashlib
+import threading
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from ConfigStore import config_store
+from ConnectionSettings import (
+    CONNECTIONS_FILE, DEFINITIONS_FILE, build_connection_string, load_definitions, normalize_type
+)
+from DriverRegistry import driver_registry
+
+# Pool settings used when neither definitions.json nor the ini section override them
+DEFAULT_POOL_SETTINGS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+# Seconds a new connection may take before the driver gives up, overridable per section
+DEFAULT_CONNECT_TIMEOUT = 10
+
+INT_POOL_SETTINGS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+BOOL_POOL_SETTINGS = ('pool_pre_ping',)
+
+
+class EngineRegistry:
+    """
+    Process-wide cache of pooled SQLAlchemy engines keyed by connection ID.
+    The connection string of a section is resolved through definitions.json once,
+    and the engine is reused until the section changes or is evicted.
+    """
+
+    def __init__(self, ini_file=CONNECTIONS_FILE, definitions_file=DEFINITIONS_FILE):
+        self.ini_file = ini_file
+        self.definitions_file = definitions_file
+        self.definitions = None
+        self.store = None
+        # connection_id -> (section fingerprint, engine)
+        self.engines = {}
+        # connection_id -> (url, engine options) for engines not backed by the ini file
+        self.registrations = {}
+        self.lock = threading.RLock()
+
+    def load_definitions(self):
+        """Load the database type definitions once."""
+        if self.definitions is None:
+            self.definitions = load_definitions(self.definitions_file)
+        return self.definitions
+
+    def load_config(self):
+        """The parsed ini file, reparsed only when it changed on disk since the last read."""
+        store = config_store(self.ini_file)
+        if store is not self.store:
+            if self.store is not None:
+                self.store.remove_listener(self.sections_changed)
+            store.add_listener(self.sections_changed)
+            self.store = store
+        return store.load()
+
+    def sections_changed(self, changes):
+        """Close the pooled connections of sections edited or deleted, here or by another process."""
+        for connection_id in changes.changed + changes.removed:
+            if connection_id not in self.registrations:
+                self.evict(connection_id)
+
+    def get_section(self, connection_id):
+        """Return the ini section of a connection as a plain dict."""
+        config = self.load_config()
+        if connection_id not in config:
+            raise KeyError(f"Connection '{connection_id}' is not defined in {self.ini_file}")
+        return dict(config[connection_id])
+
+    def build_connection_string(self, section):
+        """Fill the connection string template of the section's database type."""
+        return build_connection_string(section, self.load_definitions())
+
+    def get_pool_settings(self, section):
+        """
+        Merge the default, per-type and per-connection pool settings. With `max_sessions` in the
+        section, pool_size + max_overflow is capped at it, so the pool never opens more sessions.
+        """
+        definitions = self.load_definitions()
+        db_type = normalize_type(section.get('type'))
+        settings = dict(DEFAULT_POOL_SETTINGS)
+        settings.update(definitions.get(db_type, {}).get('pool', {}))
+
+        for key in INT_POOL_SETTINGS:
+            if section.get(key):
+                settings[key] = int(section[key])
+        for key in BOOL_POOL_SETTINGS:
+            if section.get(key):
+                settings[key] = section[key].strip().lower() in ('1', 'true', 'yes', 'on')
+
+        if section.get('max_sessions'):
+            max_sessions = max(int(section['max_sessions']), 1)
+            # pool_size 0 and max_overflow -1 mean unlimited to SQLAlchemy
+            pool_size = settings['pool_size']
+            settings['pool_size'] = min(pool_size, max_sessions) if pool_size > 0 else max_sessions
+            spare = max_sessions - settings['pool_size']
+            overflow = settings['max_overflow']
+            settings['max_overflow'] = min(overflow, spare) if overflow >= 0 else spare
+        return settings
+
+    def get_connect_args(self, section):
+        """
+        Driver arguments bounding the connect time. Drivers without a timeout argument (cx_Oracle)
+        get it inside the connect descriptor instead, which then replaces the one built from the URL.
+        """
+        definition = self.load_definitions().get(normalize_type(section.get('type')), {})
+        argument = definition.get('connect_timeout_argument')
+        if not argument:
+            return {}
+        timeout = int(section.get('connect_timeout') or DEFAULT_CONNECT_TIMEOUT)
+        if definition.get('connect_timeout_dsn'):
+            return {argument: definition['connect_timeout_dsn'].format(
+                timeout=timeout, host=section.get('host', ''), port=section.get('port', ''),
+                database=section.get('database', ''))}
+        return {argument: timeout}
+
+    def section_fingerprint(self, connection_id):
+        """Stable digest of everything that defines a connection, to invalidate data cached for it."""
+        with self.lock:
+            registration = self.registrations.get(connection_id)
+        if registration is not None:
+            settings = ('url', str(registration[0]))
+        else:
+            settings = tuple(sorted(self.get_section(connection_id).items()))
+        return hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()
+
+    def get_engine(self, connection_id):
+        """Return the pooled engine of a connection, creating it on first use."""
+        with self.lock:
+            cached = self.engines.get(connection_id)
+            # Engines registered directly by URL are not backed by the ini file
+            if connection_id in self.registrations:
+                if cached is None:
+                    url, engine_options = self.registrations[connection_id]
+                    cached = (None, create_engine(url, **engine_options))
+                    self.engines[connection_id] = cached
+                return cached[1]
+
+            section = self.get_section(connection_id)
+            fingerprint = tuple(sorted(section.items()))
+            if cached is not None:
+                if cached[0] == fingerprint:
+                    return cached[1]
+                # The section was edited outside of evict(), drop the stale engine
+                cached[1].dispose()
+
+            # Drivers are imported when the first connection of their type is opened
+            driver_registry.load(section.get('type'))
+            engine = create_engine(self.build_connection_string(section),
+                                   connect_args=self.get_connect_args(section),
+                                   **self.get_pool_settings(section))
+            self.engines[connection_id] = (fingerprint, engine)
+            return engine
+
+    def connection_id_of(self, engine):
+        """Connection ID a cached engine was created for, or None."""
+        with self.lock:
+            for connection_id, (_, cached_engine) in self.engines.items():
+                if cached_engine is engine:
+                    return connection_id
+        return None
+
+    def create_unpooled_engine(self, connection_id, connect_timeout=None):
+        """A throwaway engine without pooling, e.g. to measure a fresh connect."""
+        with self.lock:
+            registration = self.registrations.get(connection_id)
+        if registration is not None:
+            return create_engine(registration[0], poolclass=NullPool)
+
+        section = self.get_section(connection_id)
+        if connect_timeout is not None:
+            section['connect_timeout'] = str(connect_timeout)
+        driver_registry.load(section.get('type'))
+        return create_engine(self.build_connection_string(section),
+                             connect_args=self.get_connect_args(section), poolclass=NullPool)
+
+    def register(self, connection_id, url, **engine_options):
+        """Register an engine for a URL that is not part of the ini file, e.g. a local SQLite stand-in."""
+        with self.lock:
+            self.evict(connection_id)
+            self.registrations[connection_id] = (url, engine_options)
+            return self.get_engine(connection_id)
+
+    def evict(self, connection_id):
+        """Dispose the engine of a connection so the next use reconnects with fresh settings."""
+        with self.lock:
+            cached = self.engines.pop(connection_id, None)
+        if cached is not None:
+            cached[1].dispose()
+
+    def dispose_all(self):
+        """Dispose every cached engine and its pooled connections."""
+        with self.lock:
+            cached_engines = list(self.engines.values())
+            self.engines.clear()
+        for _, engine in cached_engines:
+            engine.dispose()
+
+    def reset_after_fork(self):
+        """Forget engines inherited from a parent process without closing the parent's connections."""
+        with self.lock:
+            for _, engine in self.engines.values():
+                engine.dispose(close=False)
+            self.engines.clear()
+
+
+# Shared registry for the whole process
+engine_registry = EngineRegistry()
+atexit.register(engine_registry.dispose_all)
@@ -0,0 +1,180 @@
+import collections
+import datetime
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from EngineRegistry import engine_registry
+
+# Connections checked at the same time
+DEFAULT_FAN_OUT = 16
+# Seconds a single connection may take before it is reported as timed out
+DEFAULT_TIMEOUT = 10
+# Checks remembered per connection
+HISTORY_LENGTH = 10
+
+
+class HealthResult:
+    """Outcome of one health check of a connection."""
+
+    def __init__(self, connection_id, ok, connect_ms=None, query_ms=None, error=''):
+        self.connection_id = connection_id
+        self.ok = ok
+        self.connect_ms = connect_ms
+        self.query_ms = query_ms
+        self.error = error
+        self.checked_at = datetime.datetime.now()
+
+    def describe(self):
+        if self.ok:
+            return f"OK  {self.connect_ms:.0f} ms / {self.query_ms:.1f} ms"
+        return "Failed"
+
+    def __repr__(self):
+        return f"HealthResult({self.connection_id!r}, {self.describe()!r})"
+
+
+def check_connection(connection_id, timeout=DEFAULT_TIMEOUT):
+    """Open a fresh connection and time the connect and a SELECT 1 round trip."""
+    try:
+        engine = engine_registry.create_unpooled_engine(connection_id, connect_timeout=timeout)
+    except Exception as e:
+        return HealthResult(connection_id, False, error=str(e))
+
+    query = text("SELECT 1 FROM DUAL" if engine.dialect.name == 'oracle' else "SELECT 1")
+    try:
+        started = time.perf_counter()
+        with engine.connect() as connection:
+            connected = time.perf_counter()
+            connection.execute(query).scalar()
+            finished = time.perf_counter()
+        return HealthResult(connection_id, True, (connected - started) * 1000, (finished - connected) * 1000)
+    except Exception as e:
+        return HealthResult(connection_id, False, error=str(e).splitlines()[0] if str(e) else type(e).__name__)
+    finally:
+        engine.dispose()
+
+
+def check_all(connection_ids, fan_out=DEFAULT_FAN_OUT, timeout=DEFAULT_TIMEOUT, progress=None, cancel_token=None):
+    """
+    Check many connections concurrently, at most `fan_out` at a time, calling `progress(result)`
+    as each one completes. Connections still pending `timeout` seconds after they started
+    are reported as timed out instead of being waited for, even if the driver has no connect timeout.
+    Checks run on daemon threads, so a driver hanging past its timeout never keeps the program
+    from exiting, and a timed out check gives its slot to the next one while its thread hangs on.
+    """
+    results = {}
+    finished = queue.Queue()
+    slots = threading.Semaphore(fan_out)
+    holding = set()  # connections whose check holds a slot
+    lock = threading.Lock()
+    started = {}
+    stopped = threading.Event()
+
+    def release(connection_id):
+        """Free the slot of a check once, when it finishes or when it is reported as timed out."""
+        with lock:
+            if connection_id not in holding:
+                return
+            holding.discard(connection_id)
+        slots.release()
+
+    def run(connection_id):
+        slots.acquire()
+        with lock:
+            holding.add(connection_id)
+        try:
+            if stopped.is_set():
+                return
+            started[connection_id] = time.perf_counter()
+            finished.put(check_connection(connection_id, timeout))
+        finally:
+            release(connection_id)
+
+    for connection_id in connection_ids:
+        threading.Thread(target=run, args=(connection_id,), name=f'nocdc-health-{connection_id}', daemon=True).start()
+
+    pending = set(connection_ids)
+    try:
+        while pending:
+            done = []
+            try:
+                done.append(finished.get(timeout=0.1))
+                while True:
+                    done.append(finished.get_nowait())
+            except queue.Empty:
+                pass
+            for result in done:
+                if result.connection_id in pending:
+                    pending.discard(result.connection_id)
+                    results[result.connection_id] = result
+                    if progress is not None:
+                        progress(result)
+
+            if cancel_token is not None and cancel_token.is_cancelled():
+                break
+
+            now = time.perf_counter()
+            for connection_id in list(pending):
+                if connection_id in started and now - started[connection_id] > timeout:
+                    pending.discard(connection_id)
+                    release(connection_id)
+                    result = HealthResult(connection_id, False, error=f"Timed out after {timeout} seconds")
+                    results[connection_id] = result
+                    if progress is not None:
+                        progress(result)
+    finally:
+        # Checks not started yet are skipped; hung drivers are left to finish on their own
+        stopped.set()
+    return [results[connection_id] for connection_id in connection_ids if connection_id in results]
+
+
+class HealthHistory:
+    """Rolling window of the last health checks of every connection."""
+
+    def __init__(self, length=HISTORY_LENGTH):
+        self.length = length
+        self.results = {}
+
+    def record(self, result):
+        self.results.setdefault(result.connection_id, collections.deque(maxlen=self.length)).append(result)
+
+    def latest(self, connection_id):
+        history = self.results.get(connection_id)
+        return history[-1] if history else None
+
+    def history(self, connection_id):
+        return list(self.results.get(connection_id, []))
+
+    def forget(self, connection_id):
+        self.results.pop(connection_id, None)
+
+    def is_flapping(self, connection_id):
+        """True when the status changed more than once within the window."""
+        statuses = [result.ok for result in self.history(connection_id)]
+        return sum(1 for a, b in zip(statuses, statuses[1:]) if a != b) > 1
+
+    def average_connect_ms(self, connection_id):
+        latencies = [result.connect_ms for result in self.history(connection_id) if result.ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def summary(self, connection_id):
+        """Short text for the table: latest status plus one mark per remembered check."""
+        latest = self.latest(connection_id)
+        if latest is None:
+            return ''
+        marks = ''.join('+' if result.ok else 'x' for result in self.history(connection_id))
+        flag = '  (flapping)' if self.is_flapping(connection_id) else ''
+        return f"{latest.describe()}  [{marks}]{flag}"
+
+    def tooltip(self, connection_id):
+        lines = []
+        for result in reversed(self.history(connection_id)):
+            when = result.checked_at.strftime('%H:%M:%S')
+            lines.append(f"{when}  {result.describe()}" + (f"  {result.error}" if result.error else ''))
+        average = self.average_connect_ms(connection_id)
+        if average is not None:
+            lines.append(f"Average connect: {average:.0f} ms")
+        return '\n'.join(lines)
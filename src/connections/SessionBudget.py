@@ -0,0 +1,105 @@
+import contextlib
+import contextvars
+import threading
+
+from EngineRegistry import engine_registry
+
+# connection_id -> sessions taken by the code running in this context, e.g. a scheduled process
+held_sessions = contextvars.ContextVar('nocdc_held_sessions', default={})
+
+
+class SessionBudget:
+    """
+    Sessions every connection may have open at once in this program, shared by the scheduler and the
+    workers of whatever it runs. The limit is `max_sessions` of the connection's ini section, which also
+    caps the pool of its engine (see EngineRegistry.get_pool_settings); connections without it are only
+    limited by their pool. Sessions taken by a scheduled process are marked as held in its context,
+    so a PartitionedExtract inside it counts its first worker against them instead of waiting for more.
+    """
+
+    def __init__(self, registry=engine_registry):
+        self.registry = registry
+        self.limits = {}  # connection_id -> limit set here instead of in the ini file
+        self.in_use = {}  # connection_id -> sessions taken
+        self.condition = threading.Condition()
+
+    def set_limit(self, connection_id, limit):
+        """Override the limit of a connection, None to use max_sessions again."""
+        with self.condition:
+            if limit is None:
+                self.limits.pop(connection_id, None)
+            else:
+                self.limits[connection_id] = int(limit)
+            self.condition.notify_all()
+
+    def limit(self, connection_id):
+        """Sessions the connection may have open at once, or None when unlimited."""
+        if connection_id in self.limits:
+            return self.limits[connection_id]
+        try:
+            section = self.registry.get_section(connection_id)
+        except KeyError:
+            return None  # Engines registered by URL
+        return int(section['max_sessions']) if section.get('max_sessions') else None
+
+    def available(self, connection_id):
+        limit = self.limit(connection_id)
+        return limit is None or self.in_use.get(connection_id, 0) < limit
+
+    def try_acquire(self, connection_ids):
+        """Take one session of every connection if all of them have one free; returns whether it did."""
+        with self.condition:
+            if not all(self.available(connection_id) for connection_id in connection_ids):
+                return False
+            for connection_id in connection_ids:
+                self.in_use[connection_id] = self.in_use.get(connection_id, 0) + 1
+            return True
+
+    def acquire(self, connection_ids):
+        """Take one session of every connection, waiting until all of them have one free."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.try_acquire(connection_ids))
+
+    def release(self, connection_ids, count=1):
+        with self.condition:
+            for connection_id in connection_ids:
+                self.in_use[connection_id] = max(self.in_use.get(connection_id, 0) - count, 0)
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def holding(self, connection_ids):
+        """Mark sessions already taken, e.g. by the scheduler for a process, as held by this context."""
+        held = dict(held_sessions.get())
+        for connection_id in connection_ids:
+            held[connection_id] = held.get(connection_id, 0) + 1
+        token = held_sessions.set(held)
+        try:
+            yield
+        finally:
+            held_sessions.reset(token)
+
+    @contextlib.contextmanager
+    def sessions(self, connection_ids, wanted):
+        """
+        Take up to `wanted` sessions of every connection and yield how many, at least one. Sessions
+        held by this context count as the first one; otherwise the first is waited for, and the
+        others are only taken if they are free right now, so concurrent workers never deadlock.
+        """
+        held = held_sessions.get()
+        granted = 1 if all(held.get(connection_id, 0) for connection_id in connection_ids) else 0
+        taken = 0
+        if not granted:
+            self.acquire(connection_ids)
+            granted = taken = 1
+        try:
+            while granted < wanted and self.try_acquire(connection_ids):
+                granted += 1
+                taken += 1
+            yield granted
+        finally:
+            if taken:
+                self.release(connection_ids, taken)
+
+
+# Shared budget for the whole program
+session_budget = SessionBudget()
@@ -0,0 +1,145 @@
+import inspect
+import subprocess
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+
+class Cancelled(Exception):
+    """Raised inside a task when its worker was cancelled."""
+
+
+class CancelToken:
+    """Flag shared between the GUI thread and a running task."""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise Cancelled()
+
+
+class WorkerSignals(QObject):
+    """Signals of a Worker, delivered to slots in the GUI thread."""
+    progress = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Run a function on the global QThreadPool and report back through signals.
+    If the function accepts `cancel_token` or `progress` keyword arguments they are passed in,
+    so long tasks can stop early and report progress. When `timeout` (seconds) expires or the
+    worker is cancelled, the GUI gets `error`/`cancelled` right away and any late result of the
+    task is dropped; the task itself stops at its next cancellation check or driver timeout.
+    """
+
+    def __init__(self, fn, *args, timeout=None, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.signals = WorkerSignals()
+        self.cancel_token = CancelToken()
+        self.done = False
+        self.lock = threading.Lock()
+        self.timer = None
+
+        parameters = inspect.signature(fn).parameters
+        if 'cancel_token' in parameters:
+            self.kwargs['cancel_token'] = self.cancel_token
+        if 'progress' in parameters:
+            self.kwargs['progress'] = self.report_progress
+
+    def report_progress(self, value):
+        if not self.cancel_token.is_cancelled():
+            self.signals.progress.emit(value)
+
+    def finish(self):
+        """Mark the worker as done; returns False if it already finished, timed out or was cancelled."""
+        with self.lock:
+            if self.done:
+                return False
+            self.done = True
+            return True
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Cancelled:
+            if self.finish():
+                self.signals.cancelled.emit()
+                self.signals.finished.emit()
+        except Exception as e:
+            if self.finish():
+                self.signals.error.emit(str(e))
+                self.signals.finished.emit()
+        else:
+            if self.finish():
+                self.signals.result.emit(result)
+                self.signals.finished.emit()
+
+    def cancel(self):
+        """Ask the task to stop and release the GUI from waiting on it."""
+        self.cancel_token.cancel()
+        if self.finish():
+            self.signals.cancelled.emit()
+            self.signals.finished.emit()
+
+    def expire(self):
+        self.cancel_token.cancel()
+        if self.finish():
+            self.signals.error.emit(f"Timed out after {self.timeout} seconds")
+            self.signals.finished.emit()
+
+
+# Workers currently running, kept referenced until they finish
+active_workers = set()
+
+
+def start_worker(worker, pool=None):
+    """Queue a worker on the thread pool and arm its timeout in the GUI thread."""
+    active_workers.add(worker)
+    worker.signals.finished.connect(lambda: active_workers.discard(worker))
+    if worker.timeout:
+        worker.timer = QTimer()
+        worker.timer.setSingleShot(True)
+        worker.timer.timeout.connect(worker.expire)
+        worker.signals.finished.connect(worker.timer.stop)
+        worker.timer.start(int(worker.timeout * 1000))
+    (pool or QThreadPool.globalInstance()).start(worker)
+    return worker
+
+
+def cancel_all_workers():
+    """Cancel every running worker, e.g. when the application closes."""
+    for worker in list(active_workers):
+        worker.cancel()
+
+
+def run_subprocess(args, cancel_token=None, poll_interval=0.1):
+    """Run a command to completion, killing it if the worker is cancelled. Returns its output."""
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    while True:
+        try:
+            output, _ = process.communicate(timeout=poll_interval)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel_token is not None and cancel_token.is_cancelled():
+                process.kill()
+                process.communicate()
+                raise Cancelled()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, output)
+    return output
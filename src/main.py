@@ -1,11 +1,23 @@
+import os
 import sys
+
+# Modules of the connections and processes packages import each other by name
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(SRC_DIR, 'connections'), os.path.join(SRC_DIR, 'processes')]
+
 from PyQt6.QtWidgets import QApplication, QWidget, QLineEdit, QPushButton, QMessageBox, QCheckBox, QLabel
 
-import connectionMenu
+from ConnectionMenu import MainWindow as ConnectionMenu
+from ProcessMenu import ProcessMenu
+from Scheduler import Scheduler
+from Workers import cancel_all_workers
 
 class noCDC(QWidget):
     def __init__(self):
         super().__init__()
+        # Scheduled processes keep running while the application is open, whichever windows are shown
+        self.scheduler = Scheduler()
+        self.scheduler.start()
         self.initializeUI()
 
     def initializeUI(self):
@@ -28,13 +40,16 @@ class noCDC(QWidget):
         process_button.clicked.connect(self.processMenu)
 
     def ConnectionsMenu(self):
-        self.conn_menu = connectionMenu.connectionMenu()
+        self.conn_menu = ConnectionMenu()
         self.conn_menu.show()
 
     def processMenu(self):
-        print("Click")
+        self.process_menu = ProcessMenu(scheduler=self.scheduler)
+        self.process_menu.show()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(cancel_all_workers)
     noCDC = noCDC()
-    sys.exit(app.exec())
\ No newline at end of file
+    app.aboutToQuit.connect(lambda: noCDC.scheduler.stop(wait=False))
+    sys.exit(app.exec())
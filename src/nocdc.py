@@ -0,0 +1,288 @@
+"""
+Command line and daemon entry point of NoCDC, for hosts without a display.
+
+    python src/nocdc.py connections list
+    python src/nocdc.py connections test [CONNECTION ...]
+    python src/nocdc.py processes list
+    python src/nocdc.py run PROCESS [PROCESS ...]
+    python src/nocdc.py daemon [--metrics-port 9464]
+    python src/nocdc.py ddl CONNECTION TABLE --target-type postgresql
+    python src/nocdc.py bootstrap PROCESS [--workers 4] [--replace]
+
+It reads the same connections.ini and processes.ini as the GUI and never imports PyQt. Heavy
+modules (SQLAlchemy, drivers, pyarrow) are imported inside the commands that need them, so
+listing definitions stays fast. With --profile the import cost of SQLAlchemy and of every
+database driver loaded during the command is printed to stderr at exit.
+
+`ddl` prints the CREATE TABLE and index statements of a copy of a table for any connection type of
+definitions.json, written for the oldest server version still supported (see TypeMapping's
+OFFLINE_SERVER_VERSIONS). `bootstrap` creates the target tables of a process that way, loads them in
+parallel key ranges and indexes them afterwards, then lets incremental runs carry on from there.
+
+Every run is appended to a JSON lines run log (--run-log) with its stage timings, row counters
+and round trips per connection. The last run of every process is also exported in the
+Prometheus text format, to a file with --metrics-file and by the daemon over HTTP with
+--metrics-port.
+"""
+import argparse
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+# Modules of the connections and processes packages import each other by name
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(SRC_DIR, 'connections'), os.path.join(SRC_DIR, 'processes')]
+
+
+def use_files(args):
+    """Point the shared engine registry at the connections file given on the command line."""
+    from DriverRegistry import timed_import
+    timed_import('sqlalchemy')
+    from EngineRegistry import engine_registry
+    engine_registry.ini_file = args.connections_file
+    if args.memory_limit:
+        from BatchSizer import batch_sizers
+        batch_sizers.set_rss_limit(args.memory_limit * 1024 * 1024)
+    return engine_registry
+
+
+def list_connections(args):
+    from ConnectionSettings import load_connections, load_definitions, normalize_type
+    config = load_connections(args.connections_file)
+    definitions = load_definitions()
+    for connection_id in config.sections():
+        section = config[connection_id]
+        db_type = normalize_type(section.get('type'))
+        type_name = definitions.get(db_type, {}).get('display_name', db_type)
+        print(f"{connection_id:<24} {type_name:<22} {section.get('host', '')}/{section.get('database', '')}")
+    return 0
+
+
+def test_connections(args):
+    use_files(args)
+    from ConnectionSettings import load_connections
+    from HealthCheck import check_all
+
+    connection_ids = args.connections or load_connections(args.connections_file).sections()
+    failed = 0
+    for result in check_all(connection_ids, fan_out=args.fan_out, timeout=args.timeout,
+                            progress=lambda result: print(f"{result.connection_id:<24} {result.describe()}"
+                                                          + (f"  {result.error}" if result.error else ''),
+                                                          flush=True)):
+        failed += not result.ok
+    return 1 if failed else 0
+
+
+def list_processes(args):
+    from ProcessDefinitions import is_enabled, load_processes, process_tables
+    config = load_processes(args.processes_file)
+    for process_id in config.sections():
+        process = config[process_id]
+        schedule = process.get('cron') or (f"every {process['interval']}" if process.get('interval') else 'on demand')
+        if not is_enabled(process):
+            schedule = 'disabled'
+        print(f"{process_id:<24} {process.get('source', '')} -> {process.get('target', '')}  "
+              f"[{process.get('mode') or 'incremental'}] {', '.join(process_tables(process))}  ({schedule})")
+    return 0
+
+
+def run_processes(args):
+    use_files(args)
+    from ProcessDefinitions import process_run
+    from RunMetrics import PrometheusExporter, RunMetrics, append_run_log, format_run
+    from Scheduler import run_process
+
+    exporter = PrometheusExporter(args.metrics_file)
+    failed = 0
+    for process_id in args.processes:
+        metrics = RunMetrics(process_id)
+        try:
+            with process_run(process_id, args.processes_file), metrics.activate():
+                results = run_process(process_id, args.processes_file)
+        except Exception as e:
+            failed += 1
+            print(f"{process_id}: failed: {e}", file=sys.stderr, flush=True)
+            results = {}
+        finally:
+            if args.run_log:
+                append_run_log(metrics, args.run_log)
+            exporter.record(metrics)
+        for table_name, result in results.items():
+            print(f"{process_id}.{table_name}: {result}", flush=True)
+        print(format_run(metrics), file=sys.stderr, flush=True)
+    return 1 if failed else 0
+
+
+def print_ddl(args):
+    engine_registry = use_files(args)
+    from SchemaCache import schema_cache
+    from TypeMapping import TableDefinition, dialect_for_type
+
+    source_table = schema_cache.get_table(args.connection, args.table, args.schema)
+    definition = TableDefinition(source_table, dialect_for_type(args.target_type), args.target_table,
+                                 args.target_schema, engine_registry.get_engine(args.connection).dialect)
+    for statement in definition.sql():
+        print(statement + ';\n')
+    for name, reason in definition.skipped_indexes:
+        print(f"-- {name} left out: {reason}")
+    return 0
+
+
+def bootstrap_processes(args):
+    use_files(args)
+    from InitialLoad import bootstrap_process
+    from RunMetrics import PrometheusExporter, RunMetrics, append_run_log, format_run
+
+    exporter = PrometheusExporter(args.metrics_file)
+    failed = 0
+    for process_id in args.processes:
+        metrics = RunMetrics(process_id)
+        try:
+            with metrics.activate():
+                results = bootstrap_process(process_id, args.processes_file, partitions=args.partitions,
+                                            workers=args.workers, executor=args.executor, replace=args.replace)
+        except Exception as e:
+            failed += 1
+            print(f"{process_id}: failed: {e}", file=sys.stderr, flush=True)
+            results = {}
+        finally:
+            if args.run_log:
+                append_run_log(metrics, args.run_log)
+            exporter.record(metrics)
+        for table_name, result in results.items():
+            print(f"{process_id}.{table_name}: {result}", flush=True)
+        print(format_run(metrics), file=sys.stderr, flush=True)
+    return 1 if failed else 0
+
+
+def serve_metrics(exporter, port):
+    """Serve the Prometheus text of `exporter` on http://0.0.0.0:port/metrics from a daemon thread."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = exporter.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # scrapes every few seconds would drown the run output
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='nocdc-metrics', daemon=True).start()
+    return server
+
+
+def run_daemon(args):
+    """Run the scheduler until SIGINT or SIGTERM, then let running processes finish."""
+    use_files(args)
+    import signal
+    import threading
+    from Scheduler import Scheduler
+
+    scheduler = Scheduler(args.processes_file, max_workers=args.max_workers, run_log=args.run_log,
+                          metrics_file=args.metrics_file)
+    server = serve_metrics(scheduler.exporter, args.metrics_port) if args.metrics_port else None
+
+    def report(event, status):
+        if event == 'failed':
+            print(f"{status.process_id}: failed: {status.error.splitlines()[0]}", file=sys.stderr, flush=True)
+        elif event not in ('updated', 'progress'):
+            detail = f": {status.result}" if event == 'finished' else ''
+            print(f"{status.process_id}: {event}{detail}", flush=True)
+    scheduler.add_listener(report)
+
+    stopped = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stopped.set())
+    scheduler.start()
+    print(f"Scheduling processes of {args.processes_file}, stop with Ctrl+C", flush=True)
+    while not stopped.wait(1):
+        pass
+    print("Stopping, waiting for running processes to finish", flush=True)
+    scheduler.stop(wait=True)
+    if server is not None:
+        server.shutdown()
+    return 0
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--run-log', default="data/logs/runs.jsonl", help="JSON lines file every run is appended to")
+    parser.add_argument('--metrics-file', help="file the last run of every process is written to for Prometheus")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='nocdc', description="Synchronise database tables without CDC.")
+    parser.add_argument('--connections-file', default="data/connections.ini")
+    parser.add_argument('--processes-file', default="data/processes.ini")
+    parser.add_argument('--profile', action='store_true', help="print the import cost of drivers at exit")
+    parser.add_argument('--memory-limit', type=int, metavar='MB',
+                        help="resident memory batches are shrunk to stay below (default 1024)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    connections = commands.add_parser('connections', help="list or test connections")
+    connection_commands = connections.add_subparsers(dest='action', required=True)
+    connection_commands.add_parser('list', help="list the defined connections").set_defaults(handler=list_connections)
+    test = connection_commands.add_parser('test', help="connect to every connection, or the ones given")
+    test.add_argument('connections', nargs='*')
+    test.add_argument('--timeout', type=int, default=10, help="seconds per connection")
+    test.add_argument('--fan-out', type=int, default=16, help="connections tested at the same time")
+    test.set_defaults(handler=test_connections)
+
+    processes = commands.add_parser('processes', help="list processes")
+    process_commands = processes.add_subparsers(dest='action', required=True)
+    process_commands.add_parser('list', help="list the defined processes").set_defaults(handler=list_processes)
+
+    run = commands.add_parser('run', help="run processes once, in the foreground")
+    run.add_argument('processes', nargs='+')
+    add_metrics_arguments(run)
+    run.set_defaults(handler=run_processes)
+
+    ddl = commands.add_parser('ddl', help="print the DDL of a copy of a table for another connection type")
+    ddl.add_argument('connection', help="connection the table is read from")
+    ddl.add_argument('table')
+    ddl.add_argument('--schema')
+    ddl.add_argument('--target-type', required=True, help="connection type of definitions.json, e.g. postgresql")
+    ddl.add_argument('--target-table', help="name of the copy, the source table's by default")
+    ddl.add_argument('--target-schema')
+    ddl.set_defaults(handler=print_ddl)
+
+    bootstrap = commands.add_parser('bootstrap', help="create, load and index the target tables of processes")
+    bootstrap.add_argument('processes', nargs='+')
+    bootstrap.add_argument('--partitions', type=int, default=8, help="key ranges every table is split into")
+    bootstrap.add_argument('--workers', type=int, default=4, help="key ranges loaded at the same time")
+    bootstrap.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    bootstrap.add_argument('--replace', action='store_true', help="drop target tables that already exist")
+    add_metrics_arguments(bootstrap)
+    bootstrap.set_defaults(handler=bootstrap_processes)
+
+    daemon = commands.add_parser('daemon', help="run processes on their schedules until stopped")
+    daemon.add_argument('--max-workers', type=int, default=4, help="processes running at the same time")
+    daemon.add_argument('--metrics-port', type=int, help="serve Prometheus metrics over HTTP on this port")
+    add_metrics_arguments(daemon)
+    daemon.set_defaults(handler=run_daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    finally:
+        if args.profile:
+            from DriverRegistry import format_profile
+            print(format_profile(), file=sys.stderr)
+            print(f"{(time.perf_counter() - STARTED) * 1000:9.1f} ms  total", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import time
+
+from EngineRegistry import engine_registry
+from RunMetrics import estimated_bytes
+
+# Size of the first batch of a connection, before anything has been measured
+INITIAL_BATCH_SIZE = 10000
+MIN_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 200000
+# Wall time one batch should take, round trip included: long enough to amortise the round trip
+# of a fast link, short enough that progress, checkpoints and a failed batch stay cheap
+TARGET_BATCH_SECONDS = 1.0
+# A batch may never grow by more than this factor at once
+MAX_GROWTH = 4.0
+# Weight of the newest measurement in the moving averages
+SMOOTHING = 0.3
+# Resident memory the process should stay below, and the share of the headroom one batch may use
+DEFAULT_RSS_LIMIT = 1024 * 1024 * 1024
+BATCH_MEMORY_SHARE = 0.25
+# Fetched rows take several times their size as text once they are Python objects
+ROW_OVERHEAD_FACTOR = 6
+ROUND_TRIP_PINGS = 3
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it cannot be read cheaply."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is the high-water mark, in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class BatchSizer:
+    """
+    Batch size of one direction (reading or writing) of one connection, adapted after every batch.
+    Batches are sized to take about TARGET_BATCH_SECONDS at the measured time per row, and the round
+    trip is spent out of that time, so fast local links get large batches and slow or high-latency
+    links small ones, down to `min_size` once the round trip alone takes the whole target: a batch
+    lost on a WAN link is then cheap to retry, and progress keeps moving. A batch is also capped
+    to a share of the memory left below `rss_limit`, so batches shrink as the process nears it.
+    A `fixed_size` turns adaptation off.
+    """
+
+    def __init__(self, initial_size=INITIAL_BATCH_SIZE, min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE,
+                 target_seconds=TARGET_BATCH_SECONDS, rss_limit=DEFAULT_RSS_LIMIT, fixed_size=None):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.target_seconds = target_seconds
+        self.rss_limit = rss_limit
+        self.fixed_size = fixed_size
+        self.batch_size = fixed_size or min(max(initial_size, self.min_size), self.max_size)
+        self.round_trip = None   # seconds of an empty round trip
+        self.row_seconds = None  # seconds per row on top of the round trip, moving average
+        self.row_bytes = None    # bytes per row in memory, moving average
+        self.lock = threading.Lock()
+
+    def measure_round_trip(self, connection):
+        """Time a few pings on an open SQLAlchemy connection, keeping the fastest."""
+        if self.round_trip is not None or self.fixed_size:
+            return
+        dbapi_connection = connection.connection.dbapi_connection
+        timings = []
+        for _ in range(ROUND_TRIP_PINGS):
+            started = time.perf_counter()
+            connection.dialect.do_ping(dbapi_connection)
+            timings.append(time.perf_counter() - started)
+        with self.lock:
+            self.round_trip = min(timings)
+
+    def observe(self, rows, seconds, size_bytes=None):
+        """Account for a batch of `rows` rows that took `seconds`, and resize the next batch."""
+        if rows <= 0 or self.fixed_size:
+            return
+        with self.lock:
+            row_seconds = max(seconds - (self.round_trip or 0.0), 0.0) / rows
+            self.row_seconds = row_seconds if self.row_seconds is None else \
+                SMOOTHING * row_seconds + (1 - SMOOTHING) * self.row_seconds
+            if size_bytes:
+                row_bytes = size_bytes * ROW_OVERHEAD_FACTOR / rows
+                self.row_bytes = row_bytes if self.row_bytes is None else \
+                    SMOOTHING * row_bytes + (1 - SMOOTHING) * self.row_bytes
+            self.batch_size = self.next_size()
+
+    def next_size(self):
+        round_trip = self.round_trip or 0.0
+        size = self.max_size
+        if self.row_seconds:
+            size = max(self.target_seconds - round_trip, 0.0) / self.row_seconds
+        size = min(size, self.batch_size * MAX_GROWTH)
+
+        rss = current_rss() if self.row_bytes and self.rss_limit else None
+        if rss is not None:
+            size = min(size, max(self.rss_limit - rss, 0) * BATCH_MEMORY_SHARE / self.row_bytes)
+        return int(min(max(size, self.min_size), self.max_size))
+
+    def __repr__(self):
+        round_trip = f"{self.round_trip * 1000:.1f} ms" if self.round_trip is not None else 'unmeasured'
+        return f"BatchSizer(batch_size={self.batch_size}, round_trip={round_trip})"
+
+
+class BatchSizers:
+    """
+    One BatchSizer per connection and direction, shared by every process of the application so
+    what was learned about a link carries over to the next run, until its ini section changes.
+    A section can fix the size with `batch_size` or bound it with `min_batch_size` and `max_batch_size`.
+    """
+
+    def __init__(self, registry=engine_registry, rss_limit=DEFAULT_RSS_LIMIT):
+        self.registry = registry
+        self.rss_limit = rss_limit
+        self.sizers = {}  # (connection_id, direction) -> (section fingerprint, sizer)
+        self.lock = threading.Lock()
+
+    def settings(self, connection_id):
+        try:
+            section = self.registry.get_section(connection_id)
+        except KeyError:
+            # Engines registered by URL have no ini section
+            return {}
+        return {key: int(section[key]) for key in ('batch_size', 'min_batch_size', 'max_batch_size')
+                if section.get(key)}
+
+    def get(self, engine, direction='read'):
+        """The sizer of `engine`'s connection for 'read' (fetch sizes) or 'write' (apply chunks)."""
+        connection_id = self.registry.connection_id_of(engine)
+        key = (connection_id or str(engine.url), direction)
+        fingerprint = self.registry.section_fingerprint(connection_id) if connection_id else None
+        with self.lock:
+            cached = self.sizers.get(key)
+            if cached is None or cached[0] != fingerprint:
+                settings = self.settings(connection_id) if connection_id else {}
+                cached = (fingerprint, BatchSizer(min_size=settings.get('min_batch_size', MIN_BATCH_SIZE),
+                                                  max_size=settings.get('max_batch_size', MAX_BATCH_SIZE),
+                                                  rss_limit=self.rss_limit, fixed_size=settings.get('batch_size')))
+                self.sizers[key] = cached
+            return cached[1]
+
+    def set_rss_limit(self, rss_limit):
+        with self.lock:
+            self.rss_limit = rss_limit
+            for _, sizer in self.sizers.values():
+                sizer.rss_limit = rss_limit
+
+
+def iter_chunks(rows, sizer):
+    """
+    Slice `rows` into chunks sized by `sizer`. The time until the next chunk is requested is what the
+    caller spent writing the chunk, and is fed back to the sizer with the chunk's estimated size, so
+    the memory cap applies to writes as well.
+    """
+    start = 0
+    while start < len(rows):
+        chunk = rows[start:start + sizer.batch_size]
+        size_bytes = estimated_bytes(chunk)
+        started = time.perf_counter()
+        yield chunk
+        sizer.observe(len(chunk), time.perf_counter() - started, size_bytes)
+        start += len(chunk)
+
+
+# Shared sizers for the whole process
+batch_sizers = BatchSizers()
@@ -0,0 +1,68 @@
+import math
+import os
+import random
+
+import numpy as np
+
+from RowHasher import MASK_64, splitmix64
+
+# Bit arrays larger than this are memory-mapped from a file instead of held in memory
+MAX_MEMORY_BYTES = 256 * 1024 * 1024
+
+
+class BloomFilter:
+    """
+    Set membership of 64-bit row hashes (see RowHasher.hash_rows) in a fixed bit array. A hash that
+    was added is always reported as present; one that was not is reported as present with a
+    probability close to `error_rate` when `capacity` hashes were added. The `seed` picks the bits,
+    so filters built with different seeds give false positives on different keys.
+    Filters too large for MAX_MEMORY_BYTES are spilled to a memory-mapped file at `path`.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, seed=None, path=None):
+        capacity = max(int(capacity), 1)
+        self.bit_count = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hash_count = max(int(round(self.bit_count / capacity * math.log(2))), 1)
+        self.seed = random.getrandbits(64) if seed is None else seed & MASK_64
+        self.path = None
+        byte_count = (self.bit_count + 7) // 8
+        if path is not None and byte_count > MAX_MEMORY_BYTES:
+            self.path = path
+            self.bits = np.memmap(path, dtype=np.uint8, mode='w+', shape=(byte_count,))
+        else:
+            self.bits = np.zeros(byte_count, dtype=np.uint8)
+        self.count = 0
+
+    def positions(self, hashes):
+        """Bit positions of every hash, one row of `hash_count` positions per hash (double hashing)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        first = splitmix64(hashes ^ np.uint64(self.seed))
+        second = splitmix64(first) | np.uint64(1)
+        steps = np.arange(self.hash_count, dtype=np.uint64)
+        return (first[:, None] + steps[None, :] * second[:, None]) % np.uint64(self.bit_count)
+
+    def add(self, hashes):
+        positions = self.positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(hashes)
+
+    def contains(self, hashes):
+        """Boolean array, False where a hash was certainly never added."""
+        positions = self.positions(hashes)
+        bytes_ = self.bits[positions >> np.uint64(3)]
+        return np.all((bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & 1, axis=1)
+
+    def false_positive_rate(self):
+        """Expected false positive rate given how many hashes were actually added."""
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    def close(self):
+        """Drop the bit array, and its file if it was spilled."""
+        self.bits = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __repr__(self):
+        return (f"BloomFilter(bits={self.bit_count}, hashes={self.hash_count}, count={self.count}"
+                f"{', spilled' if self.path else ''})")
@@ -0,0 +1,130 @@
+import io
+import os
+import tempfile
+import uuid
+
+from BatchSizer import batch_sizers, iter_chunks
+
+# Rows sent per statement or per driver call where a fixed number is asked for
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def csv_value(value, binary_prefix='\\x'):
+    """
+    Format a value for CSV loading: NULL is an unquoted empty field, everything else is quoted.
+    Bytes are written in hex after `binary_prefix`, the \\x of PostgreSQL's bytea input by default.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = binary_prefix + bytes(value).hex()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def csv_text(rows, binary_prefix='\\x'):
+    return ''.join(','.join(csv_value(value, binary_prefix) for value in row) + '\n' for row in rows)
+
+
+def chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def copy_postgresql(connection, table, columns, parts):
+    """COPY FROM STDIN through the raw psycopg cursor."""
+    preparer = connection.dialect.identifier_preparer
+    sql = (f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) "
+           f"FROM STDIN WITH (FORMAT csv)")
+    cursor = connection.connection.cursor()
+    try:
+        for chunk in parts:
+            if connection.dialect.driver == 'psycopg2':
+                cursor.copy_expert(sql, io.StringIO(csv_text(chunk)))
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(csv_text(chunk))
+    finally:
+        cursor.close()
+
+
+def executemany_driver(connection, table, columns, parts, placeholder, fast_executemany=False):
+    """
+    Hand whole chunks to the driver's executemany: array binding on cx_Oracle/oracledb
+    and fast_executemany on pyodbc.
+    """
+    preparer = connection.dialect.identifier_preparer
+    placeholders = ', '.join(placeholder.format(i + 1) for i in range(len(columns)))
+    sql = (f"INSERT INTO {preparer.format_table(table)} "
+           f"({', '.join(preparer.quote(name) for name in columns)}) VALUES ({placeholders})")
+    cursor = connection.connection.cursor()
+    try:
+        if fast_executemany:
+            cursor.fast_executemany = True
+        for chunk in parts:
+            cursor.executemany(sql, [tuple(row) for row in chunk])
+    finally:
+        cursor.close()
+
+
+def put_copy_snowflake(connection, table, columns, parts):
+    """Upload CSV files to a user stage with PUT and load them with COPY INTO, binary columns as plain hex."""
+    preparer = connection.dialect.identifier_preparer
+    stage = f"@~/nocdc/{uuid.uuid4().hex}"
+    directory = tempfile.mkdtemp(prefix='nocdc_')
+    try:
+        for index, chunk in enumerate(parts):
+            path = os.path.join(directory, f"part_{index}.csv")
+            with open(path, 'w', newline='') as csv_file:
+                csv_file.write(csv_text(chunk, binary_prefix=''))
+            connection.exec_driver_sql(f"PUT 'file://{path.replace(os.sep, '/')}' '{stage}' AUTO_COMPRESS = TRUE")
+        connection.exec_driver_sql(
+            f"COPY INTO {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) "
+            f"FROM '{stage}' FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' "
+            f"EMPTY_FIELD_AS_NULL = TRUE BINARY_FORMAT = HEX) PURGE = TRUE"
+        )
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def insert_values(connection, table, columns, parts):
+    """
+    One executemany of a single INSERT statement per chunk. The statement is compiled once and
+    cached, and every row is bound on its own, so the number of bind parameters of a statement never
+    grows with the chunk. How the rows travel is up to the driver: PyMySQL and mysqlclient rewrite the
+    executemany into multi-row INSERTs of up to max_allowed_packet bytes, others run it row by row.
+    """
+    statement = table.insert()
+    for chunk in parts:
+        connection.execute(statement, [dict(zip(columns, row)) for row in chunk])
+
+
+def bulk_insert(connection, table, columns, rows, chunk_size=None):
+    """
+    Insert `rows` (sequences in `columns` order) using the fastest path of the connection's dialect,
+    falling back to an executemany of one INSERT statement for unknown dialects and drivers.
+    Without a `chunk_size` the rows sent per call are sized by the connection's write BatchSizer.
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    driver = connection.dialect.driver
+    if chunk_size:
+        parts = chunks(rows, chunk_size)
+    else:
+        sizer = batch_sizers.get(connection.engine, 'write')
+        sizer.measure_round_trip(connection)
+        parts = iter_chunks(rows, sizer)
+
+    if dialect == 'postgresql' and driver in ('psycopg2', 'psycopg'):
+        copy_postgresql(connection, table, columns, parts)
+    elif dialect == 'mssql' and driver == 'pyodbc':
+        executemany_driver(connection, table, columns, parts, '?', fast_executemany=True)
+    elif dialect == 'oracle' and driver in ('cx_oracle', 'oracledb'):
+        executemany_driver(connection, table, columns, parts, ':{}')
+    elif dialect == 'snowflake':
+        put_copy_snowflake(connection, table, columns, parts)
+    else:
+        # MySQL and unknown dialects
+        insert_values(connection, table, columns, parts)
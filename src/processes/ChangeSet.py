@@ -0,0 +1,196 @@
+import datetime
+import decimal
+import json
+import os
+
+import pyarrow as pa
+
+from ConfigStore import atomic_write
+from RowReader import DEFAULT_BATCH_SIZE
+from RunMetrics import stage
+from TableWriter import delete_keys, upsert_rows
+
+KINDS = ('inserts', 'updates', 'deletes')
+MANIFEST_FILE = 'manifest.json'
+# Extra column of the updates holding the names of the columns that changed
+CHANGED_COLUMN = '__changed'
+
+
+def arrow_type(column):
+    """Arrow type used to store a SQLAlchemy column; values without an exact Arrow type are kept as text."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is decimal.Decimal:
+        precision = getattr(column.type, 'precision', None)
+        scale = getattr(column.type, 'scale', None)
+        if precision and precision <= 38:
+            return pa.decimal128(precision, scale or 0)
+        return pa.string()
+    if python_type is datetime.datetime:
+        # Aware values are stored as UTC instants, naive ones as they are
+        return pa.timestamp('us', tz='UTC') if getattr(column.type, 'timezone', False) else pa.timestamp('us')
+    if python_type is datetime.date:
+        return pa.date32()
+    if python_type is bytes:
+        return pa.binary()
+    return pa.string()
+
+
+def arrow_schema(table, columns):
+    return pa.schema([pa.field(name, arrow_type(table.columns[name])) for name in columns])
+
+
+def record_batch(schema, rows):
+    """Build a RecordBatch column by column from row tuples, without a dict per row."""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if field.type == pa.string():
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def batch_rows(batch, names):
+    """
+    Row tuples of some columns of a RecordBatch, for the loaders, which all take Python values.
+    This copies the batch into Python objects, one batch at a time.
+    """
+    return list(zip(*[batch.column(name).to_pylist() for name in names]))
+
+
+class ChangeSet:
+    """
+    Inserted, updated and deleted rows of one table, stored column-wise as Arrow record batches.
+    Inserts and updates hold the full row, updates also the list of changed columns, and deletes
+    only the key columns. With a directory the batches are spilled to Arrow IPC files as they fill
+    up, and ChangeSet.open memory-maps them back without copying, so a change-set can be inspected,
+    replayed or applied after a restart. Applying it is not zero-copy: every batch is turned into
+    Python rows for the loaders (see batch_rows), so memory grows with one batch, not the change-set.
+    """
+
+    def __init__(self, table, key_columns, columns, directory=None, batch_size=DEFAULT_BATCH_SIZE, metadata=None):
+        self.key_columns = list(key_columns)
+        self.columns = list(columns)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault('table', table.name)
+
+        row_schema = arrow_schema(table, self.columns)
+        key_schema = arrow_schema(table, self.key_columns)
+        update_schema = row_schema.append(pa.field(CHANGED_COLUMN, pa.list_(pa.string())))
+        self.schemas = {'inserts': row_schema, 'updates': update_schema, 'deletes': key_schema}
+        self.pending = {kind: [] for kind in KINDS}
+        self.batches = {kind: [] for kind in KINDS}
+        self.counts = {kind: 0 for kind in KINDS}
+        self.writers = {}
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for kind in KINDS:
+                self.writers[kind] = pa.ipc.new_file(self.path(kind), self.schemas[kind])
+
+    def path(self, kind):
+        return os.path.join(self.directory, f"{kind}.arrow")
+
+    def add(self, kind, rows):
+        """
+        Append row tuples: full rows for inserts, full rows followed by the list of changed
+        column names for updates, and key tuples for deletes.
+        """
+        pending = self.pending[kind]
+        pending.extend(rows)
+        self.counts[kind] += len(rows)
+        while len(pending) >= self.batch_size:
+            self.flush(kind, pending[:self.batch_size])
+            del pending[:self.batch_size]
+
+    def flush(self, kind, rows):
+        batch = record_batch(self.schemas[kind], rows)
+        if kind in self.writers:
+            self.writers[kind].write_batch(batch)
+        else:
+            self.batches[kind].append(batch)
+
+    def close(self):
+        """Flush the remaining rows and, when spilling, finish the files and write the manifest."""
+        for kind in KINDS:
+            if self.pending[kind]:
+                self.flush(kind, self.pending[kind])
+                self.pending[kind] = []
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+        if self.directory is not None:
+            manifest = {
+                'key_columns': self.key_columns,
+                'columns': self.columns,
+                'counts': self.counts,
+                'metadata': self.metadata,
+                'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+            atomic_write(os.path.join(self.directory, MANIFEST_FILE), json.dumps(manifest, indent=4))
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-map a spilled change-set."""
+        with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        change_set = cls.__new__(cls)
+        change_set.key_columns = manifest['key_columns']
+        change_set.columns = manifest['columns']
+        change_set.directory = directory
+        change_set.metadata = manifest['metadata']
+        change_set.counts = manifest['counts']
+        change_set.pending = {kind: [] for kind in KINDS}
+        change_set.writers = {}
+        change_set.batches = {}
+        change_set.schemas = {}
+        for kind in KINDS:
+            reader = pa.ipc.open_file(pa.memory_map(change_set.path(kind), 'r'))
+            change_set.schemas[kind] = reader.schema
+            change_set.batches[kind] = [reader.get_batch(i) for i in range(reader.num_record_batches)]
+        change_set.batch_size = max((batch.num_rows for batches in change_set.batches.values()
+                                     for batch in batches), default=DEFAULT_BATCH_SIZE)
+        return change_set
+
+    def iter_batches(self, kind):
+        """Yield the Arrow record batches of one kind of change."""
+        if self.directory is not None and not self.batches.get(kind):
+            reader = pa.ipc.open_file(pa.memory_map(self.path(kind), 'r'))
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+        else:
+            yield from self.batches[kind]
+
+    def to_table(self, kind):
+        """All changes of one kind as an Arrow table, e.g. for inspection."""
+        return pa.Table.from_batches(list(self.iter_batches(kind)), schema=self.schemas[kind])
+
+    def is_empty(self):
+        return not any(self.counts.values())
+
+    def apply(self, engine, table):
+        """Apply the change-set to a target table in one transaction: deletes first, then upserts."""
+        # Reading the spill files and the commit count as applying, staging is timed by the writer
+        with stage('apply'), engine.begin() as connection:
+            for batch in self.iter_batches('deletes'):
+                delete_keys(connection, table, self.key_columns, batch_rows(batch, self.key_columns))
+            for kind in ('inserts', 'updates'):
+                for batch in self.iter_batches(kind):
+                    upsert_rows(connection, table, self.key_columns, batch_rows(batch, self.columns),
+                                columns=self.columns)
+
+    def __repr__(self):
+        return (f"ChangeSet({self.metadata.get('table')!r}, inserts={self.counts['inserts']}, "
+                f"updates={self.counts['updates']}, deletes={self.counts['deletes']})")
@@ -0,0 +1,81 @@
+import base64
+import datetime
+import decimal
+import json
+import os
+import uuid
+
+from ConfigStore import atomic_write
+
+
+def encode_value(value):
+    """Turn a watermark or key value into something JSON can store without losing its type."""
+    if isinstance(value, datetime.datetime):
+        return {'type': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'type': 'date', 'value': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'type': 'decimal', 'value': str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'type': 'bytes', 'value': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, uuid.UUID):
+        return {'type': 'uuid', 'value': str(value)}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+
+def decode_value(value):
+    """Inverse of encode_value."""
+    if isinstance(value, dict):
+        if value['type'] == 'datetime':
+            return datetime.datetime.fromisoformat(value['value'])
+        if value['type'] == 'date':
+            return datetime.date.fromisoformat(value['value'])
+        if value['type'] == 'decimal':
+            return decimal.Decimal(value['value'])
+        if value['type'] == 'bytes':
+            return base64.b64decode(value['value'])
+        if value['type'] == 'uuid':
+            return uuid.UUID(value['value'])
+    if isinstance(value, list):
+        return tuple(decode_value(item) for item in value)
+    return value
+
+
+class CheckpointStore:
+    """Persist the high-water mark of each process as a JSON file, replaced atomically on every save."""
+
+    def __init__(self, directory="data/checkpoints"):
+        self.directory = directory
+
+    def path(self, process_id):
+        return os.path.join(self.directory, f"{process_id}.json")
+
+    def load(self, process_id):
+        """Return the last committed checkpoint of a process, or None if it never ran."""
+        try:
+            with open(self.path(process_id)) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        checkpoint['watermark'] = decode_value(checkpoint.get('watermark'))
+        checkpoint['key'] = decode_value(checkpoint.get('key'))
+        return checkpoint
+
+    def save(self, process_id, watermark, key, rows):
+        """Record the position after a batch has been committed on the target."""
+        checkpoint = {
+            'watermark': encode_value(watermark),
+            'key': encode_value(key),
+            'rows': rows,
+            'saved_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        atomic_write(self.path(process_id), json.dumps(checkpoint, indent=4))
+
+    def reset(self, process_id):
+        """Forget the checkpoint so the next run starts from the beginning."""
+        try:
+            os.remove(self.path(process_id))
+        except FileNotFoundError:
+            pass
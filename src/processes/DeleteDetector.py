@@ -0,0 +1,307 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+
+from sqlalchemy import Boolean, and_, false, func, literal, or_, select
+
+from EngineRegistry import engine_registry
+from RowReader import iter_batches
+from RunMetrics import count, stage
+from SchemaCache import schema_cache
+from TableDiff import DiffResult
+from TableWriter import delete_keys
+
+METHODS = ('auto', 'merge', 'sorted', 'bloom')
+# Keys sorted in memory at once before a run is spilled to disk
+DEFAULT_MEMORY_KEYS = 1000000
+# Keys written to a run file per pickle, and read back per read
+RUN_CHUNK_KEYS = 10000
+DEFAULT_ERROR_RATE = 0.01
+# Bind parameters of one lookup confirming Bloom filter candidates, below every dialect's limit
+CONFIRM_BIND_PARAMETERS = 500
+
+
+class KeyOrderError(ValueError):
+    """The database returned keys in an order Python does not agree with, e.g. a case-insensitive collation."""
+
+
+def check_sorted(keys, side):
+    """Pass sorted keys through, raising KeyOrderError at the first one out of order."""
+    previous = None
+    for key in keys:
+        if previous is not None and key < previous:
+            raise KeyOrderError(f"Keys of the {side} table are not returned in ascending order")
+        previous = key
+        yield key
+
+
+def merge_missing(source_keys, target_keys):
+    """Keys of the sorted target stream that are not in the sorted source stream."""
+    source = iter(source_keys)
+    current = next(source, None)
+    for key in target_keys:
+        while current is not None and current < key:
+            current = next(source, None)
+        if current is None or current != key:
+            yield key
+
+
+def python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def source_value(value, column):
+    """
+    A target key value as the Python type of the source column when it converts exactly, e.g. the
+    text '5' or Decimal 5 for an integer column, so it binds and compares the way source keys do.
+    """
+    python_type_ = python_type(column)
+    if python_type_ is None or value is None or isinstance(value, python_type_):
+        return value
+    try:
+        converted = python_type_(value)
+    except (TypeError, ValueError, ArithmeticError):
+        return value
+    return converted if converted == value or str(converted) == str(value) else value
+
+
+def write_run(keys, directory, number):
+    """Write sorted keys to a run file, in chunks that can be read back one at a time."""
+    path = os.path.join(directory, f"run_{number}.pickle")
+    with open(path, 'wb') as run_file:
+        for start in range(0, len(keys), RUN_CHUNK_KEYS):
+            pickle.dump(keys[start:start + RUN_CHUNK_KEYS], run_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def read_run(path):
+    with open(path, 'rb') as run_file:
+        while True:
+            try:
+                chunk = pickle.load(run_file)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class DeleteDetector:
+    """
+    Find the target rows whose key no longer exists in the source, reading only the key columns.
+    Unlike a full TableDiff no other column is read or hashed, so the database can answer from the
+    primary key index, and a delete check can run much more often than a full comparison.
+
+    - merge: both sides stream their keys in primary key order and are merge-joined, in constant
+      memory. Databases that sort keys differently from Python (collations) raise KeyOrderError.
+    - sorted: keys are sorted by Python in runs of `memory_keys`, spilled to disk and merged, so
+      any key order and any number of keys work, at the cost of writing the keys once.
+    - bloom: source keys go into a Bloom filter (memory-mapped when large) and target keys are
+      looked up in it. About `error_rate` of the deletes are missed; filters are seeded differently
+      on every run, so a missed delete is found by the next. Keys the filter does not know are only
+      candidates, since the same key may hash differently when the two sides return it as different
+      types (text and integer, naive and aware times...), so each is confirmed by a keyed lookup in
+      the source before it is reported.
+    - auto: merge, falling back to sorted when the key order does not agree.
+
+    With a `tombstone_column` deleted rows are marked instead of removed: the column is set to true
+    or to the current time, and target rows already marked are not scanned again.
+    """
+
+    def __init__(self, source_id, target_id, table_name, schema=None, target_table_name=None,
+                 target_schema=None, key_columns=None, tombstone_column=None, method='auto', batch_size=None,
+                 memory_keys=DEFAULT_MEMORY_KEYS, error_rate=DEFAULT_ERROR_RATE, spill_directory=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown delete detection method '{method}', expected one of {', '.join(METHODS)}")
+        with stage('connect'):
+            self.source_id = source_id
+            self.source_engine = engine_registry.get_engine(source_id)
+            self.target_engine = engine_registry.get_engine(target_id)
+            self.source_table = schema_cache.get_table(source_id, table_name, schema)
+            self.target_table = schema_cache.get_table(target_id, target_table_name or table_name,
+                                                       target_schema or schema)
+        self.schema = schema
+        self.method = method
+        self.batch_size = batch_size
+        self.memory_keys = memory_keys
+        self.error_rate = error_rate
+        self.spill_directory = spill_directory
+
+        self.key_columns = key_columns or [column.name for column in self.source_table.primary_key.columns]
+        if not self.key_columns:
+            raise ValueError(f"Table '{table_name}' has no primary key, please pass key_columns")
+        self.tombstone_column = tombstone_column
+        if tombstone_column is not None and tombstone_column not in self.target_table.columns:
+            raise ValueError(f"Column '{tombstone_column}' does not exist in the target table")
+
+    def key_query(self, table, ordered):
+        keys = [table.columns[name] for name in self.key_columns]
+        query = select(*keys)
+        if table is self.target_table and self.tombstone_column is not None:
+            column = table.columns[self.tombstone_column]
+            live = column.is_(None)
+            if isinstance(column.type, Boolean):
+                live = or_(live, column == false())
+            query = query.where(live)
+        return query.order_by(*keys) if ordered else query
+
+    def iter_keys(self, engine, table, ordered):
+        """Keys of a table one by one: plain values for a single key column, tuples otherwise."""
+        single = len(self.key_columns) == 1
+        for batch in iter_batches(engine, self.key_query(table, ordered), self.batch_size):
+            if single:
+                yield from [row[0] for row in batch]
+            else:
+                yield from map(tuple, batch)
+
+    def merge(self):
+        source_keys = check_sorted(self.iter_keys(self.source_engine, self.source_table, True), 'source')
+        target_keys = check_sorted(self.iter_keys(self.target_engine, self.target_table, True), 'target')
+        with stage('diff'):
+            return list(merge_missing(source_keys, target_keys))
+
+    def sorted_keys(self, engine, table, directory, side):
+        """All keys of a table in Python order, through spilled sorted runs when they do not fit in memory."""
+        paths = []
+        keys = []
+        for key in self.iter_keys(engine, table, False):
+            keys.append(key)
+            if len(keys) >= self.memory_keys:
+                with stage('stage'):
+                    keys.sort()
+                    paths.append(write_run(keys, directory, f"{side}_{len(paths)}"))
+                keys = []
+        with stage('stage'):
+            keys.sort()
+        if not paths:
+            return iter(keys)
+        with stage('stage'):
+            paths.append(write_run(keys, directory, f"{side}_{len(paths)}"))
+        count('key_runs_spilled', len(paths))
+        return heapq.merge(*[read_run(path) for path in paths])
+
+    def sorted(self, directory):
+        source_keys = self.sorted_keys(self.source_engine, self.source_table, directory, 'source')
+        target_keys = self.sorted_keys(self.target_engine, self.target_table, directory, 'target')
+        with stage('diff'):
+            return list(merge_missing(source_keys, target_keys))
+
+    def source_key_count(self):
+        """Number of source keys to size the Bloom filter for, from the statistics if they are known."""
+        estimate = schema_cache.row_estimate(self.source_id, self.source_table.name, self.schema)
+        if estimate:
+            return estimate
+        with self.source_engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(self.source_table)).scalar()
+
+    def bloom(self, directory):
+        from BloomFilter import BloomFilter  # numpy is only needed for this method
+        from RowHasher import hash_rows
+
+        # Some headroom, statistics lag behind the table
+        bloom_filter = BloomFilter(self.source_key_count() * 1.25 + 1000, self.error_rate,
+                                   path=os.path.join(directory, 'source.bloom'))
+        try:
+            for batch in iter_batches(self.source_engine, self.key_query(self.source_table, False), self.batch_size):
+                with stage('hash'):
+                    bloom_filter.add(hash_rows(batch))
+            deleted = []  # Candidates until confirmed
+            for batch in iter_batches(self.target_engine, self.key_query(self.target_table, False), self.batch_size):
+                with stage('hash'):
+                    present = bloom_filter.contains(hash_rows(batch))
+                with stage('diff'):
+                    single = len(self.key_columns) == 1
+                    deleted.extend(row[0] if single else tuple(row)
+                                   for row, found in zip(batch, present) if not found)
+            count('bloom_false_positive_ppm', int(bloom_filter.false_positive_rate() * 1000000))
+        finally:
+            bloom_filter.close()
+        with stage('diff'):
+            confirmed = self.confirm_missing(deleted)
+        count('bloom_candidates_found', len(deleted) - len(confirmed))
+        return confirmed
+
+    def source_key(self, key):
+        """A target key as a tuple of values typed like the source key columns."""
+        values = (key,) if len(self.key_columns) == 1 else key
+        return tuple(source_value(value, self.source_table.columns[name])
+                     for name, value in zip(self.key_columns, values))
+
+    def key_filter(self, keys):
+        """Condition matching the source rows of some keys, as built by source_key."""
+        columns = [self.source_table.columns[name] for name in self.key_columns]
+        target_columns = [self.target_table.columns[name] for name in self.key_columns]
+
+        def bind(value, column, target_column):
+            # Values the source type cannot hold exactly are bound as the target typed them
+            source_type = python_type(column)
+            typed = value is None or source_type is None or isinstance(value, source_type)
+            return literal(value, column.type if typed else target_column.type)
+
+        def params(key):
+            return [bind(value, column, target_column)
+                    for value, column, target_column in zip(key, columns, target_columns)]
+
+        if len(columns) == 1:
+            return columns[0].in_([params(key)[0] for key in keys])
+        return or_(*[and_(*[column == param for column, param in zip(columns, params(key))]) for key in keys])
+
+    def confirm_missing(self, candidates):
+        """
+        The candidate keys that a keyed lookup does not find in the source. When the source matches rows
+        that are none of the keys as typed here (a case-insensitive collation, a type the database
+        converts), the keys of that lookup are checked one at a time instead, so a live row is never
+        reported as deleted.
+        """
+        columns = [self.source_table.columns[name] for name in self.key_columns]
+        chunk_size = max(CONFIRM_BIND_PARAMETERS // len(columns), 1)
+        missing = []
+        with self.source_engine.connect() as connection:
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                keys = [self.source_key(key) for key in chunk]
+                found = set(map(tuple, connection.execute(select(*columns).where(self.key_filter(keys)))))
+                if found - set(keys):
+                    found = {key for key in keys if connection.execute(
+                        select(func.count()).select_from(self.source_table).where(self.key_filter([key]))
+                    ).scalar()}
+                missing.extend(candidate for candidate, key in zip(chunk, keys) if key not in found)
+        return missing
+
+    def find_deleted(self):
+        """Keys present in the target but not in the source."""
+        directory = tempfile.mkdtemp(prefix='nocdc_keys_', dir=self.spill_directory)
+        try:
+            if self.method == 'bloom':
+                return self.bloom(directory)
+            if self.method == 'sorted':
+                return self.sorted(directory)
+            try:
+                return self.merge()
+            except KeyOrderError:
+                if self.method == 'merge':
+                    raise
+                return self.sorted(directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, apply=False, change_set=None):
+        """
+        Return a DiffResult listing the deleted keys, adding them to `change_set` if one is passed,
+        and delete (or mark) the target rows in one transaction if `apply` is set.
+        """
+        result = DiffResult()
+        deleted = self.find_deleted()
+        single = len(self.key_columns) == 1
+        result.deleted = [(key,) for key in deleted] if single else deleted
+        count('diff_deleted', len(result.deleted))
+        if change_set is not None:
+            change_set.add('deletes', result.deleted)
+        if apply and result.deleted:
+            with self.target_engine.begin() as connection:
+                delete_keys(connection, self.target_table, self.key_columns, result.deleted,
+                            tombstone_column=self.tombstone_column)
+        return result
@@ -0,0 +1,131 @@
+import datetime
+import decimal
+
+from sqlalchemy import select
+
+from CheckpointStore import CheckpointStore
+from EngineRegistry import engine_registry
+from ProcessDefinitions import PROCESSES_FILE, get_process, process_tables, split_list
+from RowReader import iter_batches
+from RunMetrics import stage
+from SchemaCache import schema_cache
+from TableWriter import keyset_after, upsert_rows
+
+
+class IncrementalSync:
+    """
+    Copy only the rows whose watermark column (an updated_at timestamp or an increasing key)
+    is past the last stored high-water mark. Rows are read in (watermark, key) order and the
+    position is checkpointed after every batch committed on the target, so a crashed run
+    resumes from the last committed batch. Rows with a NULL watermark are never picked up.
+
+    The position only moves forward: a row whose transaction commits after a later watermark
+    has been read (updated_at set at the start of a long transaction, say) is skipped for good.
+    With a `lookback`, every run starts that far behind the checkpointed watermark instead, and
+    re-applies the rows of the window (upserts, so re-reading them is harmless). It is a number
+    for numeric watermarks and seconds (or a timedelta) for date and time ones, and should exceed
+    the longest transaction writing to the source table.
+    """
+
+    def __init__(self, process_id, source_id, target_id, table_name, watermark_column, schema=None,
+                 target_table_name=None, target_schema=None, key_columns=None,
+                 batch_size=None, checkpoint_store=None, lookback=None):
+        self.process_id = process_id
+        with stage('connect'):
+            self.source_engine = engine_registry.get_engine(source_id)
+            self.target_engine = engine_registry.get_engine(target_id)
+            self.source_table = schema_cache.get_table(source_id, table_name, schema)
+            self.target_table = schema_cache.get_table(target_id, target_table_name or table_name,
+                                                       target_schema or schema)
+        self.watermark_column = watermark_column
+        self.batch_size = batch_size
+        self.checkpoint_store = checkpoint_store or CheckpointStore()
+        self.lookback = lookback
+
+        self.key_columns = key_columns or [column.name for column in self.source_table.primary_key.columns]
+        if not self.key_columns:
+            raise ValueError(f"Table '{table_name}' has no primary key, please pass key_columns")
+
+        # Only copy the columns the target table has
+        self.columns = [column.name for column in self.source_table.columns if column.name in self.target_table.columns]
+
+    @classmethod
+    def from_process(cls, process_id, ini_file=PROCESSES_FILE, checkpoint_store=None, table_name=None):
+        """
+        Build the sync from a section of the process definitions ini file. A process listing
+        several tables is synced one table at a time, each with its own checkpoint.
+        """
+        process = get_process(process_id, ini_file)
+        tables = process_tables(process)
+        table_name = table_name or tables[0]
+        single = len(tables) == 1
+        return cls(
+            process_id if single else f"{process_id}.{table_name}",
+            process['source'],
+            process['target'],
+            table_name,
+            process['watermark_column'],
+            schema=process.get('schema') or None,
+            target_table_name=(process.get('target_table') or None) if single else None,
+            target_schema=process.get('target_schema') or None,
+            key_columns=split_list(process.get('key_columns')) or None,
+            batch_size=int(process['batch_size']) if process.get('batch_size') else None,
+            checkpoint_store=checkpoint_store,
+            lookback=float(process['watermark_lookback']) if process.get('watermark_lookback') else None
+        )
+
+    def order_columns(self):
+        """Watermark first, then the key as a tie-breaker for rows sharing a watermark value."""
+        names = [self.watermark_column] + [name for name in self.key_columns if name != self.watermark_column]
+        return [self.source_table.columns[name] for name in names]
+
+    def lookback_start(self, watermark):
+        """The watermark `lookback` before a checkpointed one."""
+        lookback = self.lookback
+        if isinstance(watermark, datetime.date) and not isinstance(lookback, datetime.timedelta):
+            lookback = datetime.timedelta(seconds=lookback)
+        elif isinstance(watermark, decimal.Decimal):
+            lookback = decimal.Decimal(str(lookback))
+        return watermark - lookback
+
+    def source_query(self, checkpoint):
+        """
+        Rows after the checkpointed position (or the lookback window), in the order the position is tracked.
+        The watermark and key columns are selected even when the target table lacks them, to track it.
+        """
+        order_columns = self.order_columns()
+        names = self.columns + [column.name for column in order_columns if column.name not in self.columns]
+        query = select(*[self.source_table.columns[name] for name in names])
+        query = query.where(order_columns[0].is_not(None))
+        if checkpoint is not None and self.lookback:
+            query = query.where(order_columns[0] >= self.lookback_start(checkpoint['watermark']))
+        elif checkpoint is not None:
+            position = (checkpoint['watermark'],) + tuple(checkpoint['key'])
+            query = query.where(keyset_after(order_columns, position))
+        return query.order_by(*order_columns)
+
+    def run(self):
+        """Copy all rows past the checkpoint and return the number of rows copied in this run."""
+        with stage('checkpoint'):
+            checkpoint = self.checkpoint_store.load(self.process_id)
+        total_rows = checkpoint['rows'] if checkpoint else 0
+        copied = 0
+        key_names = [column.name for column in self.order_columns()[1:]]
+        # Rows of the lookback window come before the checkpoint, which must not move back to them
+        reached = (checkpoint['watermark'],) + tuple(checkpoint['key']) if checkpoint and self.lookback else None
+
+        for batch in iter_batches(self.source_engine, self.source_query(checkpoint), self.batch_size):
+            with self.target_engine.begin() as connection:
+                upsert_rows(connection, self.target_table, self.key_columns, [row._mapping for row in batch],
+                            columns=self.columns)
+
+            # The batch is committed on the target, move the high-water mark past it
+            last = batch[-1]._mapping
+            copied += len(batch)
+            position = (last[self.watermark_column],) + tuple(last[name] for name in key_names)
+            if reached is not None and position < reached:
+                continue
+            reached = None
+            with stage('checkpoint'):
+                self.checkpoint_store.save(self.process_id, position[0], position[1:], total_rows + copied)
+        return copied
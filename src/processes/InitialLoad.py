@@ -0,0 +1,193 @@
+import functools
+import time
+
+from sqlalchemy import inspect, select
+
+from BulkLoader import bulk_insert
+from CheckpointStore import CheckpointStore
+from EngineRegistry import engine_registry
+from PartitionedExtract import PartitionedExtract
+from ProcessDefinitions import PROCESSES_FILE, get_process, process_run, process_tables, split_list
+from RunMetrics import count, stage
+from SchemaCache import schema_cache
+from TypeMapping import TableDefinition
+
+
+class PartitionLoader:
+    """Partition handler inserting every batch into the target table, one transaction per batch."""
+
+    def __init__(self, connection_id, table_name, schema, columns):
+        self.connection_id = connection_id
+        self.table_name = table_name
+        self.schema = schema
+        self.columns = columns
+        self.rows = 0
+
+    def __call__(self, batch):
+        # Looked up inside the worker rather than held, so the handler stays picklable
+        engine = engine_registry.get_engine(self.connection_id)
+        table = schema_cache.get_table(self.connection_id, self.table_name, self.schema)
+        with stage('apply'), engine.begin() as connection:
+            bulk_insert(connection, table, self.columns, batch)
+        self.rows += len(batch)
+
+    def result(self):
+        return self.rows
+
+
+class InitialLoadResult:
+    def __init__(self, rows=0, partitions=0, load_seconds=0.0, index_seconds=0.0):
+        self.rows = rows
+        self.partitions = partitions
+        self.load_seconds = load_seconds
+        self.index_seconds = index_seconds
+
+    def __repr__(self):
+        return (f"InitialLoadResult(rows={self.rows}, partitions={self.partitions}, "
+                f"load={self.load_seconds:.1f} s, indexes={self.index_seconds:.1f} s)")
+
+
+class InitialLoad:
+    """
+    Bootstrap a replica of a source table: create the target table from the source's columns mapped
+    to the target's dialect (see TypeMapping), copy the rows with a PartitionedExtract writing every
+    key range on its own target connection, then add the primary key (where the dialect does not
+    cluster on it) and the indexes. Building an index once over loaded rows is several times faster
+    than maintaining it on every insert. Up to `workers` partitions run at once, as many as both the
+    source and the target have free sessions for (see SessionBudget).
+
+    With a `watermark_column`, the (watermark, key) position of the last source row is read before the
+    copy and stored as the checkpoint of `process_id`, so the next IncrementalSync run only picks up
+    rows changed while or after the load ran.
+    """
+
+    def __init__(self, source_id, target_id, table_name, schema=None, target_table_name=None,
+                 target_schema=None, key_column=None, partitions=8, workers=4, executor='thread',
+                 batch_size=None, replace=False, process_id=None, watermark_column=None, key_columns=None,
+                 checkpoint_store=None):
+        with stage('connect'):
+            self.source_engine = engine_registry.get_engine(source_id)
+            self.target_engine = engine_registry.get_engine(target_id)
+            self.source_table = schema_cache.get_table(source_id, table_name, schema)
+        self.source_id = source_id
+        self.target_id = target_id
+        self.table_name = table_name
+        self.schema = schema
+        self.target_table_name = target_table_name or table_name
+        self.target_schema = target_schema or schema
+        self.key_column = key_column
+        self.partitions = partitions
+        self.workers = workers
+        self.executor = executor
+        self.batch_size = batch_size
+        self.replace = replace
+        self.process_id = process_id
+        self.watermark_column = watermark_column
+        self.key_columns = key_columns or [column.name for column in self.source_table.primary_key.columns]
+        self.checkpoint_store = checkpoint_store or CheckpointStore()
+        self.definition = TableDefinition(self.source_table, self.target_engine.dialect, self.target_table_name,
+                                          self.target_schema, self.source_engine.dialect)
+
+    @classmethod
+    def from_process(cls, process_id, ini_file=PROCESSES_FILE, table_name=None, **options):
+        """
+        Build the load of one table of a process. Incremental processes get their checkpoint set,
+        under the same name IncrementalSync.from_process uses.
+        """
+        process = get_process(process_id, ini_file)
+        tables = process_tables(process)
+        table_name = table_name or tables[0]
+        single = len(tables) == 1
+        incremental = (process.get('mode') or 'incremental') == 'incremental'
+        return cls(
+            process['source'],
+            process['target'],
+            table_name,
+            schema=process.get('schema') or None,
+            target_table_name=(process.get('target_table') or None) if single else None,
+            target_schema=process.get('target_schema') or None,
+            batch_size=int(process['batch_size']) if process.get('batch_size') else None,
+            process_id=(process_id if single else f"{process_id}.{table_name}") if incremental else None,
+            watermark_column=(process.get('watermark_column') or None) if incremental else None,
+            key_columns=split_list(process.get('key_columns')) or None,
+            **options
+        )
+
+    def create_table(self):
+        """Create the target table without its secondary indexes, replacing it if asked to."""
+        with self.target_engine.begin() as connection:
+            if inspect(connection).has_table(self.target_table_name, self.target_schema):
+                if not self.replace:
+                    raise ValueError(f"Table '{self.target_table_name}' already exists on '{self.target_id}', "
+                                     f"pass replace to drop it first")
+                self.definition.table.drop(connection)
+            for statement in self.definition.create_statements():
+                connection.execute(statement)
+        # Reflected once here, the workers find the new table in the cache
+        schema_cache.reflect(self.target_id, self.target_schema)
+
+    def create_indexes(self):
+        with self.target_engine.begin() as connection:
+            for statement in self.definition.index_statements():
+                connection.execute(statement)
+        schema_cache.reflect(self.target_id, self.target_schema)
+
+    def last_position(self):
+        """(watermark, key) of the last source row in IncrementalSync order, or None for an empty table."""
+        names = [self.watermark_column] + [name for name in self.key_columns if name != self.watermark_column]
+        columns = [self.source_table.columns[name] for name in names]
+        query = select(*columns).where(columns[0].is_not(None)).order_by(*[column.desc() for column in columns])
+        with self.source_engine.connect() as connection:
+            row = connection.execute(query.limit(1)).first()
+        return None if row is None else (row[0], tuple(row[1:]))
+
+    def run(self, progress=None):
+        """
+        Create, load and index the target table. `progress(partition_index, rows_done, finished)` is
+        called as partitions advance, as in PartitionedExtract.run.
+        """
+        position = None
+        if self.watermark_column:
+            with stage('checkpoint'):
+                position = self.last_position()
+        with stage('apply'):
+            self.create_table()
+
+        started = time.perf_counter()
+        extract = PartitionedExtract(self.source_id, self.table_name, self.schema, key_column=self.key_column,
+                                     partitions=self.partitions, workers=self.workers, executor=self.executor,
+                                     batch_size=self.batch_size, typed=True,
+                                     session_connections=[self.source_id, self.target_id])
+        handler_factory = functools.partial(PartitionLoader, self.target_id, self.target_table_name,
+                                            self.target_schema, extract.columns)
+        rows = extract.run(handler_factory, progress)
+        result = InitialLoadResult(sum(rows), len(rows), time.perf_counter() - started)
+        count('rows_loaded', result.rows)
+
+        started = time.perf_counter()
+        with stage('index'):
+            self.create_indexes()
+        result.index_seconds = time.perf_counter() - started
+
+        if position is not None and self.process_id is not None:
+            with stage('checkpoint'):
+                self.checkpoint_store.save(self.process_id, position[0], position[1], result.rows)
+        return result
+
+
+def bootstrap_process(process_id, ini_file=PROCESSES_FILE, progress=None, **options):
+    """
+    Load every table of a process with InitialLoad and return a {table: InitialLoadResult} dict.
+    `progress((table_name, partition_index, rows_done, finished))` is called as partitions advance,
+    with one tuple so it can be a Worker's progress signal. Runs under the run lock of the process
+    (see process_run) and raises ProcessRunning while it is scheduled or run elsewhere.
+    """
+    results = {}
+    with process_run(process_id, ini_file):
+        for table_name in process_tables(get_process(process_id, ini_file)):
+            load = InitialLoad.from_process(process_id, ini_file, table_name, **options)
+            report = None
+            if progress is not None:
+                report = functools.partial(lambda table, *event: progress((table,) + event), table_name)
+            results[table_name] = load.run(report)
+    return results
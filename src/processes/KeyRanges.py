@@ -0,0 +1,69 @@
+import datetime
+import decimal
+
+from sqlalchemy import and_, func, select
+
+
+class KeyRange:
+    """A bucket of the leading key column, [lower, upper) or [lower, upper] for the last bucket."""
+
+    def __init__(self, lower, upper, inclusive):
+        self.lower = lower
+        self.upper = upper
+        self.inclusive = inclusive
+
+    def clause(self, column):
+        """SQL condition selecting the rows of this bucket."""
+        if self.inclusive:
+            return and_(column >= self.lower, column <= self.upper)
+        return and_(column >= self.lower, column < self.upper)
+
+    def __repr__(self):
+        return f"[{self.lower}, {self.upper}{']' if self.inclusive else ')'}"
+
+
+def key_bounds(engine, column):
+    """Smallest and largest value of a column, or None for an empty table."""
+    with engine.connect() as connection:
+        lower, upper = connection.execute(select(func.min(column), func.max(column))).one()
+    if lower is None:
+        return None
+    return lower, upper
+
+
+def split_range(engine, column, key_range, parts):
+    """
+    Split a key range into up to `parts` contiguous buckets.
+    Numeric and date keys are split arithmetically between the bounds; other keys are split
+    on quantiles of the values found in `column` on `engine`.
+    """
+    lower, upper = key_range.lower, key_range.upper
+    if lower == upper or parts < 2:
+        return [key_range]
+
+    if isinstance(lower, (int, float, decimal.Decimal, datetime.date)) and not isinstance(lower, bool):
+        step = (upper - lower) / parts
+        if isinstance(lower, int):
+            step = max(1, int(step))
+        boundaries = [lower + step * i for i in range(1, parts)]
+    else:
+        condition = key_range.clause(column)
+        with engine.connect() as connection:
+            count = connection.execute(select(func.count()).where(condition)).scalar()
+            boundaries = []
+            for i in range(1, parts):
+                boundary = connection.execute(
+                    select(column).where(condition).order_by(column)
+                    .offset(count * i // parts).limit(1)
+                ).scalar()
+                if boundary is not None:
+                    boundaries.append(boundary)
+
+    boundaries = sorted(set(b for b in boundaries if lower < b < upper))
+    if not boundaries:
+        return [key_range]
+
+    edges = [lower] + boundaries + [upper]
+    buckets = [KeyRange(edges[i], edges[i + 1], False) for i in range(len(edges) - 2)]
+    buckets.append(KeyRange(edges[-2], edges[-1], key_range.inclusive))
+    return buckets
@@ -0,0 +1,157 @@
+import concurrent.futures
+import contextvars
+import multiprocessing
+import queue
+
+from sqlalchemy import column, select, table
+
+from EngineRegistry import engine_registry
+from KeyRanges import KeyRange, key_bounds, split_range
+from RowHasher import MASK_64, checksum
+from RowReader import iter_batches
+from SchemaCache import schema_cache
+from SessionBudget import session_budget
+
+
+class PartitionChecksum:
+    """Partition handler returning the row count and order-independent checksum of the partition."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def __call__(self, batch):
+        count, total = checksum(batch)
+        self.count += count
+        self.total = (self.total + total) & MASK_64
+
+    def result(self):
+        return self.count, self.total
+
+
+def init_process_worker(ini_file, registrations):
+    """Set up the engine registry of a pool process with the parent's configuration."""
+    engine_registry.reset_after_fork()
+    engine_registry.ini_file = ini_file
+    for connection_id, (url, engine_options) in registrations.items():
+        engine_registry.register(connection_id, url, **engine_options)
+
+
+def scan_partition(connection_id, table_name, schema, columns, key_column, index, key_range,
+                   batch_size, handler_factory, progress_queue, typed=False):
+    """Stream one key range through a new handler, reporting progress after every batch."""
+    if typed:
+        # Values converted by the column types, from the cached schema of the worker's process
+        source = schema_cache.get_table(connection_id, table_name, schema)
+    else:
+        # A lightweight table clause is enough to build the query, no need to reflect in every worker
+        source = table(table_name, *[column(name) for name in columns], schema=schema)
+    query = select(*[source.columns[name] for name in columns]).where(key_range.clause(source.columns[key_column]))
+
+    handler = handler_factory()
+    rows = 0
+    for batch in iter_batches(engine_registry.get_engine(connection_id), query, batch_size):
+        handler(batch)
+        rows += len(batch)
+        progress_queue.put((index, rows, False))
+    progress_queue.put((index, rows, True))
+    return handler.result()
+
+
+class PartitionedExtract:
+    """
+    Split a table's key space into ranges and scan them concurrently on a thread or process pool.
+    Every worker checks out its own connection, so the workers draw on the session budget of the
+    connection (see SessionBudget): up to `workers` run, as many as there are free sessions on every
+    one of `session_connections` (the source by default, plus e.g. the target the handlers write to).
+    Handlers are created per partition by `handler_factory` and must be picklable when running on a
+    process pool. Rows hold the values as the driver returns them,
+    unless `typed` asks for the conversions of the reflected column types, e.g. to write them elsewhere.
+    """
+
+    def __init__(self, connection_id, table_name, schema=None, columns=None, key_column=None,
+                 partitions=8, workers=4, executor='thread', batch_size=None, typed=False,
+                 session_connections=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        self.connection_id = connection_id
+        self.table_name = table_name
+        self.schema = schema
+        self.partitions = partitions
+        self.workers = workers
+        self.executor = executor
+        self.batch_size = batch_size
+        self.typed = typed
+        self.session_connections = list(session_connections or [connection_id])
+
+        self.engine = engine_registry.get_engine(connection_id)
+        self.table = schema_cache.get_table(connection_id, table_name, schema)
+        self.columns = columns or [col.name for col in self.table.columns]
+        if key_column is None:
+            primary_key = [col.name for col in self.table.primary_key.columns]
+            if not primary_key:
+                raise ValueError(f"Table '{table_name}' has no primary key, please pass key_column")
+            key_column = primary_key[0]
+        self.key_column = key_column
+
+    def partition_ranges(self):
+        """Key ranges covering the whole table, from its min/max or key quantiles."""
+        key = self.table.columns[self.key_column]
+        bounds = key_bounds(self.engine, key)
+        if bounds is None:
+            return []
+        return split_range(self.engine, key, KeyRange(bounds[0], bounds[1], True), self.partitions)
+
+    def create_executor(self, workers):
+        if self.executor == 'process':
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_process_worker,
+                initargs=(engine_registry.ini_file, dict(engine_registry.registrations))
+            )
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, handler_factory, progress=None):
+        """
+        Scan every partition and return the handlers' results in key order.
+        `progress(partition_index, rows_done, finished)` is called in the calling thread.
+        """
+        ranges = self.partition_ranges()
+        manager = multiprocessing.Manager() if self.executor == 'process' else None
+        progress_queue = manager.Queue() if manager else queue.Queue()
+
+        def report():
+            while True:
+                try:
+                    event = progress_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if progress is not None:
+                    progress(*event)
+
+        try:
+            with session_budget.sessions(self.session_connections, self.workers) as workers, \
+                    self.create_executor(workers) as executor:
+                # Thread workers run in a copy of the caller's context, so their stages and counters
+                # go to the caller's run metrics
+                submit = executor.submit if self.executor == 'process' else \
+                    lambda *args: executor.submit(contextvars.copy_context().run, *args)
+                futures = [
+                    submit(scan_partition, self.connection_id, self.table_name, self.schema,
+                           self.columns, self.key_column, index, key_range, self.batch_size,
+                           handler_factory, progress_queue, self.typed)
+                    for index, key_range in enumerate(ranges)
+                ]
+                pending = set(futures)
+                while pending:
+                    _, pending = concurrent.futures.wait(pending, timeout=0.1)
+                    report()
+                report()
+                return [future.result() for future in futures]
+        finally:
+            if manager is not None:
+                manager.shutdown()
+
+    def checksums(self, progress=None):
+        """Row count and checksum of every partition."""
+        return self.run(PartitionChecksum, progress)
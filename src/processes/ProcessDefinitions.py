@@ -0,0 +1,103 @@
+import configparser
+import contextlib
+import re
+
+from ConfigStore import config_store, file_lock
+
+PROCESSES_FILE = "data/processes.ini"
+
+# Keys of a process section, in the order they are written
+PROCESS_FIELDS = (
+    'source', 'target', 'tables', 'schema', 'target_table', 'target_schema', 'mode', 'watermark_column',
+    'watermark_lookback', 'key_columns', 'tombstone_column', 'delete_method', 'batch_size', 'interval', 'cron',
+    'priority', 'enabled'
+)
+MODES = ('incremental', 'diff', 'deletes')
+DEFAULT_PRIORITY = 0
+
+
+def load_processes(ini_file=PROCESSES_FILE):
+    """Parse the process definitions ini file."""
+    config = configparser.ConfigParser()
+    config.read(ini_file)
+    return config
+
+
+def get_process(process_id, ini_file=PROCESSES_FILE):
+    """Return the definition of a process as a plain dict."""
+    config = load_processes(ini_file)
+    if process_id not in config:
+        raise KeyError(f"Process '{process_id}' is not defined in {ini_file}")
+    return dict(config[process_id])
+
+
+def split_list(value):
+    """Parse a comma separated ini value such as 'id, version' into a list."""
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def process_tables(process):
+    """Tables synced by a process, from its `tables` list or the older single `table` key."""
+    return split_list(process.get('tables')) or split_list(process.get('table'))
+
+
+def process_connections(process):
+    """Connections a process opens sessions on, source first."""
+    return list(dict.fromkeys([process['source'], process['target']]))
+
+
+def process_priority(process):
+    return int(process.get('priority') or DEFAULT_PRIORITY)
+
+
+def is_enabled(process):
+    return (process.get('enabled') or 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class ProcessRunning(RuntimeError):
+    """The process is already running, in this program or another one."""
+
+
+def run_lock_path(process_id, ini_file=PROCESSES_FILE):
+    """File locked while a process runs, next to the definitions file; file_lock adds the .lock suffix."""
+    return ini_file + '.' + re.sub(r'[^\w.-]', '_', process_id)
+
+
+@contextlib.contextmanager
+def process_run(process_id, ini_file=PROCESSES_FILE, budget=None, reserved=None):
+    """
+    Hold what every run of a process needs, whoever starts it (a scheduler, `nocdc run`, a bootstrap):
+    the run lock of the process, so two runs never write the same checkpoint or target table at once,
+    and a session of each of its connections in the session `budget`, held by this context so the
+    partition workers of the run count it. Raises ProcessRunning at once when the lock is taken.
+    Sessions the caller already took, as the scheduler does before starting a process, are passed as
+    `reserved`; otherwise they are waited for here.
+    """
+    from SessionBudget import session_budget  # SQLAlchemy is only needed once something runs
+    budget = budget or session_budget
+    with contextlib.ExitStack() as stack:
+        try:
+            stack.enter_context(file_lock(run_lock_path(process_id, ini_file), timeout=0))
+        except TimeoutError:
+            raise ProcessRunning(f"Process '{process_id}' is already running") from None
+        connection_ids = reserved
+        if connection_ids is None:
+            connection_ids = process_connections(get_process(process_id, ini_file))
+            budget.acquire(connection_ids)
+            stack.callback(budget.release, connection_ids)
+        stack.enter_context(budget.holding(connection_ids))
+        yield
+
+
+def save_process(process_id, values, ini_file=PROCESSES_FILE):
+    """
+    Create or replace a process section. The file is locked, re-read and replaced atomically,
+    so processes saved at the same time by another window or process are kept.
+    """
+    known = [key for key in PROCESS_FIELDS if values.get(key) not in (None, '')]
+    extra = [key for key in values if key not in PROCESS_FIELDS and values[key] not in (None, '')]
+    config_store(ini_file).save_section(process_id, {key: values[key] for key in known + extra})
+
+
+def delete_process(process_id, ini_file=PROCESSES_FILE):
+    return config_store(ini_file).delete_section(process_id)
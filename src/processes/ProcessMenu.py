@@ -0,0 +1,573 @@
+import configparser
+import datetime
+from PyQt6.QtWidgets import (
+    QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QWidget, QPushButton,
+    QComboBox, QCheckBox, QSpinBox, QTableView, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
+)
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QObject, QSortFilterProxyModel, Qt, pyqtSignal
+from PyQt6.QtGui import QColor
+
+from ConfigStore import config_store
+from ConnectionTableModel import ActionDelegate, StoreWatcher, cached_icon
+from ProcessDefinitions import (
+    MODES, PROCESSES_FILE, delete_process, is_enabled, load_processes, process_tables, save_process
+)
+from RunMetrics import STAGES
+from Schedule import trigger_for
+from Scheduler import Scheduler
+from Workers import Worker, start_worker
+
+COLUMNS = ["ID", "Source", "Target", "Tables", "Mode", "Schedule", "Priority", "Status", "Next run", "Action"]
+STATUS_COLUMN = 7
+NEXT_RUN_COLUMN = 8
+ACTION_COLUMN = 9
+
+
+def describe_schedule(process):
+    if not is_enabled(process):
+        return "Disabled"
+    if process.get('cron'):
+        return f"cron {process['cron']}"
+    if process.get('interval'):
+        return f"every {process['interval']}"
+    return "On demand"
+
+
+class ProcessTableModel(QAbstractTableModel):
+    """Rows of the process list, with the live status reported by the scheduler."""
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.rows = []      # [process_id, source, target, tables, mode, schedule, priority] per row
+        self.row_of = {}    # process_id -> row number
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+        status = self.scheduler.status(row[0])
+
+        if column == STATUS_COLUMN:
+            if role == Qt.ItemDataRole.DisplayRole:
+                if status.state == 'running' and status.metrics and status.metrics.counters.get('rows_read'):
+                    return f"Running, {status.metrics.counters['rows_read']:,} rows read"
+                if status.state != 'idle':
+                    return status.state.capitalize()
+                if status.finished_at is None:
+                    return ''
+                outcome = "Failed" if status.error else "OK"
+                return f"{outcome} at {status.finished_at.strftime('%H:%M:%S')}"
+            if role == Qt.ItemDataRole.ToolTipRole and status.error:
+                return status.error
+            if role == Qt.ItemDataRole.ForegroundRole and status.error and status.state == 'idle':
+                return QColor(Qt.GlobalColor.red)
+            return None
+
+        if column == NEXT_RUN_COLUMN and role == Qt.ItemDataRole.DisplayRole:
+            return status.next_run.strftime('%Y-%m-%d %H:%M') if status.next_run else ''
+
+        if column < STATUS_COLUMN and role == Qt.ItemDataRole.DisplayRole:
+            return row[column]
+        return None
+
+    @staticmethod
+    def section_row(process_id, process):
+        return [process_id, process.get('source', ''), process.get('target', ''),
+                ', '.join(process_tables(process)), process.get('mode') or 'incremental',
+                describe_schedule(process), process.get('priority') or '0']
+
+    def sync(self, config):
+        """Bring the rows in line with a parsed processes file, touching only the sections that changed."""
+        sections = config.sections()
+        wanted = set(sections)
+
+        for row in reversed(range(len(self.rows))):
+            if self.rows[row][0] not in wanted:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+        self.row_of = {row[0]: number for number, row in enumerate(self.rows)}
+
+        for process_id in sections:
+            self.set_row(process_id, config[process_id])
+
+    def apply_changes(self, config, changes):
+        """Update only the rows of the sections listed in a SectionChanges."""
+        for process_id in changes.removed:
+            row = self.row_of.get(process_id)
+            if row is not None:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+                self.row_of = {values[0]: number for number, values in enumerate(self.rows)}
+        for process_id in changes.added + changes.changed:
+            if process_id in config:
+                self.set_row(process_id, config[process_id])
+
+    def set_row(self, process_id, process):
+        values = self.section_row(process_id, process)
+        row = self.row_of.get(process_id)
+        if row is None:
+            row = len(self.rows)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.append(values)
+            self.row_of[process_id] = row
+            self.endInsertRows()
+        elif self.rows[row] != values:
+            self.rows[row] = values
+            self.dataChanged.emit(self.index(row, 0), self.index(row, STATUS_COLUMN - 1))
+
+    def status_changed(self, process_id):
+        row = self.row_of.get(process_id)
+        if row is not None:
+            self.dataChanged.emit(self.index(row, STATUS_COLUMN), self.index(row, NEXT_RUN_COLUMN))
+
+
+class RunProgressPanel(QTableWidget):
+    """Stage timings, row counters and round trips of the current or last run of one process."""
+
+    def __init__(self, parent=None):
+        super().__init__(0, 2, parent)
+        self.setHorizontalHeaderLabels(["Metric", "Value"])
+        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.verticalHeader().setVisible(False)
+        self.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.process_id = None
+
+    def show_run(self, process_id, metrics):
+        self.process_id = process_id
+        if metrics is None:
+            self.set_rows([("Process", process_id), ("Status", "Not run yet")])
+            return
+        run = metrics.to_dict()
+        elapsed = run['wall_seconds']
+        if elapsed is None and metrics.started_at is not None:
+            elapsed = (datetime.datetime.now(datetime.timezone.utc) - metrics.started_at).total_seconds()
+        rows = [("Process", process_id), ("Status", run['status']), ("Elapsed", f"{elapsed or 0:.1f} s")]
+        for name in sorted(run['stage_seconds'], key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            rows.append((f"{name.capitalize()} time", f"{run['stage_seconds'][name]:.2f} s"))
+        rows.extend((name.replace('_', ' ').capitalize(), f"{value:,}") for name, value in sorted(run['counters'].items()))
+        rows.extend((f"Round trips to {connection_id}", f"{value:,}")
+                    for connection_id, value in sorted(run['round_trips'].items()))
+        if run['error']:
+            rows.append(("Error", run['error'].splitlines()[0]))
+        self.set_rows(rows)
+
+    def set_rows(self, rows):
+        self.setRowCount(len(rows))
+        for row, (name, value) in enumerate(rows):
+            self.setItem(row, 0, QTableWidgetItem(name))
+            self.setItem(row, 1, QTableWidgetItem(str(value)))
+
+
+class PartitionProgressPanel(QTableWidget):
+    """Rows copied by every partition of a running bootstrap, one line per table and partition."""
+
+    def __init__(self, parent=None):
+        super().__init__(0, 4, parent)
+        self.setHorizontalHeaderLabels(["Table", "Partition", "Rows", "Status"])
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.verticalHeader().setVisible(False)
+        self.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.row_of = {}  # (table, partition) -> row number
+
+    def clear_partitions(self):
+        self.setRowCount(0)
+        self.row_of = {}
+
+    def update_partition(self, event):
+        """Slot for the (table, partition_index, rows_done, finished) progress of bootstrap_process."""
+        table_name, index, rows, finished = event
+        row = self.row_of.get((table_name, index))
+        if row is None:
+            row = self.row_of[(table_name, index)] = self.rowCount()
+            self.insertRow(row)
+            self.setItem(row, 0, QTableWidgetItem(table_name))
+            self.setItem(row, 1, QTableWidgetItem(str(index + 1)))
+        self.setItem(row, 2, QTableWidgetItem(f"{rows:,}"))
+        self.setItem(row, 3, QTableWidgetItem("Done" if finished else "Loading"))
+
+
+class SchedulerBridge(QObject):
+    """Forwards scheduler events, raised on its threads, to the GUI thread."""
+    changed = pyqtSignal(str, object)
+
+    def __call__(self, event, status):
+        self.changed.emit(event, status)
+
+
+class ProcessConfig(QMainWindow):
+    # Emitted once the process has been written to the definitions file
+    saved = pyqtSignal()
+
+    def __init__(self, ini_file, connections_file, process_id=None):
+        """
+        Initialize the ProcessConfig window.
+        If process_id is None, it means a new process is being created.
+        """
+        super().__init__()
+        self.setWindowTitle("New Process" if process_id is None else f"Process Details - {process_id}")
+        self.setGeometry(300, 300, 400, 560)
+        self.ini_file = ini_file
+        self.process_id = process_id
+
+        config = load_processes(ini_file)
+        process = dict(config[process_id]) if process_id in config else {}
+        connections = configparser.ConfigParser()
+        connections.read(connections_file)
+
+        self.main_layout = QVBoxLayout()
+        self.id_field = self.add_field("Process ID:", QLineEdit(process_id or ''))
+        self.id_field.setReadOnly(process_id is not None)
+
+        self.source_dropdown = self.add_field("Source connection:", QComboBox())
+        self.source_dropdown.addItems(connections.sections())
+        self.source_dropdown.setCurrentText(process.get('source', ''))
+        self.target_dropdown = self.add_field("Target connection:", QComboBox())
+        self.target_dropdown.addItems(connections.sections())
+        self.target_dropdown.setCurrentText(process.get('target', ''))
+
+        self.tables_field = self.add_field("Tables:", QLineEdit(', '.join(process_tables(process))))
+        self.tables_field.setPlaceholderText("orders, order_lines")
+        self.schema_field = self.add_field("Schema:", QLineEdit(process.get('schema', '')))
+
+        self.mode_dropdown = self.add_field("Mode:", QComboBox())
+        self.mode_dropdown.addItems(MODES)
+        self.mode_dropdown.setCurrentText(process.get('mode') or 'incremental')
+        self.mode_dropdown.currentTextChanged.connect(self.update_mode_fields)
+        self.watermark_label = QLabel("Watermark column:")
+        self.watermark_field = self.add_field(self.watermark_label, QLineEdit(process.get('watermark_column', '')))
+        self.watermark_field.setPlaceholderText("updated_at")
+        self.key_columns_field = self.add_field("Key columns:", QLineEdit(process.get('key_columns', '')))
+        self.key_columns_field.setPlaceholderText("Primary key of the source table")
+        self.tombstone_label = QLabel("Tombstone column:")
+        self.tombstone_field = self.add_field(self.tombstone_label, QLineEdit(process.get('tombstone_column', '')))
+        self.tombstone_field.setPlaceholderText("Leave empty to delete the rows")
+
+        self.interval_field = self.add_field("Run every:", QLineEdit(process.get('interval', '')))
+        self.interval_field.setPlaceholderText("15m")
+        self.cron_field = self.add_field("Or on cron schedule:", QLineEdit(process.get('cron', '')))
+        self.cron_field.setPlaceholderText("*/15 6-22 * * mon-fri")
+        self.priority_field = self.add_field("Priority:", QSpinBox())
+        self.priority_field.setRange(-100, 100)
+        self.priority_field.setValue(int(process.get('priority') or 0))
+        self.enabled_checkbox = QCheckBox("Enabled")
+        self.enabled_checkbox.setChecked(is_enabled(process))
+        self.main_layout.addWidget(self.enabled_checkbox)
+
+        # Keys the form does not edit, e.g. batch_size, are kept as they are
+        self.extra_values = {key: value for key, value in process.items() if key not in (
+            'source', 'target', 'table', 'tables', 'schema', 'mode', 'watermark_column', 'key_columns',
+            'tombstone_column', 'interval', 'cron', 'priority', 'enabled')}
+
+        button_layout = QHBoxLayout()
+        self.save_button = QPushButton("Save")
+        self.save_button.clicked.connect(self.save_changes)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.close_button)
+        self.main_layout.addLayout(button_layout)
+
+        container = QWidget()
+        container.setLayout(self.main_layout)
+        self.setCentralWidget(container)
+        self.update_mode_fields()
+
+    def add_field(self, label, widget):
+        self.main_layout.addWidget(label if isinstance(label, QLabel) else QLabel(label))
+        self.main_layout.addWidget(widget)
+        return widget
+
+    def update_mode_fields(self):
+        """The watermark column only applies to incremental processes, the tombstone column to delete checks."""
+        mode = self.mode_dropdown.currentText()
+        self.watermark_label.setVisible(mode == 'incremental')
+        self.watermark_field.setVisible(mode == 'incremental')
+        self.tombstone_label.setVisible(mode == 'deletes')
+        self.tombstone_field.setVisible(mode == 'deletes')
+
+    def validate_fields(self):
+        process_id = self.id_field.text().strip()
+        if not process_id or not self.source_dropdown.currentText() or not self.target_dropdown.currentText() \
+                or not self.tables_field.text().strip():
+            QMessageBox.warning(self, "Validation Error", "Please fill in the ID, connections and tables.")
+            return False
+        if self.process_id is None and process_id in load_processes(self.ini_file):
+            QMessageBox.warning(self, "Validation Error", f"A process named '{process_id}' already exists.")
+            return False
+        if self.watermark_field.isVisible() and not self.watermark_field.text().strip():
+            QMessageBox.warning(self, "Validation Error", "Incremental processes need a watermark column.")
+            return False
+        try:
+            trigger_for({'interval': self.interval_field.text().strip(), 'cron': self.cron_field.text().strip()})
+        except ValueError as e:
+            QMessageBox.warning(self, "Validation Error", str(e))
+            return False
+        return True
+
+    def save_changes(self):
+        if not self.validate_fields():
+            return
+        self.process_id = self.id_field.text().strip()
+        values = dict(self.extra_values)
+        values.update({
+            'source': self.source_dropdown.currentText(),
+            'target': self.target_dropdown.currentText(),
+            'tables': self.tables_field.text().strip(),
+            'schema': self.schema_field.text().strip(),
+            'mode': self.mode_dropdown.currentText(),
+            'watermark_column': self.watermark_field.text().strip() if self.watermark_field.isVisible() else '',
+            'key_columns': self.key_columns_field.text().strip(),
+            'tombstone_column': self.tombstone_field.text().strip() if self.tombstone_field.isVisible() else '',
+            'interval': self.interval_field.text().strip(),
+            'cron': self.cron_field.text().strip(),
+            'priority': self.priority_field.value(),
+            'enabled': 'true' if self.enabled_checkbox.isChecked() else 'false',
+        })
+        try:
+            save_process(self.process_id, values, self.ini_file)
+        except OSError as e:
+            QMessageBox.critical(self, "Save Failed", f"Could not write {self.ini_file}: {e}")
+            return
+        self.saved.emit()
+        QMessageBox.information(self, "Saved", f"Process '{self.process_id}' has been saved.")
+        self.close()
+
+
+class ProcessMenu(QMainWindow):
+    def __init__(self, ini_file=PROCESSES_FILE, connections_file="data/connections.ini", scheduler=None):
+        super().__init__()
+        self.setWindowTitle("NoCDC - Processes")
+        self.setGeometry(100, 100, 900, 500)
+        self.ini_file = ini_file
+        self.connections_file = connections_file
+        self.store = config_store(ini_file)
+        self.config = self.store.load()
+
+        # A scheduler passed in is shared with the rest of the application and keeps running when the window closes
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or Scheduler(ini_file)
+        self.bridge = SchedulerBridge(self)
+        self.bridge.changed.connect(self.scheduler_changed)
+        self.scheduler.add_listener(self.bridge)
+
+        self.init_ui()
+        self.model.sync(self.config)
+        self.store_watcher = StoreWatcher(self.store, self)
+        self.store_watcher.changed.connect(self.sections_changed)
+        self.scheduler.load()
+        if self.owns_scheduler:
+            self.scheduler.start()
+        self.update_scheduler_button()
+
+    def init_ui(self):
+        self.main_layout = QVBoxLayout()
+
+        top_bar_layout = QHBoxLayout()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search...")
+        self.search_box.textChanged.connect(self.filter_table)
+        top_bar_layout.addWidget(self.search_box)
+
+        self.refresh_button = QPushButton()
+        self.refresh_button.setIcon(cached_icon("img/icons/arrow-round_path.svg"))
+        self.refresh_button.setFixedSize(32, 32)
+        self.refresh_button.clicked.connect(self.load_data)
+        top_bar_layout.addWidget(self.refresh_button)
+
+        self.add_button = QPushButton()
+        self.add_button.setIcon(cached_icon("img/icons/plus_path.svg"))
+        self.add_button.setFixedSize(32, 32)
+        self.add_button.clicked.connect(self.open_add_process_window)
+        top_bar_layout.addWidget(self.add_button)
+
+        self.run_button = QPushButton()
+        self.run_button.setIcon(cached_icon("img/icons/play_path.svg"))
+        self.run_button.setToolTip("Run the selected processes now")
+        self.run_button.setFixedSize(32, 32)
+        self.run_button.clicked.connect(self.run_selected)
+        top_bar_layout.addWidget(self.run_button)
+
+        self.bootstrap_button = QPushButton()
+        self.bootstrap_button.setIcon(cached_icon("img/icons/file-add_path.svg"))
+        self.bootstrap_button.setToolTip("Create and load the target tables of the selected process")
+        self.bootstrap_button.setFixedSize(32, 32)
+        self.bootstrap_button.clicked.connect(self.bootstrap_selected)
+        top_bar_layout.addWidget(self.bootstrap_button)
+
+        self.scheduler_button = QPushButton()
+        self.scheduler_button.setFixedSize(32, 32)
+        self.scheduler_button.clicked.connect(self.toggle_scheduler)
+        top_bar_layout.addWidget(self.scheduler_button)
+        self.main_layout.addLayout(top_bar_layout)
+
+        self.model = ProcessTableModel(self.scheduler, self)
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        self.proxy_model.setFilterKeyColumn(-1)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+
+        self.table_view = QTableView()
+        self.table_view.setModel(self.proxy_model)
+        self.table_view.setSortingEnabled(True)
+        self.table_view.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+        self.table_view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table_view.verticalHeader().setDefaultSectionSize(30)
+        self.table_view.setColumnWidth(ACTION_COLUMN, 100)
+
+        self.action_delegate = ActionDelegate(self.table_view)
+        self.action_delegate.editClicked.connect(self.open_edit_process_window)
+        self.action_delegate.deleteClicked.connect(self.delete_process)
+        self.table_view.setItemDelegateForColumn(ACTION_COLUMN, self.action_delegate)
+        self.table_view.selectionModel().selectionChanged.connect(self.show_selected_run)
+        self.main_layout.addWidget(self.table_view, 3)
+
+        # Live metrics of the selected process, or of the last one to report progress if none is selected
+        self.progress_panel = RunProgressPanel()
+        self.main_layout.addWidget(self.progress_panel, 1)
+        # Partitions of the running bootstrap, shown once one starts
+        self.partition_panel = PartitionProgressPanel()
+        self.partition_panel.setVisible(False)
+        self.main_layout.addWidget(self.partition_panel, 1)
+        self.bootstrap_worker = None
+
+        container = QWidget()
+        container.setLayout(self.main_layout)
+        self.setCentralWidget(container)
+
+    def load_data(self):
+        """Check the definitions file for changes now; changed sections arrive through sections_changed."""
+        self.store.poll()
+        self.scheduler.load()
+
+    def sections_changed(self, changes):
+        """Update the rows of the processes that were added, edited or deleted, here or elsewhere."""
+        self.config = self.store.config
+        self.model.apply_changes(self.config, changes)
+
+    def filter_table(self):
+        self.proxy_model.setFilterFixedString(self.search_box.text())
+
+    def scheduler_changed(self, event, status):
+        self.model.status_changed(status.process_id)
+        selected = self.selected_process_ids()
+        if status.process_id in selected[:1] or (not selected and event in ('started', 'progress')):
+            self.progress_panel.show_run(status.process_id, status.metrics)
+        if event == 'failed' and status.error:
+            self.statusBar().showMessage(f"Process '{status.process_id}' failed: {status.error.splitlines()[0]}")
+
+    def show_selected_run(self):
+        selected = self.selected_process_ids()
+        if selected:
+            self.progress_panel.show_run(selected[0], self.scheduler.status(selected[0]).metrics)
+
+    def selected_process_ids(self):
+        rows = {self.proxy_model.mapToSource(index).row() for index in self.table_view.selectionModel().selectedRows()}
+        return [self.model.rows[row][0] for row in sorted(rows)]
+
+    def run_selected(self):
+        """Queue the selected processes now, skipping those already queued or running."""
+        if not self.scheduler.is_running():
+            self.scheduler.start()
+            self.update_scheduler_button()
+        for process_id in self.selected_process_ids():
+            self.scheduler.enqueue(process_id)
+
+    def bootstrap_selected(self):
+        """Create and load the target tables of the selected process in the background, one partition per line."""
+        selected = self.selected_process_ids()
+        if not selected or self.bootstrap_worker is not None:
+            return
+        process_id = selected[0]
+        reply = QMessageBox.question(
+            self,
+            'Bootstrap Process',
+            f"Copy all rows of '{process_id}' into new target tables?\n"
+            f"Choose Yes to replace target tables that already exist, No to stop if one exists.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel,
+            QMessageBox.StandardButton.Cancel
+        )
+        if reply == QMessageBox.StandardButton.Cancel:
+            return
+        from InitialLoad import bootstrap_process  # SQLAlchemy work only happens on the worker
+
+        self.partition_panel.clear_partitions()
+        self.partition_panel.setVisible(True)
+        self.bootstrap_button.setEnabled(False)
+        self.statusBar().showMessage(f"Bootstrapping '{process_id}' ...")
+        self.bootstrap_worker = Worker(bootstrap_process, process_id, self.ini_file,
+                                       replace=reply == QMessageBox.StandardButton.Yes)
+        self.bootstrap_worker.signals.progress.connect(self.partition_panel.update_partition)
+        self.bootstrap_worker.signals.result.connect(
+            lambda results: self.statusBar().showMessage(f"Bootstrapped '{process_id}': " + ", ".join(
+                f"{table_name} {result.rows:,} rows" for table_name, result in results.items())))
+        self.bootstrap_worker.signals.error.connect(
+            lambda error: self.statusBar().showMessage(f"Bootstrap of '{process_id}' failed: {error}"))
+        self.bootstrap_worker.signals.finished.connect(self.bootstrap_finished)
+        start_worker(self.bootstrap_worker)
+
+    def bootstrap_finished(self):
+        self.bootstrap_worker = None
+        self.bootstrap_button.setEnabled(True)
+
+    def toggle_scheduler(self):
+        if self.scheduler.is_running():
+            # Running processes finish in the background, only the queue is dropped
+            self.scheduler.stop(wait=False)
+        else:
+            self.scheduler.start()
+        self.update_scheduler_button()
+
+    def update_scheduler_button(self):
+        running = self.scheduler.is_running()
+        self.scheduler_button.setIcon(cached_icon("img/icons/stop_path.svg" if running else "img/icons/arrows-round_path.svg"))
+        self.scheduler_button.setToolTip("Pause the scheduler" if running else "Resume the scheduler")
+
+    def open_add_process_window(self):
+        self.process_config_window = ProcessConfig(self.ini_file, self.connections_file)
+        self.process_config_window.saved.connect(self.load_data)
+        self.process_config_window.show()
+
+    def open_edit_process_window(self, process_id):
+        self.process_config_window = ProcessConfig(self.ini_file, self.connections_file, process_id)
+        self.process_config_window.saved.connect(self.load_data)
+        self.process_config_window.show()
+
+    def delete_process(self, process_id):
+        reply = QMessageBox.question(
+            self,
+            'Delete Process',
+            f"Are you sure you want to delete the process '{process_id}'?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            try:
+                delete_process(process_id, self.ini_file)
+            except OSError as e:
+                QMessageBox.critical(self, "Delete Failed", f"Could not write {self.ini_file}: {e}")
+                return
+            self.load_data()
+
+    def closeEvent(self, event):
+        """Stop the window's own scheduler when it closes; running processes finish in the background."""
+        self.scheduler.listeners.remove(self.bridge)
+        self.store_watcher.stop()
+        if self.owns_scheduler:
+            self.scheduler.stop(wait=False)
+        super().closeEvent(event)
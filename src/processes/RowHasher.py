@@ -0,0 +1,300 @@
+import datetime
+import decimal
+import functools
+import hashlib
+import math
+
+from sqlalchemy import BigInteger, Numeric, Text, cast, func, literal
+from sqlalchemy.dialects import mssql, mysql
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Hashing falls back to one Python call per row
+    np = None
+    pa = None
+
+# Text standing in for NULL in SQL-side hashes
+NULL_MARKER = '\\N'
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def decimal_text(value):
+    """Exact positional text of a finite Decimal without trailing zeros: Decimal('1.50E+2') gives '150'."""
+    text = format(value, 'f')
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def number_text(value):
+    """
+    Canonical text of a number, exact for every type: integral values are written as integers, Decimals
+    with all their digits and floats with the shortest digits that read back as the same float, so
+    Decimal('0.1') and 0.1 agree while Decimal('0.1000000000000000001') stays distinct.
+    """
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return repr(value)
+        if value.is_integer() and abs(value) < 2 ** 53:
+            return str(int(value))
+        return decimal_text(decimal.Decimal(repr(value)))
+    if isinstance(value, decimal.Decimal):
+        return decimal_text(value) if value.is_finite() else repr(float(value))
+    return str(int(value))
+
+
+def normalize_value(value):
+    """
+    Canonical text of a value, so that the same value read through different drivers hashes the same:
+    1, 1.0 and Decimal('1.00') all become '1' (see number_text), dates become midnight timestamps, aware
+    timestamps are converted to UTC and empty strings are treated as NULL, as Oracle stores them.
+    """
+    if value is None or value == '' or value == b'':
+        return None
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return number_text(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=' ', timespec='microseconds')
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day).isoformat(sep=' ', timespec='microseconds')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def row_hash(values):
+    """64-bit fingerprint of one row, computed in Python."""
+    normalized = '\x1f'.join('\x00' if value is None else value for value in map(normalize_value, values))
+    return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+if np is not None:
+    NULL_HASH = np.uint64(0x6A09E667F3BCC908)
+    TIME_TAG = np.uint64(0xA54FF53A5F1D36F1)
+    STRING_PRIME = np.uint64(0x100000001B3)
+    MICROSECONDS_PER_DAY = 86_400_000_000
+
+    def splitmix64(x):
+        """Vectorised 64-bit finaliser spreading every input bit over the whole output."""
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+    def coerce_mixed(values):
+        """
+        Arrow array for a column whose values have mixed Python types, e.g. the ints and floats
+        cx_Oracle returns for a NUMBER column, or integers beyond 64 bits. Returns None for numbers,
+        which python_numeric_hashes hashes one by one; dates are unified so they hash like a
+        homogeneous column would, and anything else becomes normalised text.
+        """
+        present = [value for value in values if value is not None]
+        if all(isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool) for value in present):
+            return None
+        if all(isinstance(value, datetime.date) for value in present):
+            return pa.array([
+                value if value is None or isinstance(value, datetime.datetime)
+                else datetime.datetime(value.year, value.month, value.day)
+                for value in values
+            ])
+        return pa.array([normalize_value(value) for value in values], type=pa.string())
+
+    def to_arrow(values):
+        """Arrow array of a column, falling back to normalised text for values Arrow cannot type."""
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, TypeError):
+            return coerce_mixed(values)
+        kind = array.type
+        if (pa.types.is_integer(kind) or pa.types.is_boolean(kind) or pa.types.is_floating(kind)
+                or pa.types.is_decimal(kind) or pa.types.is_timestamp(kind) or pa.types.is_date(kind)
+                or pa.types.is_string(kind) or pa.types.is_large_string(kind) or pa.types.is_binary(kind)
+                or pa.types.is_large_binary(kind) or pa.types.is_null(kind)):
+            return array
+        return pa.array([normalize_value(value) for value in values], type=pa.string())
+
+    INT64_MIN = -2 ** 63
+    INT64_MAX = 2 ** 63 - 1
+
+    def numeric_text_hashes(texts):
+        """
+        Hashes of numbers given as an Arrow array of their number_text: integers within int64 hash like
+        an integer column, anything else by its text. No number goes through float64, so equal values
+        of any type agree and distinct values stay distinct.
+        """
+        texts = texts.fill_null('0')
+        hashes = string_hashes(texts)[0]
+        whole = np.flatnonzero(pc.invert(pc.match_substring(texts, '.')).to_numpy(zero_copy_only=False))
+        for position, text in zip(whole.tolist(), texts.take(pa.array(whole)).to_pylist()):
+            # Whole numbers are rare in float and decimal columns, and only a few fit int64 as text
+            number = int(text) if text.lstrip('-').isdigit() else None
+            if number is not None and INT64_MIN <= number <= INT64_MAX:
+                hashes[position] = splitmix64(np.array([number], dtype=np.int64).view(np.uint64))[0]
+        return hashes
+
+    def fix_texts(texts, values, pattern):
+        """Replace the texts Arrow printed matching `pattern` by the number_text of their value."""
+        wrong = np.flatnonzero(pc.match_substring_regex(texts, pattern).fill_null(False).to_numpy(zero_copy_only=False))
+        if not wrong.size:
+            return texts
+        texts = texts.to_pylist()
+        for position, value in zip(wrong.tolist(), values.take(pa.array(wrong)).to_pylist()):
+            texts[position] = number_text(value)
+        return pa.array(texts, type=pa.string())
+
+    def python_numeric_hashes(values):
+        """Hashes of Python numbers of mixed or oversized types, one value at a time."""
+        return numeric_text_hashes(pa.array([None if value is None else number_text(value) for value in values],
+                                            type=pa.string()))
+
+    def float_hashes(array):
+        """Floats hashed as number_text reads them, integral ones below 2**53 without text."""
+        floats = array.fill_null(0).to_numpy(zero_copy_only=False).astype(np.float64)
+        exact = np.isfinite(floats) & (floats == np.floor(floats)) & (np.abs(floats) < 2.0 ** 53)
+        hashes = splitmix64(np.where(exact, floats, 0.0).astype(np.int64).view(np.uint64))
+        others = ~exact
+        if others.any():
+            # Arrow prints the shortest digits, as repr does, but some in exponent form (and inf, nan)
+            values = pa.array(floats[others])
+            hashes[others] = numeric_text_hashes(fix_texts(pc.cast(values, pa.string()), values, '[en]'))
+        return hashes
+
+    def decimal_hashes(array):
+        """Decimals hashed as number_text reads them: Arrow's text without the trailing zeros of the scale."""
+        if array.type.scale == 0 and array.type.precision <= 18:
+            return splitmix64(array.cast(pa.int64()).fill_null(0).to_numpy(zero_copy_only=False).view(np.uint64))
+        texts = pc.cast(array, pa.string())
+        texts = pc.replace_substring_regex(pc.replace_substring_regex(texts, r'(\.\d*?)0+$', r'\1'), r'\.$', '')
+        texts = pc.if_else(pc.equal(texts, '-0'), '0', texts)
+        # Arrow writes zeros and some small values in exponent form
+        return numeric_text_hashes(fix_texts(texts, array, 'E'))
+
+    STRING_PRIME_INVERSE = np.uint64(pow(int(STRING_PRIME), -1, 2 ** 64))
+    # Powers of the string prime and of its inverse, grown on demand and reused between batches
+    POWER_CACHE_LIMIT = 1 << 23
+    power_tables = {}
+
+    def powers_of(base, count):
+        """[1, base, base**2, ...] modulo 2**64, at least `count` entries long."""
+        table = power_tables.get(int(base))
+        if table is None or len(table) < count:
+            size = 1 << max(10, (count - 1).bit_length())
+            table = np.ones(size, dtype=np.uint64)
+            table[1:] = np.cumprod(np.full(size - 1, base, dtype=np.uint64))
+            if size <= POWER_CACHE_LIMIT:
+                power_tables[int(base)] = table
+        return table
+
+    def string_hashes(array):
+        """
+        Polynomial hash of every string or binary value, computed over the Arrow data buffer at once:
+        each byte is weighted by P**i for its offset i in the buffer, the weights are summed per value
+        and shifted back to the value's own start by P**-start. Returns the hashes and the byte lengths.
+        """
+        array = array.cast(pa.large_binary())
+        buffers = array.buffers()
+        offsets = np.frombuffer(buffers[1], dtype=np.int64, count=len(array) + 1, offset=array.offset * 8)
+        lengths = np.diff(offsets)
+        hashes = np.zeros(len(array), dtype=np.uint64)
+
+        data = np.frombuffer(buffers[2], dtype=np.uint8)[offsets[0]:offsets[-1]] if buffers[2] else np.empty(0, np.uint8)
+        if data.size:
+            starts = (offsets[:-1] - offsets[0])[lengths > 0]
+            terms = (data.astype(np.uint64) + np.uint64(1)) * powers_of(STRING_PRIME, data.size)[:data.size]
+            sums = np.add.reduceat(terms, starts)
+            hashes[lengths > 0] = sums * powers_of(STRING_PRIME_INVERSE, data.size)[starts]
+        return splitmix64(hashes ^ splitmix64(lengths.astype(np.uint64))), lengths
+
+    def column_hashes(values):
+        """One 64-bit hash per value of a column, NULL (and empty text) mapping to a fixed constant."""
+        array = to_arrow(values)
+        if array is None:
+            nulls = np.array([value is None for value in values], dtype=bool)
+            return np.where(nulls, NULL_HASH, python_numeric_hashes(values))
+        kind = array.type
+        if pa.types.is_null(kind):
+            return np.full(len(array), NULL_HASH, dtype=np.uint64)
+        nulls = array.is_null().to_numpy(zero_copy_only=False)
+
+        if pa.types.is_integer(kind) or pa.types.is_boolean(kind):
+            integers = array.cast(pa.int64()).fill_null(0).to_numpy(zero_copy_only=False)
+            hashes = splitmix64(integers.view(np.uint64))
+        elif pa.types.is_floating(kind):
+            hashes = float_hashes(array)
+        elif pa.types.is_decimal(kind):
+            hashes = decimal_hashes(array)
+        elif pa.types.is_timestamp(kind) or pa.types.is_date(kind):
+            if pa.types.is_date(kind):
+                micros = array.cast(pa.date32()).cast(pa.int32()).cast(pa.int64()).fill_null(0).to_numpy(
+                    zero_copy_only=False) * MICROSECONDS_PER_DAY
+            else:
+                micros = array.cast(pa.timestamp('us', tz=kind.tz)).cast(pa.int64()).fill_null(0).to_numpy(
+                    zero_copy_only=False)
+            hashes = splitmix64(micros.view(np.uint64) ^ TIME_TAG)
+        else:
+            hashes, lengths = string_hashes(array)
+            nulls = nulls | (lengths == 0)
+        return np.where(nulls, NULL_HASH, hashes)
+
+
+def hash_rows(rows):
+    """
+    64-bit fingerprints of a batch of rows. With NumPy and PyArrow the batch is hashed column by
+    column with vectorised kernels; otherwise every row goes through row_hash. Both normalise values
+    the same way, so a value hashes identically whichever dialect and driver it was read from.
+    """
+    if np is None:
+        return [row_hash(row) for row in rows]
+    if not rows:
+        return np.empty(0, dtype=np.uint64)
+
+    hashes = np.full(len(rows), np.uint64(0xCBF29CE484222325), dtype=np.uint64)
+    for position, values in enumerate(zip(*rows)):
+        hashes = splitmix64((hashes ^ column_hashes(values)) + np.uint64(position + 1))
+    return hashes
+
+
+def checksum(rows):
+    """Row count and order-independent checksum (sum of row hashes modulo 2**64) of a batch."""
+    hashes = hash_rows(rows)
+    if np is not None:
+        return len(rows), int(hashes.sum(dtype=np.uint64))
+    return len(rows), sum(hashes) & MASK_64
+
+
+# Dialects with a hash function usable to checksum buckets on the database side
+PUSHDOWN_DIALECTS = ('postgresql', 'mysql', 'mssql', 'oracle', 'snowflake')
+
+
+def sql_row_hash(dialect, columns):
+    """
+    SQL expression hashing a row to an integer on the database side, or None when the dialect has no
+    suitable function. The values are only comparable between two databases of the same dialect.
+    """
+    if dialect == 'snowflake':
+        return func.hash(*columns)
+    if dialect == 'oracle':
+        texts = [func.nvl(func.to_char(column), literal(NULL_MARKER)) for column in columns]
+        joined = functools.reduce(lambda left, right: left.op('||')(literal('|')).op('||')(right), texts)
+        return func.to_number(func.substr(func.rawtohex(func.standard_hash(joined, 'MD5')), 1, 15),
+                              'XXXXXXXXXXXXXXX')
+
+    if dialect == 'mssql':
+        texts = [func.coalesce(cast(column, mssql.NVARCHAR('max')), literal(NULL_MARKER)) for column in columns]
+    else:
+        texts = [func.coalesce(cast(column, Text), literal(NULL_MARKER)) for column in columns]
+    joined = func.concat_ws('|', *texts)
+
+    if dialect == 'postgresql':
+        return func.hashtextextended(joined, 0)
+    if dialect == 'mysql':
+        return cast(func.conv(func.substr(func.md5(joined), 1, 15), 16, 10), mysql.BIGINT(unsigned=True))
+    if dialect == 'mssql':
+        return cast(cast(func.substring(func.hashbytes('MD5', joined), 1, 7), BigInteger), Numeric(38, 0))
+    return None
@@ -0,0 +1,62 @@
+import time
+
+from sqlalchemy import select
+
+from BatchSizer import batch_sizers
+from RunMetrics import count, estimated_bytes, stage
+
+# Rows per batch where a fixed number is needed, e.g. to size change-set files
+DEFAULT_BATCH_SIZE = 10000
+
+
+def iter_batches(engine, query, batch_size=None):
+    """
+    Yield the rows of a query in lists of at most `batch_size` rows.
+    Results are streamed through a server-side cursor where the driver supports it,
+    so memory use depends on the batch size and not on the size of the table.
+    Without a `batch_size` every fetch is sized by the connection's BatchSizer from the
+    measured round trip, time per row and memory headroom.
+    """
+    sizer = batch_sizers.get(engine, 'read') if batch_size is None else None
+    with engine.connect() as connection:
+        with stage('extract'):
+            if sizer is not None:
+                sizer.measure_round_trip(connection)
+            result = connection.execution_options(stream_results=True).execute(query)
+        while True:
+            # Only the fetch is timed as extraction, not what the caller does with the batch
+            with stage('extract'):
+                started = time.perf_counter()
+                batch = result.fetchmany(sizer.batch_size if sizer is not None else batch_size)
+                elapsed = time.perf_counter() - started
+                if batch:
+                    size_bytes = estimated_bytes(batch)
+                    if sizer is not None:
+                        sizer.observe(len(batch), elapsed, size_bytes)
+                    count('rows_read', len(batch))
+                    count('bytes_read', size_bytes)
+            if not batch:
+                return
+            yield batch
+
+
+def iter_rows(engine, query, batch_size=None):
+    """Yield the rows of a query one by one while fetching them in batches."""
+    for batch in iter_batches(engine, query, batch_size):
+        yield from batch
+
+
+def table_query(table, columns=None, where=None, order_by=None):
+    """Build the SELECT used to extract a table, optionally restricted to some columns and rows."""
+    selected = [table.columns[name] for name in columns] if columns else [table]
+    query = select(*selected)
+    if where is not None:
+        query = query.where(where)
+    if order_by:
+        query = query.order_by(*[table.columns[name] for name in order_by])
+    return query
+
+
+def read_table(engine, table, columns=None, where=None, order_by=None, batch_size=None):
+    """Stream a table as fixed-size batches of rows."""
+    return iter_batches(engine, table_query(table, columns, where, order_by), batch_size)
@@ -0,0 +1,218 @@
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ConfigStore import atomic_write
+from EngineRegistry import engine_registry
+
+# Stages a sync run is broken into, in pipeline order
+STAGES = ('connect', 'extract', 'hash', 'diff', 'stage', 'apply', 'index', 'checkpoint')
+RUN_LOG_FILE = "data/logs/runs.jsonl"
+# Seconds between two live progress reports of a run
+PROGRESS_INTERVAL = 0.5
+
+# Metrics of the run executing in the current thread or task, if any
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+
+class RunMetrics:
+    """
+    Timings, row counters and database round trips of one run of a process.
+    Stage times are exclusive: time spent in a nested stage (extracting inside a diff, say) is
+    only counted for the inner stage, so the stages add up to the instrumented part of the run, or
+    to more than the wall time when partitions run on parallel worker threads.
+    """
+
+    def __init__(self, process_id, on_progress=None):
+        self.process_id = process_id
+        self.on_progress = on_progress
+        self.stage_seconds = {}
+        self.counters = {}
+        self.round_trips = {}
+        self.started_at = None
+        self.finished_at = None
+        self.wall_seconds = None
+        self.status = 'running'
+        self.error = ''
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.last_progress = 0.0
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Collect the metrics of everything the current thread does inside the block."""
+        token = current_metrics.set(self)
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        started = time.perf_counter()
+        try:
+            yield self
+        except BaseException as e:
+            self.status = 'failed'
+            self.error = str(e)
+            raise
+        else:
+            self.status = 'finished'
+        finally:
+            self.wall_seconds = time.perf_counter() - started
+            self.finished_at = datetime.datetime.now(datetime.timezone.utc)
+            current_metrics.reset(token)
+            self.report_progress(force=True)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # Time spent in stages nested in this one
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed - nested
+            self.report_progress()
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def count_round_trip(self, connection_id):
+        with self.lock:
+            self.round_trips[connection_id] = self.round_trips.get(connection_id, 0) + 1
+
+    def report_progress(self, force=False):
+        now = time.monotonic()
+        if self.on_progress is not None and (force or now - self.last_progress >= PROGRESS_INTERVAL):
+            self.last_progress = now
+            self.on_progress(self)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'process_id': self.process_id,
+                'status': self.status,
+                'error': self.error,
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'wall_seconds': round(self.wall_seconds, 4) if self.wall_seconds is not None else None,
+                'stage_seconds': {name: round(seconds, 4) for name, seconds in self.stage_seconds.items()},
+                'counters': dict(self.counters),
+                'round_trips': dict(self.round_trips),
+            }
+
+
+def stage(name):
+    """Time a block as a stage of the current run; does nothing outside of a run."""
+    metrics = current_metrics.get()
+    return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+
+def count(name, value=1):
+    """Add to a counter of the current run; does nothing outside of a run."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def estimated_bytes(rows, sample_size=10):
+    """Size of a batch of rows as text, extrapolated from its first rows."""
+    if not rows:
+        return 0
+    sample = rows[:sample_size]
+    return sum(len(str(value)) for row in sample for value in row) * len(rows) // len(sample)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(connection, cursor, statement, parameters, context, executemany):
+    """Every statement sent to a database counts as one round trip of the current run."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.count_round_trip(engine_registry.connection_id_of(connection.engine) or str(connection.engine.url))
+
+
+def append_run_log(metrics, path=RUN_LOG_FILE):
+    """Append a run as one JSON line."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as log_file:
+        log_file.write(json.dumps(metrics.to_dict()) + '\n')
+
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusExporter:
+    """
+    Keep the last run of every process and render it in the Prometheus text format, written
+    atomically to a file (e.g. for the node_exporter textfile collector) after every run.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def record(self, metrics):
+        with self.lock:
+            self.runs[metrics.process_id] = metrics.to_dict()
+        if self.path:
+            atomic_write(self.path, self.render())
+
+    def render(self):
+        with self.lock:
+            runs = [self.runs[process_id] for process_id in sorted(self.runs)]
+        families = [
+            ('nocdc_last_run_success', 'gauge', "1 if the last run of the process succeeded."),
+            ('nocdc_last_run_timestamp_seconds', 'gauge', "Unix time the last run finished."),
+            ('nocdc_last_run_duration_seconds', 'gauge', "Wall time of the last run."),
+            ('nocdc_last_run_stage_seconds', 'gauge', "Time spent in each stage of the last run."),
+            ('nocdc_last_run_rows', 'gauge', "Row and byte counters of the last run."),
+            ('nocdc_last_run_round_trips', 'gauge', "Statements sent to each connection in the last run."),
+        ]
+        samples = {name: [] for name, _, _ in families}
+        for run in runs:
+            process = f'process="{prometheus_label(run["process_id"])}"'
+            samples['nocdc_last_run_success'].append((process, 1 if run['status'] == 'finished' else 0))
+            if run['finished_at']:
+                finished = datetime.datetime.fromisoformat(run['finished_at']).timestamp()
+                samples['nocdc_last_run_timestamp_seconds'].append((process, finished))
+            samples['nocdc_last_run_duration_seconds'].append((process, run['wall_seconds'] or 0))
+            for name, seconds in run['stage_seconds'].items():
+                samples['nocdc_last_run_stage_seconds'].append((f'{process},stage="{prometheus_label(name)}"', seconds))
+            for name, value in run['counters'].items():
+                samples['nocdc_last_run_rows'].append((f'{process},counter="{prometheus_label(name)}"', value))
+            for connection_id, value in run['round_trips'].items():
+                samples['nocdc_last_run_round_trips'].append(
+                    (f'{process},connection="{prometheus_label(connection_id)}"', value))
+
+        lines = []
+        for name, kind, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def format_run(metrics):
+    """Human-readable summary of a run, one stage or counter per line."""
+    run = metrics.to_dict()
+    lines = [f"{run['process_id']}: {run['status']} in {run['wall_seconds'] or 0:.2f} s"]
+    total = run['wall_seconds'] or 0
+    for name in sorted(run['stage_seconds'], key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+        seconds = run['stage_seconds'][name]
+        share = f" ({seconds / total:5.1%})" if total else ''
+        lines.append(f"  {name:<16} {seconds:12.3f} s{share}")
+    for name, value in sorted(run['counters'].items()):
+        lines.append(f"  {name:<16} {value:>12,}")
+    for connection_id, value in sorted(run['round_trips'].items()):
+        lines.append(f"  round trips to {connection_id}: {value:,}")
+    return '\n'.join(lines)
@@ -0,0 +1,126 @@
+import datetime
+import re
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# (lowest, highest) value of each cron field
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+CRON_NAMES = {
+    3: ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'],
+    4: ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'],
+}
+
+
+def parse_duration(value):
+    """Seconds of a duration such as '90', '15m', '2h' or '1h30m'."""
+    value = value.strip().lower()
+    if value.isdigit():
+        return int(value)
+    parts = re.findall(r'(\d+)\s*([smhd])', value)
+    if not parts or ''.join(number + unit for number, unit in parts) != re.sub(r'\s+', '', value):
+        raise ValueError(f"Invalid duration '{value}', expected e.g. '30s', '15m' or '1h30m'")
+    return sum(int(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+class IntervalTrigger:
+    """Fire every `seconds` seconds after the previous run."""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("The interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + datetime.timedelta(seconds=self.seconds)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalTrigger) and other.seconds == self.seconds
+
+    def __repr__(self):
+        return f"every {self.seconds}s"
+
+
+class CronTrigger:
+    """
+    Fire on the minutes matching a standard five-field cron expression (minute, hour, day of month,
+    month, day of week) in local time. Fields accept *, lists, ranges, steps and month/day names; as
+    in cron, a restricted day of month and day of week match when either of them does.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}', expected five fields")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self.parse_field(field, index) for index, field in enumerate(fields)
+        ]
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def parse_value(value, index):
+        names = CRON_NAMES.get(index)
+        if names and value.lower() in names:
+            return names.index(value.lower()) + (1 if index == 3 else 0)
+        number = int(value)
+        return 0 if index == 4 and number == 7 else number  # 7 is Sunday as well
+
+    @classmethod
+    def parse_field(cls, field, index):
+        lowest, highest = CRON_FIELDS[index]
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            if part == '*':
+                start, end = lowest, highest
+            elif '-' in part:
+                start, end = (cls.parse_value(value, index) for value in part.split('-', 1))
+            else:
+                start = cls.parse_value(part, index)
+                end = highest if step else start
+            step = int(step) if step else 1
+            if not (lowest <= start <= highest and lowest <= end <= highest) or step < 1:
+                raise ValueError(f"Invalid cron field '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment`."""
+        moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = moment + datetime.timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                # Jump to the first day of the next month
+                moment = (moment.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self.day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += datetime.timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+    def __eq__(self, other):
+        return isinstance(other, CronTrigger) and other.expression == self.expression
+
+    def __repr__(self):
+        return f"cron {self.expression}"
+
+
+def trigger_for(process):
+    """Trigger of a process definition from its `cron` or `interval` key, or None if it only runs on demand."""
+    if process.get('cron'):
+        return CronTrigger(process['cron'])
+    if process.get('interval'):
+        return IntervalTrigger(parse_duration(process['interval']))
+    return None
@@ -0,0 +1,356 @@
+import concurrent.futures
+import contextlib
+import datetime
+import heapq
+import itertools
+import threading
+import traceback
+
+from ConfigStore import config_store
+from EngineRegistry import engine_registry
+from ProcessDefinitions import (
+    PROCESSES_FILE, ProcessRunning, get_process, is_enabled, process_connections, process_priority, process_run,
+    process_tables, split_list
+)
+from RunMetrics import RUN_LOG_FILE, PrometheusExporter, RunMetrics, append_run_log
+from Schedule import trigger_for
+from SessionBudget import session_budget
+
+# Processes running at the same time, whatever connections they use
+DEFAULT_MAX_WORKERS = 4
+# Processes using the same connection at the same time, unless its ini section sets max_sessions,
+# which then limits the sessions of the connection instead (see SessionBudget)
+DEFAULT_CONNECTION_LIMIT = 2
+# Seconds between two checks for due processes
+TICK_SECONDS = 1.0
+
+
+def run_process(process_id, ini_file=PROCESSES_FILE):
+    """Run every table of a process once and return a {table: result} dict."""
+    process = get_process(process_id, ini_file)
+    mode = process.get('mode') or 'incremental'
+    results = {}
+    for table_name in process_tables(process):
+        if mode == 'incremental':
+            from IncrementalSync import IncrementalSync
+            results[table_name] = IncrementalSync.from_process(process_id, ini_file, table_name=table_name).run()
+        elif mode == 'diff':
+            from TableDiff import TableDiff
+            single = len(process_tables(process)) == 1
+            diff = TableDiff(
+                process['source'], process['target'], table_name,
+                schema=process.get('schema') or None,
+                target_table_name=(process.get('target_table') or None) if single else None,
+                target_schema=process.get('target_schema') or None,
+                key_columns=split_list(process.get('key_columns')) or None
+            )
+            change_set = diff.new_change_set()
+            results[table_name] = diff.run(change_set)
+            change_set.close()
+            change_set.apply(diff.target_engine, diff.target_table)
+        elif mode == 'deletes':
+            from DeleteDetector import DeleteDetector
+            single = len(process_tables(process)) == 1
+            detector = DeleteDetector(
+                process['source'], process['target'], table_name,
+                schema=process.get('schema') or None,
+                target_table_name=(process.get('target_table') or None) if single else None,
+                target_schema=process.get('target_schema') or None,
+                key_columns=split_list(process.get('key_columns')) or None,
+                tombstone_column=process.get('tombstone_column') or None,
+                method=process.get('delete_method') or 'auto',
+                batch_size=int(process['batch_size']) if process.get('batch_size') else None
+            )
+            results[table_name] = detector.run(apply=True)
+        else:
+            raise ValueError(f"Unknown mode '{mode}' of process '{process_id}'")
+    return results
+
+
+class JobStatus:
+    """Last known state of a process in the scheduler."""
+
+    def __init__(self, process_id):
+        self.process_id = process_id
+        self.state = 'idle'  # idle, queued, running
+        self.next_run = None
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = ''
+        self.metrics = None  # RunMetrics of the current or last run
+
+    def __repr__(self):
+        return f"JobStatus({self.process_id!r}, {self.state!r})"
+
+
+class Scheduler:
+    """
+    Run the processes of the definitions file on their interval or cron triggers, or on demand.
+    Due processes are queued by priority (highest first, then in arrival order) and a process is
+    never queued twice. A queued process starts when fewer than `max_workers` processes run and every
+    connection it uses has a free session in the `budget`, which the process then holds while it runs
+    and which its partition workers draw on as well. Connections without `max_sessions` in their ini
+    section are limited to the `connection_limits` passed in or DEFAULT_CONNECTION_LIMIT processes
+    instead. Processes blocked by a busy connection do not hold back lower priority ones using other
+    connections. A run holds the run lock of its process (see process_run), so a window, a daemon
+    or `nocdc run` never run a process twice at the same time; a scheduler finding it taken skips
+    its run. Listeners are called as listener(event, status) from the scheduler threads,
+    with event one of 'queued', 'started', 'progress', 'finished', 'failed', 'skipped' or 'updated'.
+    Every run is measured into
+    `status.metrics`, appended to the `run_log` and, if a `metrics_file` is given, exported there
+    in the Prometheus text format.
+    """
+
+    def __init__(self, ini_file=PROCESSES_FILE, max_workers=DEFAULT_MAX_WORKERS, connection_limits=None,
+                 runner=run_process, registry=engine_registry, run_log=RUN_LOG_FILE, metrics_file=None,
+                 budget=session_budget):
+        self.ini_file = ini_file
+        self.max_workers = max_workers
+        self.connection_limits = dict(connection_limits or {})
+        self.runner = runner
+        self.registry = registry
+        self.budget = budget
+        self.run_log = run_log
+        self.exporter = PrometheusExporter(metrics_file)
+
+        self.store = config_store(ini_file)
+        self.processes = {}
+        self.pending = None  # processes whose sections changed since the last load, None for all of them
+        self.triggers = {}
+        self.statuses = {}
+        self.queue = []  # heap of (-priority, sequence, process_id)
+        self.sequence = itertools.count()
+        self.running = {}  # process_id -> connection ids
+        self.sessions = {}  # connection_id -> running processes
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.executor = None
+        self.thread = None
+        # Changes may be noticed by whoever polls the shared store first, e.g. a window saving a process
+        self.store.add_listener(self.sections_changed)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, event, status):
+        for listener in list(self.listeners):
+            listener(event, status)
+
+    def status(self, process_id):
+        with self.lock:
+            if process_id not in self.statuses:
+                self.statuses[process_id] = JobStatus(process_id)
+            return self.statuses[process_id]
+
+    def load(self, now=None):
+        """
+        Pick up the sections of the definitions file added, edited or deleted since the last call.
+        Only those processes get a new trigger; the next run of the others is left alone.
+        """
+        self.store.poll()
+        now = now or datetime.datetime.now()
+        with self.lock:
+            changed = list(self.store.sections) if self.pending is None else sorted(self.pending)
+            self.pending = set()
+            if not changed:
+                return
+            for process_id in changed:
+                process = self.store.sections.get(process_id)
+                if process is None:
+                    self.processes.pop(process_id, None)
+                    self.triggers.pop(process_id, None)
+                    if process_id in self.statuses and self.statuses[process_id].state == 'idle':
+                        del self.statuses[process_id]
+                    continue
+                self.processes[process_id] = dict(process)
+                try:
+                    trigger = trigger_for(process) if is_enabled(process) else None
+                except ValueError:
+                    trigger = None  # A broken schedule only disables that process
+                status = self.status(process_id)
+                if trigger is None:
+                    self.triggers.pop(process_id, None)
+                    status.next_run = None
+                    continue
+                if self.triggers.get(process_id) != trigger or status.next_run is None:
+                    status.next_run = trigger.next_after(now)
+                self.triggers[process_id] = trigger
+            statuses = [self.statuses[process_id] for process_id in changed if process_id in self.statuses]
+        for status in statuses:
+            self.notify('updated', status)
+
+    def sections_changed(self, changes):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.update(changes.added + changes.changed + changes.removed)
+
+    def connection_limit(self, connection_id):
+        """Processes that may use a connection at once, None when its session budget limits them."""
+        if connection_id in self.connection_limits:
+            return self.connection_limits[connection_id]
+        if self.budget.limit(connection_id) is not None:
+            return None
+        return DEFAULT_CONNECTION_LIMIT
+
+    def enqueue(self, process_id, priority=None):
+        """Queue a process unless it is already queued or running; returns whether it was queued."""
+        with self.lock:
+            if process_id not in self.processes:
+                self.load()
+            if process_id not in self.processes:
+                raise KeyError(f"Process '{process_id}' is not defined in {self.ini_file}")
+            status = self.status(process_id)
+            if status.state != 'idle':
+                return False
+            if priority is None:
+                priority = process_priority(self.processes[process_id])
+            heapq.heappush(self.queue, (-priority, next(self.sequence), process_id))
+            status.state = 'queued'
+        self.notify('queued', status)
+        self.wake.set()
+        return True
+
+    def reserve(self, connection_ids):
+        """Take a session of every connection if the process may start now; returns whether it did."""
+        for connection_id in connection_ids:
+            limit = self.connection_limit(connection_id)
+            if limit is not None and self.sessions.get(connection_id, 0) >= limit:
+                return False
+        return self.budget.try_acquire(connection_ids)
+
+    def dispatch(self):
+        """Start queued processes, by priority, as long as workers and connection slots are free."""
+        started = []
+        with self.lock:
+            if self.executor is None:
+                return started
+            blocked = []
+            while self.queue and len(self.running) < self.max_workers:
+                entry = heapq.heappop(self.queue)
+                process_id = entry[2]
+                process = self.processes.get(process_id)
+                if process is None:
+                    self.status(process_id).state = 'idle'  # Deleted while queued
+                    continue
+                connection_ids = process_connections(process)
+                if not self.reserve(connection_ids):
+                    blocked.append(entry)
+                    continue
+                for connection_id in connection_ids:
+                    self.sessions[connection_id] = self.sessions.get(connection_id, 0) + 1
+                self.running[process_id] = connection_ids
+                status = self.status(process_id)
+                status.state = 'running'
+                status.started_at = datetime.datetime.now()
+                started.append(status)
+                self.executor.submit(self.run_job, process_id)
+            for entry in blocked:
+                heapq.heappush(self.queue, entry)
+        for status in started:
+            self.notify('started', status)
+        return started
+
+    def run_job(self, process_id):
+        status = self.status(process_id)
+        with contextlib.ExitStack() as stack:
+            try:
+                stack.enter_context(process_run(process_id, self.ini_file, self.budget,
+                                                reserved=self.running.get(process_id, [])))
+            except ProcessRunning as e:
+                self.release(process_id, status)
+                status.error = f"Skipped: {e}"
+                self.notify('skipped', status)
+                self.wake.set()
+                return
+            self.run_locked(process_id, status)
+
+    def run_locked(self, process_id, status):
+        metrics = status.metrics = RunMetrics(process_id, on_progress=lambda _: self.notify('progress', status))
+        event = 'finished'
+        try:
+            with metrics.activate():
+                result = self.runner(process_id, self.ini_file)
+            status.result, status.error = result, ''
+        except Exception as e:
+            event = 'failed'
+            status.result, status.error = None, f"{e}\n{traceback.format_exc()}"
+        finally:
+            self.release(process_id, status)
+            self.record(metrics)
+            self.notify(event, status)
+            self.wake.set()
+
+    def release(self, process_id, status):
+        """Give back the sessions of a process that stopped running."""
+        with self.lock:
+            connection_ids = self.running.pop(process_id, [])
+            for connection_id in connection_ids:
+                self.sessions[connection_id] -= 1
+            status.state = 'idle'
+            status.finished_at = datetime.datetime.now()
+        self.budget.release(connection_ids)
+
+    def record(self, metrics):
+        """Keep the metrics of a finished run; a full disk must not fail the run itself."""
+        try:
+            if self.run_log:
+                append_run_log(metrics, self.run_log)
+            self.exporter.record(metrics)
+        except OSError:
+            traceback.print_exc()
+
+    def tick(self, now=None):
+        """Queue the processes whose next run is due and start what can be started."""
+        now = now or datetime.datetime.now()
+        self.load(now)
+        with self.lock:
+            due = [process_id for process_id, trigger in self.triggers.items()
+                   if self.status(process_id).next_run is not None and self.status(process_id).next_run <= now]
+            for process_id in due:
+                # A run missed while the previous one was still going is skipped, not queued twice
+                self.status(process_id).next_run = self.triggers[process_id].next_after(now)
+        for process_id in due:
+            self.enqueue(process_id)
+        self.dispatch()
+
+    def start(self):
+        """Start the scheduler thread and the worker pool."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.stopping.clear()
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                  thread_name_prefix='nocdc-process')
+            self.thread = threading.Thread(target=self.loop, name='nocdc-scheduler', daemon=True)
+            self.thread.start()
+
+    def loop(self):
+        while not self.stopping.is_set():
+            try:
+                self.tick()
+            except Exception:
+                traceback.print_exc()  # Keep scheduling the other processes
+            self.wake.wait(TICK_SECONDS)
+            self.wake.clear()
+
+    def stop(self, wait=True):
+        """Stop triggering processes and drop the queue; running processes finish unless wait is False."""
+        with self.lock:
+            thread, executor = self.thread, self.executor
+            self.thread = None
+            self.executor = None
+            for _, _, process_id in self.queue:
+                self.status(process_id).state = 'idle'
+            self.queue = []
+        self.stopping.set()
+        self.wake.set()
+        if thread is not None:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def is_running(self):
+        return self.thread is not None
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import sqlalchemy
+from sqlalchemy import MetaData, text
+from sqlalchemy.exc import NoSuchTableError, SQLAlchemyError
+
+from ConfigStore import atomic_write
+from EngineRegistry import engine_registry
+
+# Seconds a reflected schema is trusted before the database is asked again whether its DDL changed
+DRIFT_CHECK_INTERVAL = 300
+
+# Cheap catalog queries whose result changes whenever tables or columns are created, altered or dropped
+FINGERPRINT_QUERIES = {
+    'postgresql': (
+        "SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull "
+        "FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = COALESCE(:schema, current_schema()) AND c.relkind IN ('r', 'p', 'v', 'm', 'f') "
+        "AND a.attnum > 0 AND NOT a.attisdropped ORDER BY c.relname, a.attnum"
+    ),
+    'mysql': (
+        "SELECT table_name, column_name, column_type, is_nullable, column_key FROM information_schema.columns "
+        "WHERE table_schema = COALESCE(:schema, DATABASE()) ORDER BY table_name, ordinal_position"
+    ),
+    'mssql': (
+        "SELECT COUNT(*), MAX(modify_date) FROM sys.objects "
+        "WHERE type IN ('U', 'V') AND schema_id = SCHEMA_ID(COALESCE(:schema, SCHEMA_NAME()))"
+    ),
+    'oracle': (
+        "SELECT COUNT(*), MAX(last_ddl_time) FROM all_objects "
+        "WHERE owner = COALESCE(UPPER(:schema), SYS_CONTEXT('USERENV', 'CURRENT_SCHEMA')) "
+        "AND object_type IN ('TABLE', 'VIEW')"
+    ),
+    # last_altered also moves on DML in Snowflake, so the column list is compared instead
+    'snowflake': (
+        "SELECT table_name, column_name, data_type, is_nullable FROM information_schema.columns "
+        "WHERE table_schema = COALESCE(UPPER(:schema), CURRENT_SCHEMA()) ORDER BY table_name, ordinal_position"
+    ),
+}
+
+# Row counts kept by the optimizer statistics, as (table name, estimate) rows
+ROW_ESTIMATE_QUERIES = {
+    'postgresql': (
+        "SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = COALESCE(:schema, current_schema()) AND c.relkind IN ('r', 'p')"
+    ),
+    'mysql': (
+        "SELECT table_name, table_rows FROM information_schema.tables "
+        "WHERE table_schema = COALESCE(:schema, DATABASE()) AND table_type = 'BASE TABLE'"
+    ),
+    'mssql': (
+        "SELECT o.name, SUM(p.rows) FROM sys.partitions p JOIN sys.objects o ON o.object_id = p.object_id "
+        "WHERE p.index_id IN (0, 1) AND o.type = 'U' "
+        "AND o.schema_id = SCHEMA_ID(COALESCE(:schema, SCHEMA_NAME())) GROUP BY o.name"
+    ),
+    'oracle': (
+        "SELECT table_name, num_rows FROM all_tables "
+        "WHERE owner = COALESCE(UPPER(:schema), SYS_CONTEXT('USERENV', 'CURRENT_SCHEMA'))"
+    ),
+    'snowflake': (
+        "SELECT table_name, row_count FROM information_schema.tables "
+        "WHERE table_schema = COALESCE(UPPER(:schema), CURRENT_SCHEMA()) AND table_type = 'BASE TABLE'"
+    ),
+}
+
+
+class SchemaEntry:
+    """Reflected metadata of one schema of a connection, with what is needed to tell whether it is stale."""
+
+    def __init__(self, metadata, section_fingerprint, schema_fingerprint, row_estimates):
+        self.metadata = metadata
+        self.section_fingerprint = section_fingerprint
+        self.schema_fingerprint = schema_fingerprint
+        self.row_estimates = row_estimates
+        self.reflected_at = time.time()
+        self.checked_at = time.monotonic()
+        self.sqlalchemy_version = sqlalchemy.__version__
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['checked_at']  # Monotonic clocks mean nothing in another process
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.checked_at = None
+
+
+class SchemaCache:
+    """
+    Reflect the tables of a connection once and keep them in memory and on disk as pickled MetaData,
+    keyed by connection ID and schema. An entry is dropped when the ini section of its connection
+    changes, and re-reflected when a cheap catalog query shows that the DDL of the schema drifted;
+    that query runs at most once every `drift_check_interval` seconds per schema.
+    """
+
+    def __init__(self, directory="data/schema_cache", registry=engine_registry,
+                 drift_check_interval=DRIFT_CHECK_INTERVAL):
+        self.directory = directory
+        self.registry = registry
+        self.drift_check_interval = drift_check_interval
+        # (connection_id, schema) -> SchemaEntry
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def path(self, connection_id, schema=None):
+        name = connection_id if schema is None else f"{connection_id}@{schema}"
+        return os.path.join(self.directory, f"{name}.pickle")
+
+    def schema_fingerprint(self, engine, schema=None):
+        """Digest of the schema's catalog, or None when the dialect has no cheap way to tell."""
+        query = FINGERPRINT_QUERIES.get(engine.dialect.name)
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'sqlite':
+                    prefix = '' if schema is None else f'"{schema}".'
+                    rows = connection.exec_driver_sql(f"SELECT name, sql FROM {prefix}sqlite_master ORDER BY name").all()
+                elif query is not None:
+                    rows = connection.execute(text(query), {'schema': schema}).all()
+                else:
+                    return None
+        except SQLAlchemyError:
+            # Without access to the catalog the cache is kept until the section changes or it is invalidated
+            return None
+        return hashlib.sha1(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()
+
+    def row_estimates(self, engine, schema=None):
+        """Estimated row count of every table from the optimizer statistics, where the dialect keeps them."""
+        query = ROW_ESTIMATE_QUERIES.get(engine.dialect.name)
+        if query is None:
+            return {}
+        try:
+            with engine.connect() as connection:
+                rows = connection.execute(text(query), {'schema': schema}).all()
+        except SQLAlchemyError:
+            return {}
+
+        normalize = engine.dialect.normalize_name if engine.dialect.requires_name_normalize else str
+        # Tables that were never analysed report NULL, or -1 on PostgreSQL
+        return {normalize(name): int(estimate) for name, estimate in rows if estimate is not None and estimate >= 0}
+
+    def load(self, connection_id, schema=None):
+        """The entry persisted by an earlier process, or None if there is none or it cannot be read."""
+        try:
+            with open(self.path(connection_id, schema), 'rb') as cache_file:
+                entry = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A cache written by another version of the code or SQLAlchemy is simply rebuilt
+            return None
+        if not isinstance(entry, SchemaEntry) or entry.sqlalchemy_version != sqlalchemy.__version__:
+            return None
+        return entry
+
+    def save(self, connection_id, schema, entry):
+        atomic_write(self.path(connection_id, schema), pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def reflect(self, connection_id, schema=None):
+        """Reflect every table and view of a schema now, replacing whatever was cached."""
+        engine = self.registry.get_engine(connection_id)
+        with self.lock:
+            section_fingerprint = self.registry.section_fingerprint(connection_id)
+            # Fingerprint first: DDL running during the reflection then shows up as drift on the next check
+            schema_fingerprint = self.schema_fingerprint(engine, schema)
+            metadata = MetaData()
+            metadata.reflect(bind=engine, schema=schema, views=True)
+            entry = SchemaEntry(metadata, section_fingerprint, schema_fingerprint,
+                                self.row_estimates(engine, schema))
+            self.entries[(connection_id, schema)] = entry
+            self.save(connection_id, schema, entry)
+            return entry
+
+    def get(self, connection_id, schema=None, check_drift=True):
+        """The cached entry of a schema, loading it from disk or reflecting it when missing or stale."""
+        with self.lock:
+            entry = self.entries.get((connection_id, schema))
+            if entry is None:
+                entry = self.load(connection_id, schema)
+            if entry is None or entry.section_fingerprint != self.registry.section_fingerprint(connection_id):
+                return self.reflect(connection_id, schema)
+
+            due = entry.checked_at is None or time.monotonic() - entry.checked_at >= self.drift_check_interval
+            if check_drift and due and entry.schema_fingerprint is not None:
+                engine = self.registry.get_engine(connection_id)
+                if self.schema_fingerprint(engine, schema) != entry.schema_fingerprint:
+                    return self.reflect(connection_id, schema)
+            entry.checked_at = time.monotonic()
+            self.entries[(connection_id, schema)] = entry
+            return entry
+
+    def get_metadata(self, connection_id, schema=None):
+        return self.get(connection_id, schema).metadata
+
+    def get_table(self, connection_id, table_name, schema=None):
+        """
+        The reflected Table of a connection. A table missing from the cache triggers one new
+        reflection before NoSuchTableError is raised, in case it was created since the last check.
+        """
+        key = table_name if schema is None else f"{schema}.{table_name}"
+        entry = self.get(connection_id, schema)
+        if key not in entry.metadata.tables:
+            entry = self.reflect(connection_id, schema)
+        if key not in entry.metadata.tables:
+            raise NoSuchTableError(key)
+        return entry.metadata.tables[key]
+
+    def table_names(self, connection_id, schema=None):
+        """Names of the tables and views of a schema, e.g. for a table picker."""
+        return sorted(table.name for table in self.get_metadata(connection_id, schema).tables.values()
+                      if table.schema == schema)
+
+    def row_estimate(self, connection_id, table_name, schema=None):
+        """Row count estimated by the database statistics when the schema was reflected, or None."""
+        return self.get(connection_id, schema).row_estimates.get(table_name)
+
+    def invalidate(self, connection_id=None):
+        """Forget the cached schemas of a connection, or of every connection, in memory and on disk."""
+        with self.lock:
+            for key in [key for key in self.entries if connection_id is None or key[0] == connection_id]:
+                del self.entries[key]
+            if not os.path.isdir(self.directory):
+                return
+            for file_name in os.listdir(self.directory):
+                stem = file_name[:-len('.pickle')] if file_name.endswith('.pickle') else None
+                if stem is not None and (connection_id is None or stem.split('@')[0] == connection_id):
+                    os.remove(os.path.join(self.directory, file_name))
+
+
+# Shared cache for the whole process
+schema_cache = SchemaCache()
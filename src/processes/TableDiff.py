@@ -0,0 +1,245 @@
+import bisect
+import datetime
+import decimal
+
+from sqlalchemy import func, select
+
+from EngineRegistry import engine_registry
+from KeyRanges import KeyRange, key_bounds, split_range
+from RowHasher import MASK_64, PUSHDOWN_DIALECTS, checksum, hash_rows, sql_row_hash
+from RowReader import DEFAULT_BATCH_SIZE, iter_batches
+from RunMetrics import count, stage
+from SchemaCache import schema_cache
+
+# Without pushdown, ranges of up to this many rows are compared row by row after a single read
+DEFAULT_MEMORY_ROWS = 100000
+
+
+class DiffResult:
+    """Keys of the rows that differ between the source and the target table."""
+
+    def __init__(self):
+        self.inserted = []  # keys only present in the source
+        self.updated = []   # keys present on both sides with different values
+        self.deleted = []   # keys only present in the target
+
+    def is_empty(self):
+        return not (self.inserted or self.updated or self.deleted)
+
+    def __repr__(self):
+        return (f"DiffResult(inserted={len(self.inserted)}, "
+                f"updated={len(self.updated)}, deleted={len(self.deleted)})")
+
+
+class TableDiff:
+    """
+    Find inserted, updated and deleted rows between a source and a target table without CDC.
+    Both sides are summarised as per-bucket checksums over key ranges; only buckets whose
+    checksums differ are split further, and per-row hashes are compared in the leaf buckets.
+    When both tables live on the same dialect and it has a usable hash function, bucket checksums
+    are computed by the databases themselves and only the leaves are read back.
+
+    Otherwise the rows have to be hashed in Python, and every level of the drill-down reads the
+    differing ranges again: checksums of two dialects cannot be made to agree in SQL, as each renders
+    numbers and timestamps differently and has its own hash functions. To keep the number of reads low,
+    ranges of up to `memory_rows` rows are compared row by row right away (holding their hashes, and
+    their rows when a ChangeSet is filled, in memory), and a larger range with a numeric or date leading
+    key is read once to get the checksums of all its buckets. A table of N rows is then read at most
+    about log(N / memory_rows) / log(bucket_count) + 1 times, and only the changed parts of it beyond
+    the first read. String keys are bucketed by the database's collation, so each of their buckets
+    is read separately.
+    """
+
+    def __init__(self, source_id, target_id, table_name, schema=None, target_table_name=None,
+                 target_schema=None, key_columns=None, columns=None, bucket_count=16, leaf_size=1000,
+                 batch_size=None, pushdown=True, memory_rows=DEFAULT_MEMORY_ROWS):
+        with stage('connect'):
+            self.source_engine = engine_registry.get_engine(source_id)
+            self.target_engine = engine_registry.get_engine(target_id)
+            self.source_table = schema_cache.get_table(source_id, table_name, schema)
+            self.target_table = schema_cache.get_table(target_id, target_table_name or table_name,
+                                                       target_schema or schema)
+        self.bucket_count = bucket_count
+        self.leaf_size = leaf_size
+        self.batch_size = batch_size
+        self.memory_rows = memory_rows
+
+        # Primary key of the source table unless the caller names the key columns
+        self.key_columns = key_columns or [column.name for column in self.source_table.primary_key.columns]
+        if not self.key_columns:
+            raise ValueError(f"Table '{table_name}' has no primary key, please pass key_columns")
+
+        # Compare the non-key columns present on both sides, in source order
+        if columns is None:
+            columns = [column.name for column in self.source_table.columns
+                       if column.name not in self.key_columns and column.name in self.target_table.columns]
+        self.columns = columns
+
+        # SQL checksums of the two sides are only comparable when they are computed the same way
+        dialect = self.source_engine.dialect.name
+        self.pushdown = (pushdown and dialect == self.target_engine.dialect.name and dialect in PUSHDOWN_DIALECTS
+                         and sql_row_hash(dialect, self.selected_columns(self.source_table)) is not None)
+
+    def selected_columns(self, table):
+        return [table.columns[name] for name in self.key_columns + self.columns]
+
+    def range_column(self, table):
+        """Buckets are built on the leading key column."""
+        return table.columns[self.key_columns[0]]
+
+    def key_bounds(self):
+        """Smallest and largest leading key over both tables."""
+        bounds = [key_bounds(self.source_engine, self.range_column(self.source_table)),
+                  key_bounds(self.target_engine, self.range_column(self.target_table))]
+        bounds = [bound for bound in bounds if bound is not None]
+        if not bounds:
+            return None
+        return min(lower for lower, _ in bounds), max(upper for _, upper in bounds)
+
+    def split(self, key_range, parts):
+        """Split a key range into buckets, using the source keys for quantiles."""
+        return split_range(self.source_engine, self.range_column(self.source_table), key_range, parts)
+
+    def fetch_hashes(self, engine, table, key_range, keep_rows=False):
+        """Per-row hashes of a bucket keyed by the primary key tuple, plus the rows themselves if asked for."""
+        key_count = len(self.key_columns)
+        query = select(*self.selected_columns(table)).where(key_range.clause(self.range_column(table)))
+        hashes = {}
+        rows = {} if keep_rows else None
+        for batch in iter_batches(engine, query, self.batch_size):
+            with stage('hash'):
+                keys = [tuple(row[:key_count]) for row in batch]
+                hashes.update(zip(keys, [int(value) for value in hash_rows(batch)]))
+            if keep_rows:
+                rows.update(zip(keys, map(tuple, batch)))
+        return hashes, rows
+
+    def checksum(self, engine, table, key_range):
+        """Row count and order-independent checksum of a bucket."""
+        clause = key_range.clause(self.range_column(table))
+        if self.pushdown:
+            expression = sql_row_hash(engine.dialect.name, self.selected_columns(table))
+            query = select(func.count(), func.sum(expression)).select_from(table).where(clause)
+            # The database reads and hashes the bucket, so the whole query is hashing time
+            with stage('hash'), engine.connect() as connection:
+                row_count, total = connection.execute(query).one()
+            return row_count, int(total or 0) & MASK_64
+
+        query = select(*self.selected_columns(table)).where(clause)
+        row_count = 0
+        total = 0
+        for batch in iter_batches(engine, query, self.batch_size):
+            with stage('hash'):
+                batch_count, batch_total = checksum(batch)
+            row_count += batch_count
+            total = (total + batch_total) & MASK_64
+        return row_count, total
+
+    def bucket_checksums(self, engine, table, key_range, buckets):
+        """
+        Row counts and checksums of all the buckets of a range, reading the range once. Rows are put
+        in their bucket by comparing leading keys in Python, which orders numbers and dates like SQL.
+        """
+        edges = [bucket.lower for bucket in buckets[1:]]
+        counts = [0] * len(buckets)
+        totals = [0] * len(buckets)
+        query = select(*self.selected_columns(table)).where(key_range.clause(self.range_column(table)))
+        for batch in iter_batches(engine, query, self.batch_size):
+            with stage('hash'):
+                for row, value in zip(batch, hash_rows(batch)):
+                    position = bisect.bisect_right(edges, row[0])
+                    counts[position] += 1
+                    totals[position] += int(value)
+        return [(row_count, total & MASK_64) for row_count, total in zip(counts, totals)]
+
+    def compare_leaf(self, key_range, result, change_set=None):
+        """Compare the per-row hashes of a bucket on both sides, collecting the changed rows if asked for."""
+        keep_rows = change_set is not None
+        source_hashes, source_rows = self.fetch_hashes(self.source_engine, self.source_table, key_range, keep_rows)
+        target_hashes, target_rows = self.fetch_hashes(self.target_engine, self.target_table, key_range, keep_rows)
+
+        inserted = []
+        updated = []
+        for key, value in source_hashes.items():
+            target_value = target_hashes.pop(key, None)
+            if target_value is None:
+                inserted.append(key)
+            elif target_value != value:
+                updated.append(key)
+        deleted = list(target_hashes)
+
+        result.inserted.extend(inserted)
+        result.updated.extend(updated)
+        result.deleted.extend(deleted)
+        if keep_rows:
+            # Rows of the leaf are already in memory, no extra round trip is needed
+            names = self.key_columns + self.columns
+            change_set.add('inserts', [source_rows[key] for key in inserted])
+            change_set.add('updates', [
+                source_rows[key] + ([name for name, new, old in zip(names, source_rows[key], target_rows[key])
+                                     if new != old],)
+                for key in updated
+            ])
+            change_set.add('deletes', deleted)
+
+    def compare(self, key_range, result, change_set=None, checksums=None):
+        """
+        Recursively drill down into buckets whose checksums differ. `checksums` are the source and
+        target checksums of the range when they are already known.
+        """
+        if checksums is None:
+            checksums = (self.checksum(self.source_engine, self.source_table, key_range),
+                         self.checksum(self.target_engine, self.target_table, key_range))
+        source_checksum, target_checksum = checksums
+        if source_checksum == target_checksum:
+            return
+
+        leaf_size = self.leaf_size if self.pushdown else max(self.leaf_size, self.memory_rows)
+        if max(source_checksum[0], target_checksum[0]) <= leaf_size:
+            self.compare_leaf(key_range, result, change_set)
+            return
+
+        buckets = self.split(key_range, self.bucket_count)
+        if len(buckets) == 1:
+            # The range cannot be narrowed any further (e.g. a single leading key value)
+            self.compare_leaf(key_range, result, change_set)
+            return
+        self.compare_buckets(key_range, buckets, result, change_set)
+
+    def compare_buckets(self, key_range, buckets, result, change_set=None):
+        """Compare the buckets a range is split in, with one read of the range when hashing in Python."""
+        lower = key_range.lower
+        if self.pushdown or isinstance(lower, bool) or \
+                not isinstance(lower, (int, float, decimal.Decimal, datetime.date)):
+            for bucket in buckets:
+                self.compare(bucket, result, change_set)
+            return
+        source_checksums = self.bucket_checksums(self.source_engine, self.source_table, key_range, buckets)
+        target_checksums = self.bucket_checksums(self.target_engine, self.target_table, key_range, buckets)
+        for bucket, checksums in zip(buckets, zip(source_checksums, target_checksums)):
+            self.compare(bucket, result, change_set, checksums)
+
+    def new_change_set(self, directory=None):
+        """An empty ChangeSet for the rows of this diff, spilled to `directory` if given."""
+        from ChangeSet import ChangeSet  # pyarrow is only needed when change-sets are used
+        return ChangeSet(self.source_table, self.key_columns, self.key_columns + self.columns,
+                         directory=directory, batch_size=self.batch_size or DEFAULT_BATCH_SIZE,
+                         metadata={'source_table': self.source_table.name, 'target_table': self.target_table.name})
+
+    def run(self, change_set=None):
+        """
+        Diff the whole table and return a DiffResult. When a ChangeSet is passed, the source rows
+        of inserts and updates and the keys of deletes are added to it as the leaves are compared.
+        """
+        result = DiffResult()
+        with stage('diff'):
+            bounds = self.key_bounds()
+            if bounds is None:
+                return result
+
+            key_range = KeyRange(bounds[0], bounds[1], True)
+            self.compare_buckets(key_range, self.split(key_range, self.bucket_count), result, change_set)
+        count('diff_inserted', len(result.inserted))
+        count('diff_updated', len(result.updated))
+        count('diff_deleted', len(result.deleted))
+        return result
@@ -0,0 +1,168 @@
+import uuid
+
+from sqlalchemy import Boolean, Column, MetaData, Table, and_, exists, func, or_, select, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from BulkLoader import bulk_insert
+from RunMetrics import count, estimated_bytes
+from RunMetrics import stage as run_stage  # `stage` names the staging table in this module
+
+
+def keyset_after(columns, values):
+    """Condition selecting the rows that sort after `values` on `columns`, e.g. (a > x) or (a = x and b > y)."""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+
+def create_stage(connection, table, columns, key_columns=()):
+    """
+    Create a session-private temporary table with the given columns of `table`, keyed on `key_columns`
+    so that matching it against the target is an index lookup rather than a scan per row. Oracle
+    private temporary tables cannot have indexes, so theirs has no primary key.
+    """
+    dialect = connection.dialect.name
+    name = f"stage_{uuid.uuid4().hex[:12]}"
+    prefixes = ['TEMPORARY']
+    options = {}
+    keyed = True
+    if dialect == 'mssql':
+        name = '#' + name
+        prefixes = []
+    elif dialect == 'oracle':
+        name = 'ora$ptt_' + name
+        prefixes = ['PRIVATE TEMPORARY']
+        options['oracle_on_commit'] = 'DROP DEFINITION'
+        keyed = False
+
+    stage = Table(name, MetaData(),
+                  *[Column(column, table.columns[column].type, primary_key=keyed and column in key_columns)
+                    for column in columns],
+                  prefixes=prefixes, **options)
+    stage.create(connection)
+    return stage
+
+
+def drop_stage(connection, stage):
+    # Oracle private temporary tables are dropped at commit
+    if connection.dialect.name != 'oracle':
+        stage.drop(connection)
+
+
+def merge_statement(connection, table, stage, key_columns, columns):
+    """Set-based upsert of the staged rows into `table`, in the dialect's native form."""
+    dialect = connection.dialect.name
+    update_columns = [column for column in columns if column not in key_columns]
+    staged = select(*[stage.columns[column] for column in columns])
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        if dialect == 'sqlite':
+            # SQLite needs a WHERE clause to tell ON CONFLICT apart from a join constraint
+            staged = staged.where(text('1'))
+        statement = insert(table).from_select(columns, staged)
+        if not update_columns:
+            return statement.on_conflict_do_nothing(index_elements=key_columns)
+        return statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: statement.excluded[column] for column in update_columns}
+        )
+
+    if dialect == 'mysql':
+        statement = mysql.insert(table).from_select(columns, staged)
+        if not update_columns:
+            return statement.prefix_with('IGNORE')
+        # INSERT ... SELECT refers to the selected columns; VALUES() is deprecated since MySQL 8.0.20
+        return statement.on_duplicate_key_update({column: stage.columns[column] for column in update_columns})
+
+    if dialect in ('mssql', 'oracle', 'snowflake'):
+        preparer = connection.dialect.identifier_preparer
+        quote = preparer.quote
+        sql = (f"MERGE INTO {preparer.format_table(table)} t USING {preparer.format_table(stage)} s ON ("
+               + ' AND '.join(f"t.{quote(column)} = s.{quote(column)}" for column in key_columns) + ")")
+        if update_columns:
+            sql += (" WHEN MATCHED THEN UPDATE SET "
+                    + ', '.join(f"{quote(column)} = s.{quote(column)}" for column in update_columns))
+        sql += (f" WHEN NOT MATCHED THEN INSERT ({', '.join(quote(column) for column in columns)})"
+                f" VALUES ({', '.join('s.' + quote(column) for column in columns)})")
+        if dialect == 'mssql':
+            sql += ';'
+        return text(sql)
+
+    return None
+
+
+def staged_keys_exist(table, stage, key_columns):
+    """
+    Condition matching the rows of `table` whose key is in the stage: an IN subquery for single-column
+    keys, which lets the database drive the match from the small stage, a correlated EXISTS otherwise.
+    """
+    if len(key_columns) == 1:
+        column = key_columns[0]
+        return table.columns[column].in_(select(stage.columns[column]))
+    return exists().where(and_(*[stage.columns[column] == table.columns[column] for column in key_columns]))
+
+
+def tombstone_value(column):
+    """Value marking a row as deleted in a tombstone column: true for flags, the current time otherwise."""
+    return True if isinstance(column.type, Boolean) else func.current_timestamp()
+
+
+def delete_keys(connection, table, key_columns, keys, chunk_size=None, tombstone_column=None):
+    """
+    Delete the rows with the given key tuples through a staged key table and one set-based DELETE,
+    or with a `tombstone_column`, mark them as deleted with one set-based UPDATE instead.
+    """
+    if not keys:
+        return
+    with run_stage('stage'):
+        stage = create_stage(connection, table, key_columns, key_columns)
+    try:
+        with run_stage('stage'):
+            bulk_insert(connection, stage, key_columns, keys, chunk_size)
+        with run_stage('apply'):
+            matched = staged_keys_exist(table, stage, key_columns)
+            if tombstone_column is None:
+                connection.execute(table.delete().where(matched))
+            else:
+                column = table.columns[tombstone_column]
+                connection.execute(table.update().where(matched).values({column: tombstone_value(column)}))
+        count('rows_deleted', len(keys))
+    finally:
+        drop_stage(connection, stage)
+
+
+def upsert_rows(connection, table, key_columns, rows, columns=None, chunk_size=None):
+    """
+    Insert or replace `rows` by key. Rows are bulk loaded into a temporary table and merged with a single
+    MERGE / INSERT ... ON CONFLICT statement; dialects without one get a set-based delete-then-insert.
+    Rows are mappings of column name to value, or sequences in `columns` order.
+
+    The SQLite form runs in the tests, the PostgreSQL one in bench_sync given a --pg-url. The MySQL,
+    SQL Server, Oracle and Snowflake forms are only checked as compiled SQL, not against live servers.
+    """
+    if not rows:
+        return
+    if columns is None:
+        columns = list(rows[0].keys())
+    if hasattr(rows[0], 'keys'):
+        rows = [tuple(row[column] for column in columns) for row in rows]
+
+    with run_stage('stage'):
+        stage = create_stage(connection, table, columns, key_columns)
+    try:
+        with run_stage('stage'):
+            bulk_insert(connection, stage, columns, rows, chunk_size)
+        with run_stage('apply'):
+            statement = merge_statement(connection, table, stage, key_columns, columns)
+            if statement is not None:
+                connection.execute(statement)
+            else:
+                connection.execute(table.delete().where(staged_keys_exist(table, stage, key_columns)))
+                connection.execute(table.insert().from_select(columns, select(*[stage.columns[c] for c in columns])))
+        count('rows_upserted', len(rows))
+        count('bytes_written', estimated_bytes(rows))
+    finally:
+        drop_stage(connection, stage)
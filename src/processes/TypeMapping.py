@@ -0,0 +1,273 @@
+import datetime
+import decimal
+
+from sqlalchemy import (
+    ARRAY, JSON, BigInteger, Boolean, Column, Date, DateTime, Enum, Float, Index, Integer, LargeBinary, MetaData,
+    TIMESTAMP, Numeric, PrimaryKeyConstraint, String, Table, Text, Time, Unicode, UnicodeText, UniqueConstraint
+)
+from sqlalchemy.dialects import mssql, mysql
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import NoSuchModuleError
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
+
+from ConnectionSettings import load_definitions, normalize_type
+from DriverRegistry import driver_registry
+
+# Longest VARCHAR of a dialect, in characters; longer strings become its large text type
+MAX_STRING_LENGTH = {'oracle': 4000, 'mysql': 16383, 'mssql': 4000}
+# Strings of unknown length on dialects where VARCHAR needs a length, and where they are part of an index
+DEFAULT_STRING_LENGTH = {'oracle': 4000, 'mysql': 255, 'mssql': 450}
+# Longest string an index key holds, in characters: 900 bytes of NVARCHAR in a clustered SQL Server index,
+# 3072 bytes of utf8mb4 on MySQL, and Oracle cannot index a CLOB at all
+MAX_INDEXED_STRING_LENGTH = {'oracle': 4000, 'mysql': 768, 'mssql': 450}
+# Decimals of unknown precision default to a scale of 0 on these dialects, so they get one explicitly
+DEFAULT_NUMERIC = {'mysql': (65, 30), 'mssql': (38, 10), 'snowflake': (38, 10)}
+MAX_NUMERIC_PRECISION = {'oracle': 38, 'mssql': 38, 'snowflake': 38, 'mysql': 65}
+# Dialects whose primary key orders the table on disk, so it is created with the table; elsewhere it is
+# added after the load like any other index
+CLUSTERED_DIALECTS = ('mysql', 'mssql', 'sqlite', 'snowflake')
+# Dialects without secondary indexes
+INDEXLESS_DIALECTS = ('snowflake',)
+# Server versions DDL is compiled for without a connection: the oldest release still supported, so the
+# statements run on it and on every newer one
+OFFLINE_SERVER_VERSIONS = {'mssql': (15,), 'oracle': (19,), 'mysql': (8, 0), 'postgresql': (13,)}
+
+
+def configure_offline(dialect):
+    """
+    Set on a dialect what it would learn from the server on connect, for OFFLINE_SERVER_VERSIONS.
+    Left unset, SQL Server compiles DATE as DATETIME and binaries as IMAGE, and Oracle compiles
+    BOOLEAN, which only exists from Oracle 23 on.
+    """
+    version = OFFLINE_SERVER_VERSIONS.get(dialect.name)
+    if version is None:
+        return dialect
+    dialect.server_version_info = version
+    if dialect.name == 'mssql':
+        dialect.deprecate_large_types = True
+        dialect.supports_multivalues_insert = True
+        dialect._supports_nvarchar_max = True
+    elif dialect.name == 'oracle':
+        dialect.supports_native_boolean = version >= (23,)
+        dialect._supports_oracle_json = version >= (21,)
+        dialect.supports_identity_columns = True
+    return dialect
+
+
+def dialect_for_type(db_type):
+    """
+    SQLAlchemy dialect of a connection type of definitions.json, without connecting or importing its
+    driver, set up for a supported server version (see configure_offline).
+    """
+    definitions = load_definitions()
+    db_type = normalize_type(db_type)
+    if db_type not in definitions:
+        raise ValueError(f"Unknown connection type '{db_type}'")
+    # The dialect name is the scheme of the connection string, e.g. mssql in mssql+pyodbc://
+    name = definitions[db_type]['connection_string'].split('://')[0].split('+')[0]
+    try:
+        dialect_class = make_url(f"{name}://").get_dialect()
+    except NoSuchModuleError:
+        # Third party dialects (Snowflake) are part of the driver packages
+        driver_registry.load(db_type)
+        dialect_class = make_url(f"{name}://").get_dialect()
+    return configure_offline(dialect_class())
+
+
+def generic_type(column_type):
+    """The backend-neutral SQLAlchemy type of a reflected type, guessed from its Python type when it has none."""
+    try:
+        return column_type.as_generic()
+    except NotImplementedError:
+        pass
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return Text()
+    if python_type is bool:
+        return Boolean()
+    if python_type is int:
+        return BigInteger()
+    if python_type is float:
+        return Float()
+    if python_type is decimal.Decimal:
+        return Numeric()
+    if python_type is datetime.datetime:
+        return DateTime()
+    if python_type is datetime.date:
+        return Date()
+    if python_type is datetime.time:
+        return Time()
+    if python_type is bytes:
+        return LargeBinary()
+    return Text()
+
+
+def exceeds_index(column_type, dialect):
+    """True when values of a string column can be longer than an index key of `dialect` holds."""
+    limit = MAX_INDEXED_STRING_LENGTH.get(dialect.name)
+    if limit is None or not isinstance(column_type, String):
+        return False
+    return column_type.length is None or column_type.length > limit
+
+
+def map_type(column_type, dialect, source_dialect=None, indexed=False):
+    """
+    Type of a column in a table of `dialect` holding the values of a column of `column_type`.
+    Between two databases of the same kind the type is kept as it is. Otherwise it goes through its
+    generic SQLAlchemy type, adjusted where the generic type would not compile or would lose data on
+    the target: strings without a length, decimals without a precision, native enums and arrays.
+    Strings are NVARCHAR on SQL Server, whose VARCHAR only holds the characters of the database's
+    code page. `indexed` strings of unknown length get one the dialect can index; longer ones keep
+    their length, TableDefinition leaves out or shortens the indexes they do not fit in.
+    """
+    name = dialect.name
+    if isinstance(column_type, Enum):
+        # Native enums need a CREATE TYPE of their own on PostgreSQL, even between two of them
+        return Enum(*column_type.enums, native_enum=False, create_constraint=False, length=column_type.length)
+    if source_dialect is not None and source_dialect.name == name:
+        return column_type.copy()
+    mapped = generic_type(column_type)
+
+    if isinstance(mapped, DateTime):
+        # The plain DATETIME / DATE of these dialects drops fractional seconds
+        if name == 'mysql':
+            return mysql.DATETIME(timezone=mapped.timezone, fsp=6)
+        if name == 'mssql' and not mapped.timezone:
+            return mssql.DATETIME2(precision=6)
+        if name == 'oracle':
+            return TIMESTAMP(timezone=mapped.timezone)
+    if isinstance(mapped, Time):
+        if name == 'mysql':
+            return mysql.TIME(timezone=mapped.timezone, fsp=6)
+        if name == 'mssql':
+            return mssql.TIME(precision=6)
+    if isinstance(mapped, ARRAY) and name != 'postgresql':
+        return JSON()
+    if isinstance(mapped, String):
+        if name == 'mssql' and not isinstance(mapped, (Unicode, UnicodeText)):
+            mapped = UnicodeText() if isinstance(mapped, Text) else Unicode(mapped.length)
+        if isinstance(mapped, Text):
+            if name != 'mssql' and not (indexed and name in DEFAULT_STRING_LENGTH):
+                return mapped
+            # Large text types cannot be indexed, and NTEXT is deprecated on SQL Server for NVARCHAR(max)
+            mapped = Unicode() if isinstance(mapped, UnicodeText) else String()
+        length = mapped.length
+        if length is None and (indexed or name in ('oracle', 'mysql')):
+            length = DEFAULT_STRING_LENGTH.get(name)
+        elif length is not None and length > MAX_STRING_LENGTH.get(name, length):
+            if name != 'mssql':
+                return UnicodeText() if isinstance(mapped, Unicode) else Text()
+            length = None
+        return type(mapped)(length)
+    if isinstance(mapped, Numeric) and not isinstance(mapped, Float):
+        precision, scale = mapped.precision, mapped.scale
+        if precision is not None and not scale and precision <= 18:
+            # Whole numbers stored as NUMBER(10), say, on Oracle
+            return Integer() if precision <= 9 else BigInteger()
+        if precision is None:
+            precision, scale = DEFAULT_NUMERIC.get(name, (None, None))
+        elif precision > MAX_NUMERIC_PRECISION.get(name, precision):
+            precision = MAX_NUMERIC_PRECISION[name]
+            scale = min(scale or 0, precision)
+        return Numeric(precision, scale)
+    return mapped
+
+
+class TableDefinition:
+    """
+    The DDL of a copy of `source_table` for `dialect`, split in what runs before the load (CREATE TABLE)
+    and what runs after it (primary key where it is not clustered, indexes and unique constraints).
+    Foreign keys, checks, defaults and identities are not copied: a replica takes its values from the
+    source, and loads partitions in any order.
+
+    Strings longer than the target's index keys keep their length. An index on one is left out and
+    listed in `skipped_indexes`, except on MySQL where a non-unique index covers a prefix of it
+    instead; a primary key on one cannot be copied and raises a ValueError.
+    """
+
+    def __init__(self, source_table, dialect, table_name=None, schema=None, source_dialect=None):
+        self.source_table = source_table
+        self.dialect = dialect
+        self.table_name = table_name or source_table.name
+        self.schema = schema
+        self.primary_key = [column.name for column in source_table.primary_key.columns]
+        self.deferred_primary_key = bool(self.primary_key) and dialect.name not in CLUSTERED_DIALECTS
+
+        self.indexes = []  # (name, columns, unique)
+        for index in sorted(source_table.indexes, key=lambda index: index.name or ''):
+            columns = [column.name for column in index.columns]
+            # Expression indexes are dialect specific
+            if columns and len(columns) == len(index.expressions):
+                self.indexes.append((self.index_name(index.name, columns), columns, index.unique))
+        for constraint in source_table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.columns:
+                columns = [column.name for column in constraint.columns]
+                if all(columns != existing for _, existing, _ in self.indexes):
+                    self.indexes.append((self.index_name(constraint.name, columns), columns, True))
+        indexed = set(self.primary_key).union(*[columns for _, columns, _ in self.indexes])
+
+        self.table = Table(
+            self.table_name, MetaData(),
+            *[Column(column.name, map_type(column.type, dialect, source_dialect, column.name in indexed),
+                     nullable=column.nullable, autoincrement=False)
+              for column in source_table.columns],
+            schema=schema
+        )
+        copied_types = source_dialect is not None and source_dialect.name == dialect.name
+        too_long = set() if copied_types else {
+            column.name for column in self.table.columns if exceeds_index(column.type, dialect)
+        }
+        for name in self.primary_key:
+            if name in too_long:
+                raise ValueError(f"Primary key column '{name}' of '{source_table.name}' holds strings longer than "
+                                 f"{dialect.name} can index ({MAX_INDEXED_STRING_LENGTH[dialect.name]} characters)")
+
+        self.add_primary_key = None
+        if self.primary_key:
+            constraint = PrimaryKeyConstraint(*[self.table.columns[name] for name in self.primary_key],
+                                               name=self.primary_key_name())
+            if self.deferred_primary_key:
+                # Isolated from the table, CREATE TABLE leaves it out
+                self.add_primary_key = AddConstraint(constraint, isolate_from_table=True)
+        self.table_indexes = []
+        self.skipped_indexes = []  # (name, reason)
+        for name, columns, unique in [] if dialect.name in INDEXLESS_DIALECTS else self.indexes:
+            long_columns = [column for column in columns if column in too_long]
+            options = {}
+            if long_columns and dialect.name == 'mysql' and not unique:
+                options['mysql_length'] = {column: MAX_INDEXED_STRING_LENGTH['mysql'] for column in long_columns}
+            elif long_columns:
+                self.skipped_indexes.append((name, f"{', '.join(long_columns)} holds strings longer than "
+                                                   f"{dialect.name} can index"))
+                continue
+            self.table_indexes.append(Index(name, *[self.table.columns[column] for column in columns],
+                                            unique=unique, **options))
+
+    def index_name(self, name, columns):
+        """Source index names renamed after the target table, so copies in one schema do not clash."""
+        if not name:
+            return f"ix_{self.table_name}_{'_'.join(columns)}"
+        if self.table_name != self.source_table.name:
+            if self.source_table.name in name:
+                return name.replace(self.source_table.name, self.table_name)
+            return f"{self.table_name}_{name}"
+        return name
+
+    def primary_key_name(self):
+        return self.index_name(self.source_table.primary_key.name, []) if self.source_table.primary_key.name \
+            else f"pk_{self.table_name}"
+
+    def create_statements(self):
+        """DDL to run before the load."""
+        return [CreateTable(self.table)]
+
+    def index_statements(self):
+        """DDL to run after the load, once the rows are in."""
+        statements = [self.add_primary_key] if self.add_primary_key is not None else []
+        return statements + [CreateIndex(index) for index in self.table_indexes]
+
+    def sql(self):
+        """Every statement as SQL text of the dialect, in the order they run."""
+        return [str(statement.compile(dialect=self.dialect)).strip()
+                for statement in self.create_statements() + self.index_statements()]
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path[:0] = [SRC_DIR, os.path.join(SRC_DIR, 'connections'), os.path.join(SRC_DIR, 'processes')]
+
+
+@pytest.fixture
+def sqlite_connection(tmp_path, monkeypatch):
+    """Register SQLite files as connections: sqlite_connection('source') returns the engine of 'source'."""
+    from EngineRegistry import engine_registry
+    from SchemaCache import schema_cache
+
+    monkeypatch.setattr(schema_cache, 'directory', str(tmp_path / 'schema_cache'))
+    registered = []
+
+    def register(connection_id):
+        registered.append(connection_id)
+        return engine_registry.register(connection_id, f"sqlite:///{tmp_path / connection_id}.db")
+
+    yield register
+    for connection_id in registered:
+        engine_registry.evict(connection_id)
+        engine_registry.registrations.pop(connection_id, None)
+        schema_cache.invalidate(connection_id)
@@ -0,0 +1,62 @@
+import BatchSizer
+from BatchSizer import MAX_GROWTH, BatchSizer as Sizer, iter_chunks
+
+
+def test_fast_batches_grow_up_to_the_growth_limit():
+    sizer = Sizer(initial_size=1000, rss_limit=None)
+    sizer.round_trip = 0.001
+    # 1000 rows in 10 ms: a second holds ~100,000 rows, but a batch grows at most MAX_GROWTH times at once
+    sizer.observe(1000, 0.011)
+    assert sizer.batch_size == 1000 * MAX_GROWTH
+    sizer.observe(sizer.batch_size, 0.041)
+    assert sizer.batch_size == 1000 * MAX_GROWTH ** 2
+    for _ in range(10):
+        sizer.observe(sizer.batch_size, 0.001 + sizer.batch_size * 0.00001)
+    # What fits in the second left after the round trip
+    assert sizer.batch_size == 99900
+
+
+def test_slow_rows_and_high_latency_shrink_batches():
+    sizer = Sizer(initial_size=10000, rss_limit=None)
+    sizer.round_trip = 0.0
+    # 10,000 rows in 4 s: a second holds 2,500
+    sizer.observe(10000, 4.0)
+    assert sizer.batch_size == 2500
+
+    wan = Sizer(initial_size=10000, rss_limit=None)
+    wan.round_trip = 0.8
+    wan.observe(10000, 0.8 + 10000 * 0.0001)
+    # 0.2 s left after the round trip, 0.1 ms per row, give or take float rounding
+    assert 1990 <= wan.batch_size <= 2000
+    wan.round_trip = 1.5
+    wan.observe(2000, 1.7)
+    assert wan.batch_size == wan.min_size
+
+
+def test_batches_stay_below_the_memory_limit(monkeypatch):
+    monkeypatch.setattr(BatchSizer, 'current_rss', lambda: 900 * 1024 * 1024)
+    sizer = Sizer(initial_size=10000, rss_limit=1000 * 1024 * 1024)
+    sizer.round_trip = 0.0
+    # 1 KB rows as text, ROW_OVERHEAD_FACTOR times that in memory: a quarter of the 100 MB headroom holds 4,266
+    sizer.observe(10000, 0.1, 10000 * 1024)
+    assert sizer.batch_size == int(100 * 1024 * 1024 * BatchSizer.BATCH_MEMORY_SHARE
+                                   / (1024 * BatchSizer.ROW_OVERHEAD_FACTOR))
+
+
+def test_fixed_size_is_never_adapted():
+    sizer = Sizer(fixed_size=123)
+    sizer.observe(123, 60.0)
+    assert sizer.batch_size == 123
+
+
+def test_chunks_are_sized_by_the_sizer_as_they_are_written():
+    sizer = Sizer(initial_size=500, min_size=100, rss_limit=None)
+    sizer.round_trip = 0.0
+    rows = [(i, 'x') for i in range(2000)]
+    chunks = []
+    for chunk in iter_chunks(rows, sizer):
+        chunks.append(chunk)
+    assert [row for chunk in chunks for row in chunk] == rows
+    assert len(chunks[0]) == 500
+    # Writing nothing takes no time, so the chunks grow
+    assert len(chunks[1]) > 500
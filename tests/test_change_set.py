@@ -0,0 +1,69 @@
+import datetime
+import decimal
+import os
+
+import pytest
+from sqlalchemy import text
+
+from ChangeSet import CHANGED_COLUMN, MANIFEST_FILE, ChangeSet
+from SchemaCache import schema_cache
+
+CREATED = datetime.datetime(2026, 3, 1, 10, 15, 30, 250000)
+
+
+@pytest.fixture
+def target(sqlite_connection):
+    engine = sqlite_connection('target')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, price NUMERIC(10, 2), "
+                                "created_at TIMESTAMP)"))
+        connection.execute(text("INSERT INTO items VALUES (:id, :name, :price, :created_at)"),
+                           [{'id': i, 'name': f"old {i}", 'price': i, 'created_at': CREATED} for i in range(5)])
+    return engine
+
+
+def fill(change_set):
+    change_set.add('inserts', [(10, 'new', decimal.Decimal('9.99'), CREATED), (11, None, None, None)])
+    change_set.add('updates', [(1, 'renamed', decimal.Decimal('1.50'), CREATED, ['name', 'price'])])
+    change_set.add('deletes', [(3,), (4,), (99,)])
+    change_set.close()
+
+
+def table_rows(engine):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text("SELECT id, name, price FROM items ORDER BY id"))]
+
+
+@pytest.mark.parametrize('spill', [False, True])
+def test_apply_round_trip(target, tmp_path, spill):
+    table = schema_cache.get_table('target', 'items')
+    directory = str(tmp_path / 'changes') if spill else None
+    change_set = ChangeSet(table, ['id'], ['id', 'name', 'price', 'created_at'], directory, batch_size=2,
+                           metadata={'process': 'orders'})
+    fill(change_set)
+    if spill:
+        assert sorted(os.listdir(directory)) == ['deletes.arrow', 'inserts.arrow', MANIFEST_FILE, 'updates.arrow']
+        change_set = ChangeSet.open(directory)
+        assert change_set.metadata == {'process': 'orders', 'table': 'items'}
+        assert change_set.batch_size == 2
+    assert repr(change_set) == "ChangeSet('items', inserts=2, updates=1, deletes=3)"
+    assert [batch.num_rows for batch in change_set.iter_batches('deletes')] == [2, 1]
+
+    updates = change_set.to_table('updates').to_pylist()
+    assert updates == [{'id': 1, 'name': 'renamed', 'price': decimal.Decimal('1.50'), 'created_at': CREATED,
+                        CHANGED_COLUMN: ['name', 'price']}]
+
+    change_set.apply(target, table)
+    assert table_rows(target) == [(0, 'old 0', 0), (1, 'renamed', 1.5), (2, 'old 2', 2), (10, 'new', 9.99),
+                                  (11, None, None)]
+
+
+def test_empty_change_set(target, tmp_path):
+    table = schema_cache.get_table('target', 'items')
+    change_set = ChangeSet(table, ['id'], ['id', 'name'], str(tmp_path / 'changes'))
+    change_set.close()
+    reopened = ChangeSet.open(str(tmp_path / 'changes'))
+    assert reopened.is_empty()
+    assert reopened.to_table('inserts').num_rows == 0
+    reopened.apply(target, table)
+    assert len(table_rows(target)) == 5
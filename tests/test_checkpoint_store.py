@@ -0,0 +1,57 @@
+import datetime
+import decimal
+import os
+import stat
+import uuid
+
+import pytest
+
+from CheckpointStore import CheckpointStore, decode_value, encode_value
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    42,
+    'abc',
+    1.5,
+    decimal.Decimal('12345678901234567890.000001'),
+    datetime.datetime(2026, 3, 1, 10, 15, 30, 123456),
+    datetime.datetime(2026, 3, 1, 10, 15, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+    datetime.date(2026, 3, 1),
+    b'\x00\xffbinary',
+    uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    (1, 'a', datetime.date(2026, 3, 1)),
+])
+def test_values_round_trip_with_their_type(value):
+    decoded = decode_value(encode_value(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_save_load_and_reset(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    assert store.load('orders') is None
+
+    watermark = datetime.datetime(2026, 3, 1, 10, 15, 30)
+    store.save('orders', watermark, (7, 'x'), 1000)
+    checkpoint = CheckpointStore(str(tmp_path)).load('orders')
+    assert checkpoint['watermark'] == watermark
+    assert checkpoint['key'] == (7, 'x')
+    assert checkpoint['rows'] == 1000
+
+    store.save('orders', watermark + datetime.timedelta(seconds=1), (8, 'y'), 2000)
+    assert store.load('orders')['key'] == (8, 'y')
+    # Saves replace the file, no temporary file is left behind
+    assert os.listdir(tmp_path) == ['orders.json']
+
+    store.reset('orders')
+    assert store.load('orders') is None
+    store.reset('orders')
+
+
+def test_save_keeps_the_file_mode(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save('orders', 1, 1, 1)
+    os.chmod(store.path('orders'), 0o640)
+    store.save('orders', 2, 2, 2)
+    assert stat.S_IMODE(os.stat(store.path('orders')).st_mode) == 0o640
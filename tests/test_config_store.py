@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from ConfigStore import ConfigStore, atomic_write, file_lock
+
+# Other processes are forked so they can run the functions of this module
+needs_fork = pytest.mark.skipif(sys.platform == 'win32', reason="needs fork")
+
+INI = textwrap.dedent("""\
+    # Connections of the lab
+    ; passwords stay out of git
+
+    [connection_1]
+    # the main one
+    type = postgresql
+    host = 127.0.0.1
+    port = 5432
+
+    [connection_2]
+    type = mysql
+    ; old box
+    host = 10.0.0.1
+""")
+
+
+@pytest.fixture
+def ini_file(tmp_path):
+    path = tmp_path / 'connections.ini'
+    path.write_text(INI)
+    return str(path)
+
+
+def add_sections(path, count, results):
+    store = ConfigStore(path)
+    for _ in range(count):
+        results.put(store.add_section('connection', {'type': 'sqlite'}))
+
+
+@needs_fork
+def test_concurrent_writers_never_pick_the_same_section(ini_file):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=add_sections, args=(ini_file, 5, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    names = [results.get(timeout=5) for _ in range(20)]
+    assert len(set(names)) == 20
+    sections = ConfigStore(ini_file).load().sections()
+    assert sorted(sections) == sorted(['connection_1', 'connection_2'] + names)
+
+
+def test_deleted_section_numbers_are_not_reused(ini_file):
+    store = ConfigStore(ini_file)
+    assert store.add_section('connection', {'type': 'oracle'}) == 'connection_3'
+    store.delete_section('connection_3')
+    store.delete_section('connection_2')
+    assert ConfigStore(ini_file).add_section('connection', {'type': 'oracle'}) == 'connection_4'
+
+
+def test_edits_keep_comments_and_untouched_lines(ini_file):
+    store = ConfigStore(ini_file)
+    store.update_section('connection_1', {'host': 'db.example.com', 'port': None, 'username': 'sync'})
+    store.save_section('process_1', {'source': 'connection_1'})
+    text = open(ini_file).read()
+    assert text.startswith("# Connections of the lab\n; passwords stay out of git\n")
+    assert "[connection_1]\n# the main one\ntype = postgresql\nhost = db.example.com\nusername = sync\n" in text
+    assert "port" not in text
+    assert "[connection_2]\ntype = mysql\n; old box\nhost = 10.0.0.1\n" in text
+    assert store.section('process_1') == {'source': 'connection_1'}
+
+
+def test_writes_keep_the_file_mode(ini_file):
+    os.chmod(ini_file, 0o640)
+    ConfigStore(ini_file).update_section('connection_2', {'port': '3306'})
+    assert stat.S_IMODE(os.stat(ini_file).st_mode) == 0o640
+    assert [name for name in os.listdir(os.path.dirname(ini_file)) if name.endswith('.tmp')] == []
+
+
+def test_poll_reports_changes_made_by_another_store(ini_file):
+    store = ConfigStore(ini_file)
+    store.load()
+    changes = []
+    store.add_listener(changes.append)
+    ConfigStore(ini_file).update_section('connection_1', {'port': '5433'})
+    ConfigStore(ini_file).delete_section('connection_2')
+    store.poll()
+    assert changes[0].changed == ['connection_1']
+    assert changes[0].removed == ['connection_2']
+
+
+def hold_lock(path, held, release):
+    with file_lock(path):
+        held.set()
+        release.wait(30)
+
+
+@needs_fork
+def test_file_lock_excludes_other_processes(tmp_path):
+    path = str(tmp_path / 'shared.ini')
+    context = multiprocessing.get_context('fork')
+    held, release = context.Event(), context.Event()
+    holder = context.Process(target=hold_lock, args=(path, held, release))
+    holder.start()
+    try:
+        assert held.wait(10)
+        with pytest.raises(TimeoutError):
+            with file_lock(path, timeout=0.2):
+                pass
+    finally:
+        release.set()
+        holder.join(10)
+    with file_lock(path, timeout=1):
+        pass
+
+
+def test_atomic_write_binary(tmp_path):
+    path = str(tmp_path / 'data.bin')
+    atomic_write(path, b'\x00\x01')
+    assert open(path, 'rb').read() == b'\x00\x01'
@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy import text
+
+from DeleteDetector import DeleteDetector, KeyOrderError
+
+# Bloom filters miss about this share of the deletes, low enough for exact expectations
+EXACT_ERROR_RATE = 1e-9
+
+
+@pytest.fixture
+def text_keyed_target(sqlite_connection):
+    """Integer keys 1-6 in the source, the same keys as text in the target, which also has 7-9."""
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    with source.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO items VALUES (:id, 'x')"), [{'id': i} for i in range(1, 7)])
+    with target.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id VARCHAR(10) PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO items VALUES (:id, 'x')"), [{'id': str(i)} for i in range(1, 10)])
+    return target
+
+
+def test_bloom_confirms_keys_typed_differently_on_each_side(text_keyed_target):
+    detector = DeleteDetector('source', 'target', 'items', method='bloom', error_rate=EXACT_ERROR_RATE)
+    # '1' and 1 hash differently, so every target key is a candidate until the source is asked
+    result = detector.run(apply=True)
+    assert sorted(result.deleted) == [('7',), ('8',), ('9',)]
+    with text_keyed_target.connect() as connection:
+        remaining = connection.execute(text("SELECT id FROM items ORDER BY id")).scalars().all()
+    assert remaining == ['1', '2', '3', '4', '5', '6']
+
+
+def test_bloom_confirms_decimal_keys_against_integer_source(sqlite_connection):
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    with source.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO items VALUES (:id)"), [{'id': i} for i in range(1, 4)])
+    with target.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id NUMERIC(10, 2) PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO items VALUES (:id)"), [{'id': i} for i in (1, 2, 2.5, 3, 4)])
+    result = DeleteDetector('source', 'target', 'items', method='bloom', error_rate=EXACT_ERROR_RATE).run()
+    assert sorted(float(key) for (key,) in result.deleted) == [2.5, 4.0]
+
+
+def test_case_insensitive_source_match_is_not_reported(sqlite_connection):
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    with source.begin() as connection:
+        connection.execute(text("CREATE TABLE codes (code TEXT COLLATE NOCASE PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO codes VALUES (:code)"), [{'code': c} for c in ('ABC', 'def')])
+    with target.begin() as connection:
+        connection.execute(text("CREATE TABLE codes (code TEXT PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO codes VALUES (:code)"), [{'code': c} for c in ('abc', 'def', 'gone')])
+    detector = DeleteDetector('source', 'target', 'codes', method='bloom', error_rate=EXACT_ERROR_RATE)
+    assert detector.confirm_missing(['abc', 'def', 'gone']) == ['gone']
+
+
+@pytest.fixture
+def deleted_rows(sqlite_connection):
+    """2000 rows in the target, of which the source lost every 97th."""
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    ids = range(2000)
+    deleted = {i for i in ids if i % 97 == 0}
+    with source.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO items VALUES (:id, 'x')"), [{'id': i} for i in ids if i not in deleted])
+    with target.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, deleted_at TIMESTAMP)"))
+        connection.execute(text("INSERT INTO items (id, name) VALUES (:id, 'x')"), [{'id': i} for i in ids])
+    return target, deleted
+
+
+@pytest.mark.parametrize('method', ['merge', 'sorted', 'auto'])
+def test_exact_methods(deleted_rows, method):
+    _, deleted = deleted_rows
+    # A few hundred keys per run, so sorted spills and merges several runs
+    result = DeleteDetector('source', 'target', 'items', method=method, memory_keys=300).run()
+    assert {key for (key,) in result.deleted} == deleted
+
+
+def test_bloom_finds_every_delete_at_a_low_error_rate(deleted_rows):
+    _, deleted = deleted_rows
+    result = DeleteDetector('source', 'target', 'items', method='bloom', error_rate=EXACT_ERROR_RATE).run()
+    assert {key for (key,) in result.deleted} == deleted
+
+
+def test_tombstones_mark_rows_once(deleted_rows):
+    target, deleted = deleted_rows
+    detector = DeleteDetector('source', 'target', 'items', tombstone_column='deleted_at')
+    assert len(detector.run(apply=True).deleted) == len(deleted)
+    with target.connect() as connection:
+        marked = connection.execute(text("SELECT id FROM items WHERE deleted_at IS NOT NULL")).scalars().all()
+        assert set(marked) == deleted
+        assert connection.execute(text("SELECT COUNT(*) FROM items")).scalar() == 2000
+    # Rows already marked are not scanned again
+    assert detector.run(apply=True).deleted == []
+
+
+def test_collation_order_falls_back_to_sorted(sqlite_connection):
+    for connection_id, codes in (('source', ['a', 'B', 'D']), ('target', ['a', 'B', 'c', 'D', 'Zed'])):
+        with sqlite_connection(connection_id).begin() as connection:
+            connection.execute(text("CREATE TABLE codes (code TEXT COLLATE NOCASE PRIMARY KEY)"))
+            connection.execute(text("INSERT INTO codes VALUES (:code)"), [{'code': code} for code in codes])
+
+    with pytest.raises(KeyOrderError):
+        DeleteDetector('source', 'target', 'codes', method='merge').run()
+    result = DeleteDetector('source', 'target', 'codes', method='auto').run()
+    assert sorted(result.deleted) == [('Zed',), ('c',)]
+
+
+def test_composite_keys(sqlite_connection):
+    keys = [(x, y) for x in range(50) for y in ('p', 'q')]
+    for connection_id, table_keys in (('source', [key for key in keys if key[0] % 10 or key[1] == 'p']),
+                                      ('target', keys)):
+        with sqlite_connection(connection_id).begin() as connection:
+            connection.execute(text("CREATE TABLE pairs (x INTEGER, y TEXT, PRIMARY KEY (x, y))"))
+            connection.execute(text("INSERT INTO pairs VALUES (:x, :y)"), [{'x': x, 'y': y} for x, y in table_keys])
+
+    expected = [(x, 'q') for x in range(0, 50, 10)]
+    for method in ('merge', 'sorted', 'bloom'):
+        detector = DeleteDetector('source', 'target', 'pairs', method=method, error_rate=EXACT_ERROR_RATE)
+        assert sorted(detector.run().deleted) == expected
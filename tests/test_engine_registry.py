@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ConfigStore import config_store
+from DriverRegistry import driver_registry
+from EngineRegistry import EngineRegistry
+
+DEFINITIONS = {
+    'sqlite': {
+        'display_name': "SQLite",
+        'dependencies': ['sqlite3'],
+        'connection_string': "sqlite:///{database}",
+        'pool': {'pool_size': 2},
+    },
+}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """A registry over an ini file of SQLite connections, typed through a definitions file of their own."""
+    definitions_file = tmp_path / 'definitions.json'
+    definitions_file.write_text(json.dumps(DEFINITIONS))
+    monkeypatch.setattr(driver_registry, 'definitions', DEFINITIONS)
+    ini_file = tmp_path / 'connections.ini'
+    ini_file.write_text(f"[local]\ntype = sqlite\ndatabase = {tmp_path / 'a.db'}\nmax_sessions = 3\n\n"
+                        f"[other]\ntype = sqlite\ndatabase = {tmp_path / 'b.db'}\n")
+    registry = EngineRegistry(str(ini_file), str(definitions_file))
+    yield registry
+    registry.dispose_all()
+
+
+def test_engines_are_reused_until_their_section_changes(registry, tmp_path):
+    engine = registry.get_engine('local')
+    assert registry.get_engine('local') is engine
+    assert engine.url.database == str(tmp_path / 'a.db')
+    # Pool settings of the type in the definitions file
+    assert engine.pool.size() == 2
+    other = registry.get_engine('other')
+
+    config_store(registry.ini_file).update_section('local', {'database': str(tmp_path / 'c.db')})
+    replaced = registry.get_engine('local')
+    assert replaced is not engine
+    assert replaced.url.database == str(tmp_path / 'c.db')
+    # Other sections keep their engine
+    assert registry.get_engine('other') is other
+
+    config_store(registry.ini_file).delete_section('other')
+    assert 'other' not in registry.engines
+    with pytest.raises(KeyError):
+        registry.get_engine('other')
+
+
+def test_evict_and_registered_engines(registry, tmp_path):
+    engine = registry.get_engine('local')
+    registry.evict('local')
+    assert registry.get_engine('local') is not engine
+
+    stand_in = registry.register('local', f"sqlite:///{tmp_path / 'stand_in.db'}")
+    assert registry.get_engine('local') is stand_in
+    # Registrations are not backed by the ini file, edits of its section leave them alone
+    config_store(registry.ini_file).update_section('local', {'database': str(tmp_path / 'd.db')})
+    assert registry.get_engine('local') is stand_in
+    assert registry.connection_id_of(stand_in) == 'local'
@@ -0,0 +1,27 @@
+import threading
+import time
+
+import HealthCheck
+from HealthCheck import HealthResult, check_all
+
+
+def test_hung_checks_give_their_slot_to_the_remaining_ones(monkeypatch):
+    hang = threading.Event()
+
+    def check_connection(connection_id, timeout):
+        if connection_id.startswith('hung'):
+            hang.wait(10)
+        return HealthResult(connection_id, True, 1.0, 1.0)
+
+    monkeypatch.setattr(HealthCheck, 'check_connection', check_connection)
+    started = time.perf_counter()
+    try:
+        results = check_all(['hung-1', 'hung-2', 'a', 'b'], fan_out=2, timeout=0.3)
+    finally:
+        hang.set()
+    # Not held back until the hung drivers return
+    assert time.perf_counter() - started < 5
+    assert [(result.connection_id, result.ok) for result in results] == [
+        ('hung-1', False), ('hung-2', False), ('a', True), ('b', True)
+    ]
+    assert results[0].error == "Timed out after 0.3 seconds"
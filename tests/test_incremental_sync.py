@@ -0,0 +1,37 @@
+import datetime
+
+from sqlalchemy import text
+
+from CheckpointStore import CheckpointStore
+from IncrementalSync import IncrementalSync
+
+BASE = datetime.datetime(2026, 1, 1)
+
+
+def test_checkpoint_follows_a_watermark_the_target_does_not_copy(sqlite_connection, tmp_path):
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    with source.begin() as connection:
+        connection.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, name TEXT, updated_at TIMESTAMP)"))
+        connection.execute(text("INSERT INTO orders VALUES (:id, :name, :updated_at)"),
+                           [{'id': i, 'name': f"n{i}", 'updated_at': BASE + datetime.timedelta(minutes=i // 3)}
+                            for i in range(25)])
+    with target.begin() as connection:
+        connection.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY, name TEXT)"))
+
+    store = CheckpointStore(str(tmp_path / 'checkpoints'))
+    sync = IncrementalSync('orders', 'source', 'target', 'orders', 'updated_at', batch_size=10,
+                           checkpoint_store=store)
+    assert sync.columns == ['id', 'name']
+    assert sync.run() == 25
+    checkpoint = store.load('orders')
+    assert (checkpoint['watermark'], checkpoint['key'], checkpoint['rows']) == (BASE + datetime.timedelta(minutes=8),
+                                                                                (24,), 25)
+
+    with source.begin() as connection:
+        connection.execute(text("UPDATE orders SET name = 'new', updated_at = :updated_at WHERE id = 3"),
+                           {'updated_at': BASE + datetime.timedelta(days=1)})
+    assert sync.run() == 1
+    assert sync.run() == 0
+    with target.connect() as connection:
+        assert connection.execute(text("SELECT count(*), max(name) FROM orders")).one() == (25, 'new')
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from KeyRanges import KeyRange, split_range
+from PartitionedExtract import PartitionedExtract
+from SchemaCache import schema_cache
+
+
+class KeyCollector:
+    """Partition handler returning the keys it was given; defined at module level to be picklable."""
+
+    def __init__(self):
+        self.keys = []
+
+    def __call__(self, batch):
+        self.keys.extend(row[0] for row in batch)
+
+    def result(self):
+        return self.keys
+
+
+@pytest.fixture
+def source(sqlite_connection):
+    engine = sqlite_connection('source')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE numbers (id INTEGER PRIMARY KEY, name TEXT)"))
+        # Skewed keys: most partitions by value are nearly empty
+        connection.execute(text("INSERT INTO numbers VALUES (:id, :name)"),
+                           [{'id': i * i, 'name': f"n{i:04d}"} for i in range(300)])
+        connection.execute(text("CREATE TABLE names (name TEXT PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO names VALUES (:name)"), [{'name': f"n{i:04d}"} for i in range(300)])
+    return engine
+
+
+def assert_contiguous(buckets, lower, upper):
+    assert buckets[0].lower == lower
+    assert buckets[-1].upper == upper
+    assert buckets[-1].inclusive
+    for bucket, following in zip(buckets, buckets[1:]):
+        assert bucket.upper == following.lower
+        assert not bucket.inclusive
+
+
+def test_numeric_and_date_ranges_are_split_arithmetically():
+    buckets = split_range(None, None, KeyRange(0, 99, True), 4)
+    assert [(bucket.lower, bucket.upper) for bucket in buckets] == [(0, 24), (24, 48), (48, 72), (72, 99)]
+    assert_contiguous(buckets, 0, 99)
+
+    start, end = datetime.date(2026, 1, 1), datetime.date(2026, 1, 9)
+    buckets = split_range(None, None, KeyRange(start, end, True), 4)
+    assert [bucket.lower.day for bucket in buckets] == [1, 3, 5, 7]
+    assert_contiguous(buckets, start, end)
+
+
+def test_narrow_ranges_are_not_split():
+    assert len(split_range(None, None, KeyRange(5, 5, True), 4)) == 1
+    assert len(split_range(None, None, KeyRange(0, 100, True), 1)) == 1
+    # Fewer keys than parts
+    assert [(bucket.lower, bucket.upper) for bucket in split_range(None, None, KeyRange(0, 2, True), 8)] == \
+        [(0, 1), (1, 2)]
+
+
+def test_other_keys_are_split_on_quantiles(source):
+    column = schema_cache.get_table('source', 'names').columns['name']
+    buckets = split_range(source, column, KeyRange('n0000', 'n0299', True), 3)
+    assert [(bucket.lower, bucket.upper) for bucket in buckets] == [
+        ('n0000', 'n0100'), ('n0100', 'n0200'), ('n0200', 'n0299')
+    ]
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+@pytest.mark.parametrize('table_name, partitions', [('numbers', 8), ('names', 5), ('numbers', 1)])
+def test_every_row_is_read_exactly_once(source, executor, table_name, partitions):
+    extract = PartitionedExtract('source', table_name, partitions=partitions, workers=3, executor=executor,
+                                 batch_size=7)
+    events = []
+    results = extract.run(KeyCollector, lambda index, rows, finished: events.append((index, rows, finished)))
+    keys = [key for partition in results for key in partition]
+    with source.connect() as connection:
+        expected = connection.execute(text(f"SELECT {extract.key_column} FROM {table_name}")).scalars().all()
+    assert sorted(keys) == sorted(expected)
+    assert len(keys) == len(set(keys))
+    assert len(results) == len(extract.partition_ranges())
+    # Every partition reports when it is done, with all of its rows
+    assert sorted((index, rows) for index, rows, finished in events if finished) == \
+        [(index, len(partition)) for index, partition in enumerate(results)]
+
+
+def test_empty_table_has_no_partitions(sqlite_connection):
+    engine = sqlite_connection('source')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE empty (id INTEGER PRIMARY KEY)"))
+    assert PartitionedExtract('source', 'empty').run(KeyCollector) == []
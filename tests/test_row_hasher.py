@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import pytest
+
+from RowHasher import hash_rows, normalize_value, row_hash
+
+
+def vector_hash(value):
+    return int(hash_rows([(value,)])[0])
+
+
+@pytest.mark.parametrize('left, right', [
+    (Decimal('12345678901234567.01'), Decimal('12345678901234567.02')),
+    (Decimal('0.1000000000000000001'), Decimal('0.1000000000000000002')),
+    (Decimal('9007199254740993'), Decimal('9007199254740992')),
+    (2 ** 70 + 1, 2 ** 70),
+    (9007199254740993, 9007199254740992.0),
+    (None, 0),
+])
+def test_distinct_numbers_hash_differently(left, right):
+    assert row_hash((left,)) != row_hash((right,))
+    assert vector_hash(left) != vector_hash(right)
+
+
+@pytest.mark.parametrize('left, right', [
+    (Decimal('9007199254740993'), 9007199254740993),
+    (Decimal('123456789012345678901234567890'), 123456789012345678901234567890),
+    (Decimal('1.50'), Decimal('1.5')),
+    (Decimal('1E+2'), 100),
+    (Decimal('-0.00'), 0),
+    (Decimal('0.1'), 0.1),
+    (Decimal('0.00001'), 1e-05),
+    (Decimal('100000000000000000000'), 1e20),
+    (1.0, 1),
+])
+def test_equal_numbers_hash_alike(left, right):
+    assert row_hash((left,)) == row_hash((right,))
+    assert vector_hash(left) == vector_hash(right)
+
+
+def test_decimal_text_is_exact():
+    assert normalize_value(Decimal('12345678901234567.010')) == '12345678901234567.01'
+    assert normalize_value(Decimal('0.1000000000000000001')) == '0.1000000000000000001'
+    assert normalize_value(Decimal('9007199254740993')) == '9007199254740993'
+
+
+def test_batches_hash_like_single_values():
+    values = [Decimal('12345678901234567.01'), Decimal('2.50'), Decimal('0E-28'), None, Decimal(2 ** 64)]
+    batch = hash_rows([(value,) for value in values])
+    assert list(batch) == [vector_hash(value) for value in values]
+    # The same numbers read as ints and floats by another driver
+    mixed = hash_rows([(value,) for value in [Decimal('12345678901234567.01'), 2.5, 0, None, 2 ** 64]])
+    assert list(mixed) == list(batch)
+
+
+def test_row_hash_agrees_across_types_and_columns():
+    assert row_hash((1, 'a', None)) != row_hash((1, None, 'a'))
+    assert row_hash((Decimal('3.00'), '')) == row_hash((3, None))
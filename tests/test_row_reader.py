@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import text
+
+from BatchSizer import batch_sizers
+from RowReader import iter_batches, iter_rows, read_table
+from RunMetrics import RunMetrics
+from SchemaCache import schema_cache
+
+
+@pytest.fixture
+def source(sqlite_connection):
+    engine = sqlite_connection('source')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO items VALUES (:id, :name)"),
+                           [{'id': i, 'name': f"item {i}"} for i in range(25)])
+    return engine
+
+
+@pytest.mark.parametrize('rows, batch_size, sizes', [
+    (25, 10, [10, 10, 5]),
+    (20, 10, [10, 10]),
+    (25, 100, [25]),
+    (0, 10, []),
+])
+def test_batches_end_at_the_last_row(source, rows, batch_size, sizes):
+    query = text("SELECT id, name FROM items WHERE id < :rows ORDER BY id").bindparams(rows=rows)
+    batches = list(iter_batches(source, query, batch_size))
+    assert [len(batch) for batch in batches] == sizes
+    assert [row.id for batch in batches for row in batch] == list(range(rows))
+    assert [row.id for row in iter_rows(source, query, batch_size)] == list(range(rows))
+
+
+def test_batches_are_fetched_as_they_are_consumed(source):
+    metrics = RunMetrics('read')
+    with metrics.activate():
+        batches = iter_batches(source, text("SELECT id, name FROM items ORDER BY id"), 10)
+        assert metrics.counters.get('rows_read', 0) == 0
+        assert [row.id for row in next(batches)] == list(range(10))
+        assert metrics.counters['rows_read'] == 10
+        batches.close()
+    assert metrics.counters['rows_read'] == 10
+    assert metrics.counters['bytes_read'] > 0
+
+
+def test_adaptive_batches_start_at_the_size_of_the_sizer(source):
+    sizer = batch_sizers.get(source, 'read')
+    sizer.batch_size = 7
+    batches = list(iter_batches(source, text("SELECT id FROM items ORDER BY id")))
+    # The first fetch is measured and the next one grows, down to no less than the minimum size
+    assert [len(batch) for batch in batches] == [7, 18]
+    assert sizer.round_trip is not None
+    assert sizer.row_seconds is not None
+
+
+def test_read_table_selects_filters_and_orders(source):
+    table = schema_cache.get_table('source', 'items')
+    batches = read_table(source, table, columns=['name'], where=table.columns['id'] >= 20,
+                         order_by=['id'], batch_size=2)
+    assert [[tuple(row) for row in batch] for batch in batches] == [
+        [('item 20',), ('item 21',)], [('item 22',), ('item 23',)], [('item 24',)]
+    ]
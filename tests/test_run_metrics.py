@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+from sqlalchemy import text
+
+from RunMetrics import PrometheusExporter, RunMetrics, append_run_log, count, format_run, stage
+
+
+def test_stage_times_are_exclusive():
+    metrics = RunMetrics('orders')
+    with metrics.activate():
+        with stage('diff'):
+            time.sleep(0.05)
+            with stage('extract'):
+                time.sleep(0.1)
+            with stage('extract'):
+                time.sleep(0.1)
+    seconds = metrics.stage_seconds
+    assert seconds['extract'] >= 0.2
+    # Only the diff's own time, not the extracts nested in it
+    assert 0.05 <= seconds['diff'] < seconds['extract']
+    assert seconds['diff'] + seconds['extract'] <= metrics.wall_seconds
+    assert metrics.status == 'finished'
+
+
+def test_other_threads_are_not_part_of_the_run(sqlite_connection):
+    source = sqlite_connection('source')
+
+    def work():
+        with stage('extract'):
+            count('rows_read', 10)
+        with source.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    metrics = RunMetrics('orders')
+    with metrics.activate():
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert (metrics.stage_seconds, metrics.counters, metrics.round_trips) == ({}, {}, {})
+
+
+def test_round_trips_are_counted_per_connection(sqlite_connection):
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    metrics = RunMetrics('orders')
+    with metrics.activate():
+        with source.connect() as connection:
+            for _ in range(3):
+                connection.execute(text("SELECT 1"))
+        with target.begin() as connection:
+            connection.execute(text("CREATE TABLE t (id INTEGER)"))
+            # One executemany is one round trip
+            connection.execute(text("INSERT INTO t VALUES (:id)"), [{'id': i} for i in range(5)])
+        count('rows_read', 5)
+        count('rows_read', 2)
+    assert metrics.round_trips == {'source': 3, 'target': 2}
+    assert metrics.counters == {'rows_read': 7}
+
+
+def test_failed_runs_are_logged_and_exported(tmp_path):
+    metrics = RunMetrics('orders "eu"')
+    try:
+        with metrics.activate():
+            count('rows_read', 3)
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert (metrics.status, metrics.error) == ('failed', 'boom')
+
+    log = tmp_path / 'logs' / 'runs.jsonl'
+    append_run_log(metrics, str(log))
+    append_run_log(metrics, str(log))
+    runs = [json.loads(line) for line in log.read_text().splitlines()]
+    assert len(runs) == 2
+    assert runs[0]['counters'] == {'rows_read': 3}
+
+    exporter = PrometheusExporter(str(tmp_path / 'metrics.prom'))
+    exporter.record(metrics)
+    exported = (tmp_path / 'metrics.prom').read_text()
+    assert 'nocdc_last_run_success{process="orders \\"eu\\""} 0' in exported
+    assert 'nocdc_last_run_rows{process="orders \\"eu\\"",counter="rows_read"} 3' in exported
+    assert format_run(metrics).startswith('orders "eu": failed in ')
@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+from Schedule import CronTrigger, IntervalTrigger, parse_duration, trigger_for
+
+
+def at(text):
+    return datetime.datetime.fromisoformat(text)
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('90', 90),
+    ('30s', 30),
+    ('15m', 900),
+    ('2h', 7200),
+    ('1h30m', 5400),
+    ('1d 2h', 93600),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize('value', ['', 'soon', '15x', '1h30', 'm15'])
+def test_parse_duration_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
+
+
+@pytest.mark.parametrize('expression, moment, expected', [
+    ('* * * * *', '2026-03-01 10:15:30', '2026-03-01 10:16:00'),
+    ('*/15 * * * *', '2026-03-01 10:15:00', '2026-03-01 10:30:00'),
+    ('0 2 * * *', '2026-03-01 02:00:00', '2026-03-02 02:00:00'),
+    ('30 8-10 * * *', '2026-03-01 10:31:00', '2026-03-02 08:30:00'),
+    ('0 0 1,15 * *', '2026-03-02 00:00:00', '2026-03-15 00:00:00'),
+    ('0 12 * jan-mar mon', '2026-03-31 12:00:00', '2027-01-04 12:00:00'),
+    ('0 6 * * 7', '2026-03-01 06:00:00', '2026-03-08 06:00:00'),
+    ('0 6 * * sun', '2026-02-28 23:59:00', '2026-03-01 06:00:00'),
+    ('0 0 29 2 *', '2026-03-01 00:00:00', '2028-02-29 00:00:00'),
+    ('10-20/5 * * * *', '2026-03-01 10:16:00', '2026-03-01 10:20:00'),
+])
+def test_cron_next_after(expression, moment, expected):
+    assert CronTrigger(expression).next_after(at(moment)) == at(expected)
+
+
+def test_cron_day_of_month_or_day_of_week():
+    # Both restricted: either one matching is enough, as in cron
+    trigger = CronTrigger('0 0 13 * fri')
+    assert trigger.next_after(at('2026-03-01 00:00:00')) == at('2026-03-06 00:00:00')
+    assert trigger.next_after(at('2026-03-12 00:00:00')) == at('2026-03-13 00:00:00')
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *',
+    '60 * * * *',
+    '* 24 * * *',
+    '* * 0 * *',
+    '* * * 13 *',
+    '*/0 * * * *',
+    '* * * foo *',
+])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronTrigger(expression)
+
+
+def test_cron_that_never_fires():
+    with pytest.raises(ValueError):
+        CronTrigger('0 0 31 2 *').next_after(at('2026-01-01 00:00:00'))
+
+
+def test_trigger_for():
+    assert trigger_for({'cron': '0 * * * *'}) == CronTrigger('0 * * * *')
+    assert trigger_for({'interval': '5m'}) == IntervalTrigger(300)
+    assert trigger_for({'cron': '0 * * * *', 'interval': '5m'}) == CronTrigger('0 * * * *')
+    assert trigger_for({}) is None
+    assert IntervalTrigger(60).next_after(at('2026-03-01 10:00:00')) == at('2026-03-01 10:01:00')
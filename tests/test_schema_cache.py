@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import NoSuchTableError
+
+from ConfigStore import config_store
+from DriverRegistry import driver_registry
+from EngineRegistry import EngineRegistry
+from SchemaCache import SchemaCache
+
+DEFINITIONS = {'sqlite': {'display_name': "SQLite", 'dependencies': ['sqlite3'],
+                          'connection_string': "sqlite:///{database}"}}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """A registry with one ini-backed SQLite connection, 'local', holding an `items` table."""
+    definitions_file = tmp_path / 'definitions.json'
+    definitions_file.write_text(json.dumps(DEFINITIONS))
+    monkeypatch.setattr(driver_registry, 'definitions', DEFINITIONS)
+    ini_file = tmp_path / 'connections.ini'
+    ini_file.write_text(f"[local]\ntype = sqlite\ndatabase = {tmp_path / 'a.db'}\n")
+    registry = EngineRegistry(str(ini_file), str(definitions_file))
+    with registry.get_engine('local').begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    yield registry
+    registry.dispose_all()
+
+
+def column_names(table):
+    return [column.name for column in table.columns]
+
+
+def test_entries_are_reused_in_memory_and_from_disk(registry, tmp_path):
+    cache = SchemaCache(str(tmp_path / 'cache'), registry)
+    entry = cache.get('local')
+    assert cache.get('local') is entry
+    assert os.listdir(tmp_path / 'cache') == ['local.pickle']
+
+    # Another process starts from the pickled entry instead of reflecting again
+    reloaded = SchemaCache(str(tmp_path / 'cache'), registry).get('local')
+    assert reloaded.reflected_at == entry.reflected_at
+    assert column_names(reloaded.metadata.tables['items']) == ['id', 'name']
+
+    cache.invalidate('local')
+    assert os.listdir(tmp_path / 'cache') == []
+    assert cache.get('local') is not entry
+
+
+def test_drift_is_checked_once_per_interval(registry, tmp_path):
+    cache = SchemaCache(str(tmp_path / 'cache'), registry, drift_check_interval=3600)
+    assert column_names(cache.get_table('local', 'items')) == ['id', 'name']
+    with registry.get_engine('local').begin() as connection:
+        connection.execute(text("ALTER TABLE items ADD COLUMN price NUMERIC"))
+    # Trusted until the interval is over
+    assert column_names(cache.get_table('local', 'items')) == ['id', 'name']
+    cache.entries[('local', None)].checked_at -= 3600
+    assert column_names(cache.get_table('local', 'items')) == ['id', 'name', 'price']
+
+
+def test_new_tables_are_reflected_on_first_use(registry, tmp_path):
+    cache = SchemaCache(str(tmp_path / 'cache'), registry, drift_check_interval=3600)
+    cache.get('local')
+    with registry.get_engine('local').begin() as connection:
+        connection.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY)"))
+    assert column_names(cache.get_table('local', 'orders')) == ['id']
+    with pytest.raises(NoSuchTableError):
+        cache.get_table('local', 'missing')
+
+
+def test_section_change_drops_the_entry(registry, tmp_path):
+    cache = SchemaCache(str(tmp_path / 'cache'), registry, drift_check_interval=3600)
+    assert cache.table_names('local') == ['items']
+    other = tmp_path / 'b.db'
+    config_store(registry.ini_file).update_section('local', {'database': str(other)})
+    with registry.get_engine('local').begin() as connection:
+        connection.execute(text("CREATE TABLE customers (id INTEGER PRIMARY KEY)"))
+    assert cache.table_names('local') == ['customers']
+    # The entry on disk was replaced as well
+    assert SchemaCache(str(tmp_path / 'cache'), registry).table_names('local') == ['customers']
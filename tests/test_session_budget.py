@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import nocdc
+from EngineRegistry import engine_registry
+from ProcessDefinitions import ProcessRunning, process_run
+from Scheduler import Scheduler
+from SessionBudget import SessionBudget
+
+
+@pytest.mark.parametrize('section, pool_size, max_overflow', [
+    ({}, 5, 10),
+    ({'max_sessions': '3'}, 3, 0),
+    ({'max_sessions': '8'}, 5, 3),
+    ({'max_sessions': '8', 'pool_size': '0'}, 8, 0),
+    ({'max_sessions': '8', 'pool_size': '2', 'max_overflow': '-1'}, 2, 6),
+])
+def test_pool_is_capped_at_max_sessions(section, pool_size, max_overflow):
+    settings = engine_registry.get_pool_settings(dict(section, type='postgresql'))
+    assert (settings['pool_size'], settings['max_overflow']) == (pool_size, max_overflow)
+
+
+def test_workers_draw_on_the_sessions_held_by_their_process():
+    budget = SessionBudget()
+    budget.set_limit('source', 3)
+    assert budget.try_acquire(['source'])  # Taken by the scheduler for a process
+    with budget.holding(['source']):
+        with budget.sessions(['source'], 4) as workers:
+            # The held session is the first worker, two more are free
+            assert workers == 3
+            assert budget.in_use['source'] == 3
+            assert not budget.try_acquire(['source'])
+    assert budget.in_use['source'] == 1
+    budget.release(['source'])
+    assert budget.in_use['source'] == 0
+
+
+def test_unlimited_connections_get_every_worker():
+    budget = SessionBudget()
+    with budget.sessions(['unknown'], 6) as workers:
+        assert workers == 6
+
+
+def test_a_process_runs_in_one_scheduler_at_a_time(tmp_path):
+    ini_file = tmp_path / 'processes.ini'
+    ini_file.write_text("[orders]\nsource = a\ntarget = b\ntables = orders\n")
+    release = threading.Event()
+    started = threading.Event()
+
+    def runner(process_id, ini_file):
+        started.set()
+        release.wait(10)
+        return 'done'
+
+    first = Scheduler(str(ini_file), runner=runner, run_log=None, budget=SessionBudget())
+    second = Scheduler(str(ini_file), runner=runner, run_log=None, budget=SessionBudget())
+    skipped = threading.Event()
+    second.add_listener(lambda event, status: skipped.set() if event == 'skipped' else None)
+    first.start()
+    second.start()
+    try:
+        first.enqueue('orders')
+        assert started.wait(10)
+        second.enqueue('orders')
+        assert skipped.wait(10)
+        assert second.status('orders').state == 'idle'
+    finally:
+        release.set()
+        first.stop()
+        second.stop()
+    assert first.status('orders').result == 'done'
+    assert first.budget.in_use == {'a': 0, 'b': 0}
+
+
+def test_a_cli_run_is_refused_while_a_scheduler_runs_the_process(tmp_path, monkeypatch, capsys):
+    ini_file = tmp_path / 'processes.ini'
+    ini_file.write_text("[orders]\nsource = a\ntarget = b\ntables = orders\n")
+    monkeypatch.setattr(engine_registry, 'ini_file', engine_registry.ini_file)
+    release = threading.Event()
+    started = threading.Event()
+
+    def runner(process_id, ini_file):
+        started.set()
+        release.wait(10)
+        return 'done'
+
+    scheduler = Scheduler(str(ini_file), runner=runner, run_log=None, budget=SessionBudget())
+    scheduler.start()
+    try:
+        scheduler.enqueue('orders')
+        assert started.wait(10)
+        assert nocdc.main(['--processes-file', str(ini_file), '--connections-file', str(tmp_path / 'connections.ini'),
+                           'run', 'orders', '--run-log', '']) == 1
+        assert "orders: failed: Process 'orders' is already running" in capsys.readouterr().err
+        with pytest.raises(ProcessRunning):
+            with process_run('orders', str(ini_file), SessionBudget()):
+                pass
+    finally:
+        release.set()
+        scheduler.stop()
+    assert scheduler.status('orders').result == 'done'
+
+    budget = SessionBudget()
+    with process_run('orders', str(ini_file), budget):
+        assert budget.in_use == {'a': 1, 'b': 1}
+    assert budget.in_use == {'a': 0, 'b': 0}
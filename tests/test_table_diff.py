@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import text
+
+from RunMetrics import RunMetrics
+from TableDiff import TableDiff
+
+ROWS = 3000
+INSERTED = {5, 1200, 2999}
+UPDATED = {0, 700, 701, 2500}
+DELETED = {10, 1500, 2998}
+
+
+def fill(engine, ddl, rows):
+    with engine.begin() as connection:
+        connection.execute(text(ddl))
+        connection.execute(text("INSERT INTO items VALUES (:id, :name, :price)"), rows)
+
+
+@pytest.fixture
+def tables(sqlite_connection):
+    """Source and target copies of a table, the target missing INSERTED, stale on UPDATED and keeping DELETED."""
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    ddl = "CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, price NUMERIC(10, 2))"
+    rows = [{'id': i, 'name': f"item {i}", 'price': i / 4} for i in range(ROWS)]
+    fill(source, ddl, [row for row in rows if row['id'] not in DELETED])
+    fill(target, ddl, [dict(row, name='stale') if row['id'] in UPDATED else row
+                       for row in rows if row['id'] not in INSERTED])
+    return source, target
+
+
+def keys(result_keys):
+    return {key for (key,) in result_keys}
+
+
+@pytest.mark.parametrize('options', [
+    {},  # One read compares everything in memory
+    {'memory_rows': 100, 'leaf_size': 50, 'bucket_count': 4},  # Drills down through bucket checksums
+])
+def test_diff_finds_every_change(tables, options):
+    result = TableDiff('source', 'target', 'items', **options).run()
+    assert keys(result.inserted) == INSERTED
+    assert keys(result.updated) == UPDATED
+    assert keys(result.deleted) == DELETED
+
+
+def test_drill_down_reads_less_than_the_whole_table_again(tables):
+    metrics = RunMetrics('diff')
+    with metrics.activate():
+        TableDiff('source', 'target', 'items', memory_rows=100, leaf_size=50, bucket_count=8).run()
+    # The first read covers both tables once, the drill-down only the buckets that changed
+    assert metrics.counters['rows_read'] < 4 * ROWS
+
+
+def test_applied_change_set_makes_the_tables_equal(tables):
+    source, target = tables
+    diff = TableDiff('source', 'target', 'items', memory_rows=100, leaf_size=50, bucket_count=4)
+    change_set = diff.new_change_set()
+    diff.run(change_set)
+    change_set.close()
+    assert change_set.counts == {'inserts': len(INSERTED), 'updates': len(UPDATED), 'deletes': len(DELETED)}
+    change_set.apply(diff.target_engine, diff.target_table)
+
+    assert TableDiff('source', 'target', 'items').run().is_empty()
+    query = text("SELECT id, name, price FROM items ORDER BY id")
+    with source.connect() as source_connection, target.connect() as target_connection:
+        assert source_connection.execute(query).all() == target_connection.execute(query).all()
+
+
+def test_text_and_composite_keys(sqlite_connection):
+    source = sqlite_connection('source')
+    target = sqlite_connection('target')
+    ddl = "CREATE TABLE items (region TEXT, code TEXT, qty INTEGER, PRIMARY KEY (region, code))"
+    rows = [{'region': region, 'code': f"c{i:04d}", 'qty': i} for region in ('eu', 'us') for i in range(500)]
+    for engine, table_rows in ((source, rows[1:]), (target, [dict(row, qty=-1) if row['code'] == 'c0300' else row
+                                                             for row in rows])):
+        with engine.begin() as connection:
+            connection.execute(text(ddl))
+            connection.execute(text("INSERT INTO items VALUES (:region, :code, :qty)"), table_rows)
+
+    result = TableDiff('source', 'target', 'items', memory_rows=100, leaf_size=50, bucket_count=4).run()
+    assert result.inserted == []
+    assert sorted(result.updated) == [('eu', 'c0300'), ('us', 'c0300')]
+    assert result.deleted == [('eu', 'c0000')]
+
+
+def test_empty_tables(sqlite_connection):
+    for connection_id in ('source', 'target'):
+        with sqlite_connection(connection_id).begin() as connection:
+            connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, price NUMERIC)"))
+    assert TableDiff('source', 'target', 'items').run().is_empty()
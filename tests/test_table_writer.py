@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import text
+
+from BulkLoader import bulk_insert, csv_text
+from SchemaCache import schema_cache
+from TableWriter import delete_keys, keyset_after, upsert_rows
+
+
+@pytest.fixture
+def target(sqlite_connection):
+    engine = sqlite_connection('target')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (region TEXT, id INTEGER, name TEXT, deleted BOOLEAN, "
+                                "deleted_at TIMESTAMP, PRIMARY KEY (region, id))"))
+    return engine
+
+
+def rows(engine, where='1 = 1'):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(
+            text(f"SELECT region, id, name, deleted, deleted_at IS NOT NULL FROM items WHERE {where} "
+                 f"ORDER BY region, id"))]
+
+
+def temporary_tables(connection):
+    return connection.execute(text("SELECT name FROM sqlite_temp_master WHERE type = 'table'")).scalars().all()
+
+
+@pytest.mark.parametrize('chunk_size', [None, 3])
+def test_bulk_insert(target, chunk_size):
+    table = schema_cache.get_table('target', 'items')
+    with target.begin() as connection:
+        bulk_insert(connection, table, ['region', 'id', 'name'], [('eu', i, f"n{i}") for i in range(10)], chunk_size)
+        bulk_insert(connection, table, ['region', 'id', 'name'], [], chunk_size)
+    assert rows(target) == [('eu', i, f"n{i}", None, 0) for i in range(10)]
+
+
+def test_upsert_inserts_and_replaces_by_key(target):
+    table = schema_cache.get_table('target', 'items')
+    key = ['region', 'id']
+    with target.begin() as connection:
+        upsert_rows(connection, table, key, [('eu', 1, 'a'), ('eu', 2, 'b'), ('us', 1, 'c')],
+                    columns=['region', 'id', 'name'], chunk_size=2)
+        # Mappings, an update of ('eu', 2) and an insert of ('us', 2)
+        upsert_rows(connection, table, key, [{'region': 'eu', 'id': 2, 'name': 'B'},
+                                             {'region': 'us', 'id': 2, 'name': 'd'}])
+        assert temporary_tables(connection) == []
+    assert [row[:3] for row in rows(target)] == [('eu', 1, 'a'), ('eu', 2, 'B'), ('us', 1, 'c'), ('us', 2, 'd')]
+
+    # Key columns only: existing rows are left alone
+    with target.begin() as connection:
+        upsert_rows(connection, table, key, [('eu', 1), ('eu', 3)], columns=key)
+    assert [row[:3] for row in rows(target)] == [('eu', 1, 'a'), ('eu', 2, 'B'), ('eu', 3, None), ('us', 1, 'c'),
+                                                 ('us', 2, 'd')]
+
+
+def test_delete_keys(target):
+    table = schema_cache.get_table('target', 'items')
+    with target.begin() as connection:
+        bulk_insert(connection, table, ['region', 'id', 'name'], [(region, i, 'x') for region in ('eu', 'us')
+                                                                   for i in range(3)])
+        delete_keys(connection, table, ['region', 'id'], [('eu', 0), ('us', 2), ('us', 9)], chunk_size=2)
+        delete_keys(connection, table, ['region', 'id'], [])
+        assert temporary_tables(connection) == []
+    assert [row[:2] for row in rows(target)] == [('eu', 1), ('eu', 2), ('us', 0), ('us', 1)]
+
+
+@pytest.mark.parametrize('tombstone_column, marked', [('deleted', (1, 0)), ('deleted_at', (None, 1))])
+def test_delete_keys_with_a_tombstone_column(target, tombstone_column, marked):
+    table = schema_cache.get_table('target', 'items')
+    with target.begin() as connection:
+        bulk_insert(connection, table, ['region', 'id', 'name'], [('eu', i, 'x') for i in range(3)])
+        delete_keys(connection, table, ['region', 'id'], [('eu', 1)], tombstone_column=tombstone_column)
+    assert rows(target) == [('eu', 0, 'x', None, 0), ('eu', 1, 'x') + marked, ('eu', 2, 'x', None, 0)]
+
+
+def test_keyset_after(target):
+    table = schema_cache.get_table('target', 'items')
+    with target.begin() as connection:
+        bulk_insert(connection, table, ['region', 'id', 'name'], [(region, i, 'x') for region in ('eu', 'us')
+                                                                   for i in range(3)])
+        condition = keyset_after([table.columns['region'], table.columns['id']], ('eu', 1))
+        after = connection.execute(table.select().where(condition).order_by(table.columns['region'],
+                                                                            table.columns['id'])).all()
+    assert [(row.region, row.id) for row in after] == [('eu', 2), ('us', 0), ('us', 1), ('us', 2)]
+
+
+def test_csv_text_quotes_values_and_leaves_null_empty():
+    assert csv_text([(1, None, 'a "b"', b'\x01\xff')]) == '"1",,"a ""b""","\\x01ff"\n'
@@ -0,0 +1,157 @@
+import textwrap
+
+import pytest
+from sqlalchemy import (
+    JSON, BigInteger, Boolean, Column, Date, DateTime, Float, Integer, LargeBinary, MetaData, Numeric, String,
+    Table, Text, Unicode, Uuid
+)
+
+from TypeMapping import TableDefinition, dialect_for_type
+
+
+def source_table():
+    return Table(
+        'orders', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('code', String(20), unique=True),
+        Column('placed_on', Date),
+        Column('payload', LargeBinary),
+        Column('paid', Boolean),
+        Column('note', Text),
+        Column('label', Unicode(5000)),
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime(timezone=True)),
+        Column('amount', Numeric(12, 2)),
+        Column('ratio', Float),
+        Column('big', BigInteger),
+        Column('attrs', JSON),
+        Column('ref', Uuid),
+    )
+
+
+def ddl(db_type):
+    statements = TableDefinition(source_table(), dialect_for_type(db_type)).sql()
+    return '\n'.join(line.rstrip() for statement in statements for line in statement.splitlines())
+
+
+SNAPSHOTS = {
+    'microsoftsqlserver': """
+        CREATE TABLE orders (
+        	id INTEGER NOT NULL,
+        	code NVARCHAR(20) NULL,
+        	placed_on DATE NULL,
+        	payload VARBINARY(max) NULL,
+        	paid BIT NULL,
+        	note NVARCHAR(max) NULL,
+        	label NVARCHAR(max) NULL,
+        	created_at DATETIME2(6) NULL,
+        	updated_at DATETIMEOFFSET NULL,
+        	amount NUMERIC(12, 2) NULL,
+        	ratio FLOAT NULL,
+        	big BIGINT NULL,
+        	attrs NVARCHAR(max) NULL,
+        	ref UNIQUEIDENTIFIER NULL,
+        	CONSTRAINT pk_orders PRIMARY KEY (id)
+        )
+        CREATE UNIQUE INDEX ix_orders_code ON orders (code)
+    """,
+    'oracle': """
+        CREATE TABLE orders (
+        	id INTEGER NOT NULL,
+        	code VARCHAR2(20 CHAR),
+        	placed_on DATE,
+        	payload BLOB,
+        	paid SMALLINT,
+        	note CLOB,
+        	label CLOB,
+        	created_at TIMESTAMP,
+        	updated_at TIMESTAMP WITH TIME ZONE,
+        	amount NUMERIC(12, 2),
+        	ratio FLOAT,
+        	big NUMBER(19),
+        	attrs BLOB,
+        	ref CHAR(32)
+        )
+        ALTER TABLE orders ADD CONSTRAINT pk_orders PRIMARY KEY (id)
+        CREATE UNIQUE INDEX ix_orders_code ON orders (code)
+    """,
+    'mysql': """
+        CREATE TABLE orders (
+        	id INTEGER NOT NULL,
+        	code VARCHAR(20),
+        	placed_on DATE,
+        	payload BLOB,
+        	paid BOOL,
+        	note TEXT,
+        	label VARCHAR(5000),
+        	created_at DATETIME(6),
+        	updated_at DATETIME(6),
+        	amount NUMERIC(12, 2),
+        	ratio FLOAT,
+        	big BIGINT,
+        	attrs JSON,
+        	ref CHAR(32),
+        	CONSTRAINT pk_orders PRIMARY KEY (id)
+        )
+        CREATE UNIQUE INDEX ix_orders_code ON orders (code)
+    """,
+    'postgresql': """
+        CREATE TABLE orders (
+        	id INTEGER NOT NULL,
+        	code VARCHAR(20),
+        	placed_on DATE,
+        	payload BYTEA,
+        	paid BOOLEAN,
+        	note TEXT,
+        	label VARCHAR(5000),
+        	created_at TIMESTAMP WITHOUT TIME ZONE,
+        	updated_at TIMESTAMP WITH TIME ZONE,
+        	amount NUMERIC(12, 2),
+        	ratio FLOAT,
+        	big BIGINT,
+        	attrs JSON,
+        	ref UUID
+        )
+        ALTER TABLE orders ADD CONSTRAINT pk_orders PRIMARY KEY (id)
+        CREATE UNIQUE INDEX ix_orders_code ON orders (code)
+    """,
+}
+
+
+@pytest.mark.parametrize('db_type', sorted(SNAPSHOTS))
+def test_ddl_snapshot(db_type):
+    assert ddl(db_type) == textwrap.dedent(SNAPSHOTS[db_type]).strip()
+
+
+def test_snowflake_ddl():
+    pytest.importorskip('snowflake.sqlalchemy')
+    statements = ddl('snowflake')
+    assert 'CREATE TABLE orders' in statements
+    assert 'CREATE UNIQUE INDEX' not in statements
+
+
+def test_long_indexed_strings_keep_their_length():
+    table = Table(
+        'notes', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('title', String(5000), index=True),
+        Column('code', String(1000), unique=True),
+    )
+    mysql = TableDefinition(table, dialect_for_type('mysql'))
+    assert 'title VARCHAR(5000)' in mysql.sql()[0]
+    assert 'CREATE INDEX ix_notes_title ON notes (title(768))' in mysql.sql()
+    # A unique index on a prefix would reject rows that only differ past it
+    assert mysql.skipped_indexes == [('ix_notes_code', "code holds strings longer than mysql can index")]
+
+    mssql = TableDefinition(table, dialect_for_type('microsoftsqlserver'))
+    assert 'title NVARCHAR(max) NULL' in mssql.sql()[0]
+    assert 'code NVARCHAR(1000) NULL' in mssql.sql()[0]
+    assert len(mssql.sql()) == 1
+    assert [name for name, _ in mssql.skipped_indexes] == ['ix_notes_title', 'ix_notes_code']
+
+
+def test_primary_key_longer_than_an_index_key_is_refused():
+    table = Table('notes', MetaData(), Column('id', String(2000), primary_key=True))
+    with pytest.raises(ValueError, match="holds strings longer than mssql can index"):
+        TableDefinition(table, dialect_for_type('microsoftsqlserver'))
+    assert 'id VARCHAR(2000) NOT NULL' in TableDefinition(table, dialect_for_type('postgresql')).sql()[0]